@@ -28,6 +28,26 @@ PLAYER_NAMES = [
 
 NUM_ROUNDS = len(PLAYER_NAMES)
 
+# rounds (0-based) that players can attend, players without an entry attend all rounds
+# e.g. {"P2": range(0, 6), "P3": range(3, NUM_ROUNDS)}
+AVAILABLE_ROUNDS = {}
+
+# file with the cumulative pairing history of a league that plays regularly, the
+# optimization takes earlier sessions into account and the exported plan is added
+# e.g. "league/weekly.npz", None for a single session
+LEAGUE_STORE_PATH = None
+
+# directory of the periodic checkpoints of each worker, a killed run continues from
+# them when it is started again and the retries below build on the previous search,
+# they are removed once the plan was exported, None to always start from scratch
+CHECKPOINT_DIR = "output/checkpoints"
+
+CHECKPOINT_INTERVAL_SECONDS = 60
+
+# master seed of a run, each worker searches with its own random stream spawned from
+# it, None draws a new seed, which is printed to reproduce the run
+SEED = None
+
 
 METRIC_WEIGHTS_CONFIG = MetricWeightsConfig()
 
@@ -1,74 +1,217 @@
 import datetime
+import os
+
+import numpy as np
 
 from matchmaking.data import Player
 from multiprocessing import Process, Manager
 from matchmaking.simple_optimizer import SimpleMatchupOptimizer
 from matchmaking.export import export_to_excel, export_results_to_json
 from matchmaking.visualizer import Visualizer
+from matchmaking.availability import create_availability_mask
+from matchmaking.feasibility import analyze_feasibility
+from matchmaking.league import LeagueStore
+from matchmaking.timer import PROFILER, is_profiling_enabled
+from matchmaking.telemetry import (
+    HEARTBEAT,
+    IMPROVEMENT,
+    InMemorySink,
+    JsonlSink,
+    QueueSink,
+    drain_queue,
+    merge_streams,
+)
 from config import *
 
+# seconds between the progress reports of each worker
+HEARTBEAT_INTERVAL_SECONDS = 5.0
+
+
+def optimize_and_store_result(
+    index,
+    return_dict,
+    telemetry_sink,
+    seed_sequence,
+    initial_schedules,
+    is_worker_process=False,
+):
 
-def optimize_and_store_result(index, return_dict):
+    if is_worker_process:
+        # a forked worker starts with the spans of the main process
+        PROFILER.reset()
 
     players = [Player(p) for p in PLAYER_NAMES]
 
     optimizer = SimpleMatchupOptimizer(
-        players, NUM_ROUNDS, NUM_FIELDS, NUM_ITERATIONS, METRIC_WEIGHTS_CONFIG
+        players,
+        NUM_ROUNDS,
+        NUM_FIELDS,
+        NUM_ITERATIONS,
+        METRIC_WEIGHTS_CONFIG,
+        availability=(
+            create_availability_mask(players, NUM_ROUNDS, AVAILABLE_ROUNDS)
+            if AVAILABLE_ROUNDS
+            else None
+        ),
+        league_prior=(
+            LeagueStore.load(LEAGUE_STORE_PATH).get_prior(players)
+            if LEAGUE_STORE_PATH
+            else None
+        ),
+        rng=np.random.default_rng(seed_sequence),
+        initial_schedules=initial_schedules,
+    )
+
+    optimizer.attach_telemetry(
+        telemetry_sink, f"worker-{index}", HEARTBEAT_INTERVAL_SECONDS
     )
 
+    if CHECKPOINT_DIR:
+        checkpoint_path = get_checkpoint_path(index)
+        if os.path.exists(checkpoint_path):
+            optimizer.load_checkpoint(checkpoint_path)
+            # a completed search (e.g. before a retry) searches on for another round,
+            # from the best plans of all workers if they beat its own incumbent
+            if optimizer.num_iterations_done >= optimizer.num_iterations:
+                optimizer.num_iterations += NUM_ITERATIONS
+        optimizer.enable_checkpoints(checkpoint_path, CHECKPOINT_INTERVAL_SECONDS)
+
     best_matchup_config, best_score, results, best_scores, best_scores_iterations = (
         optimizer.get_most_diverse_matchups()
     )
 
     return_dict[index] = {
         "best_matchup_config": best_matchup_config,
+        "best_schedule": optimizer.encode(best_matchup_config),
         "best_score": best_score,
         "results": results,
         "best_scores": best_scores,
         "best_scores_iterations": best_scores_iterations,
+        # spans of a worker process are merged into the main process
+        "profile": (
+            PROFILER.get_snapshot()
+            if is_worker_process and is_profiling_enabled()
+            else None
+        ),
     }
 
 
-def check_if_even_break_distribution_is_possible():
-    ## validation checks
-    print("Num players", len(PLAYER_NAMES))
-    break_players_per_round = len(PLAYER_NAMES) % (NUM_FIELDS * 4)
-    print("Break players per round", break_players_per_round)
-    assert (break_players_per_round * NUM_ROUNDS) % len(PLAYER_NAMES) == 0, (
+def get_checkpoint_path(index):
+    return f"{CHECKPOINT_DIR}/worker-{index}.npz"
+
+
+def remove_checkpoints():
+    for index in range(max(WORKERS, 1)):
+        if os.path.exists(get_checkpoint_path(index)):
+            os.remove(get_checkpoint_path(index))
+
+
+def check_feasibility():
+    ## validation checks, before any worker starts
+    players = [Player(p) for p in PLAYER_NAMES]
+    report = analyze_feasibility(
+        len(players),
+        NUM_ROUNDS,
+        NUM_FIELDS,
+        availability=(
+            create_availability_mask(players, NUM_ROUNDS, AVAILABLE_ROUNDS)
+            if AVAILABLE_ROUNDS
+            else None
+        ),
+    )
+    print("Num players", report.num_players)
+    print("Break players per round", report.num_resting_per_round)
+    report.check()
+    assert report.is_even_rest_possible, (
         f"Number of total break players is not divisible by the number of players. "
-        f"Break players per round: {break_players_per_round}, "
-        f"Total break players: {break_players_per_round * NUM_ROUNDS}, "
-        f"Players: {len(PLAYER_NAMES)}. "
+        f"Break players per round: {report.num_resting_per_round}, "
+        f"Total break players: {report.num_resting_per_round * NUM_ROUNDS}, "
+        f"Players: {report.num_players}. "
         f"There is no option to distribute breaks evenly!"
     )
 
 
-def check_if_num_players_is_sufficient_for_num_fields():
-    assert (
-        len(PLAYER_NAMES) >= NUM_FIELDS * 4
-    ), "Not enough players for the given number of fields!"
+def print_event(event):
+    if event.kind == IMPROVEMENT:
+        print(
+            f"[{event.source}] iteration {event.iteration}: "
+            f"new minimal score {event.data['score']:.3f}"
+        )
+    elif event.kind == HEARTBEAT:
+        print(
+            f"[{event.source}] {event.iteration} iterations, "
+            f"{event.data['iterations_per_second']:.1f} it/s, "
+            f"best score {event.data['best_score']:.3f}"
+        )
+
+
+def run_workers(return_dict, event_queue, worker_seed_sequences, initial_schedules):
+    """Run the workers and print their events while they run, returns all events."""
+    processes = []
+    for i in range(WORKERS):
+        p = Process(
+            target=optimize_and_store_result,
+            args=(
+                i,
+                return_dict,
+                QueueSink(event_queue),
+                worker_seed_sequences[i],
+                initial_schedules,
+                True,
+            ),
+        )
+        p.start()
+        processes.append(p)
+
+    events = []
+    while any(p.is_alive() for p in processes):
+        new_events = drain_queue(event_queue, timeout=0.5)
+        for event in new_events:
+            print_event(event)
+        events.extend(new_events)
+
+    for p in processes:
+        p.join()
+    events.extend(drain_queue(event_queue))
+
+    return events
 
 
 def main():
     manager = Manager()
     return_dict = manager.dict()
+    event_queue = manager.Queue()
+    events = []
+
+    check_feasibility()
 
-    check_if_num_players_is_sufficient_for_num_fields()
-    check_if_even_break_distribution_is_possible()
+    seed_sequence = np.random.SeedSequence(SEED)
+    print(f"Seed: {seed_sequence.entropy}")
+
+    # best plans of the previous attempt, so a retry refines them
+    initial_schedules = None
 
     while True:
-        processes = []
+        # independent streams for the workers, each retry spawns new ones
+        worker_seed_sequences = seed_sequence.spawn(max(WORKERS, 1))
+
         if WORKERS > 0:
-            for i in range(WORKERS):
-                p = Process(target=optimize_and_store_result, args=(i, return_dict))
-                p.start()
-                processes.append(p)
+            events.extend(
+                run_workers(
+                    return_dict, event_queue, worker_seed_sequences, initial_schedules
+                )
+            )
 
-            for p in processes:
-                p.join()
+            for result in return_dict.values():
+                if result["profile"] is not None:
+                    PROFILER.merge(result["profile"])
         else:
             # Run directly without multiprocessing
-            optimize_and_store_result(0, return_dict)
+            sink = InMemorySink()
+            optimize_and_store_result(
+                0, return_dict, sink, worker_seed_sequences[0], initial_schedules
+            )
+            events.extend(sink.events)
 
         # Find the best result across all processes
         best_result = min(return_dict.values(), key=lambda x: x["best_score"])
@@ -124,6 +267,36 @@ def main():
             break
         else:
             print("Requirement not met: Repeating the optimization process...")
+            initial_schedules = [
+                result["best_schedule"] for result in return_dict.values()
+            ]
+
+    # the plan is exported, the next run starts from scratch
+    if CHECKPOINT_DIR:
+        remove_checkpoints()
+
+    # the events of all workers and retries as one timeline
+    telemetry_sink = JsonlSink(f"{out_dir}/{out_file_name}_telemetry.jsonl")
+    for event in merge_streams(events):
+        telemetry_sink.emit(event)
+    telemetry_sink.close()
+
+    if is_profiling_enabled():
+        print(PROFILER.get_summary_table())
+        PROFILER.write_trace(f"{out_dir}/{out_file_name}_trace.json")
+        print(f"Wrote the trace to {out_dir}/{out_file_name}_trace.json.")
+
+    if LEAGUE_STORE_PATH:
+        league_store = LeagueStore.load(LEAGUE_STORE_PATH)
+        league_store.add_session(
+            best_result["best_matchup_config"],
+            [Player(p) for p in PLAYER_NAMES],
+            NUM_FIELDS,
+        )
+        league_store.save(LEAGUE_STORE_PATH)
+        print(
+            f"Added the session to the league ({league_store.num_sessions} sessions)."
+        )
 
 
 if __name__ == "__main__":
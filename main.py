@@ -1,13 +1,30 @@
+from copy import deepcopy
+from uuid import uuid4
+
 import streamlit as st
 
 from matchmaking.data import Player
-from matchmaking.simple_optimizer import SimpleMatchupOptimizer
+from matchmaking.optimization_pool import OptimizationPool, get_optimizer_class
+from matchmaking.feasibility import analyze_feasibility, get_num_unique_matchups
+from matchmaking.schedule import encode_matchups
+from matchmaking.online import SessionHistory, next_round
+from matchmaking.background import BackgroundOptimization
+from matchmaking.replan_optimizer import ReplanMatchupOptimizer
 from matchmaking.metric_type import MetricType
 from matchmaking.config import MetricWeightsConfig
 
 
+@st.cache_resource
+def get_optimization_pool() -> OptimizationPool:
+    """One process pool for all sessions of the server, the workers start with the first job."""
+    return OptimizationPool()
+
+
 def init_state() -> None:
 
+    if "session_id" not in st.session_state:
+        st.session_state.session_id = uuid4().hex
+
     if "players" not in st.session_state:
         st.session_state.players = []
 
@@ -32,6 +49,18 @@ def init_state() -> None:
     if "WEIGHT_METRIC_CONFIG" not in st.session_state:
         st.session_state.WEIGHT_METRIC_CONFIG = MetricWeightsConfig()
 
+    if "optimizer" not in st.session_state:
+        st.session_state.optimizer = None
+
+    if "ranked_weights" not in st.session_state:
+        st.session_state.ranked_weights = {}
+
+    if "optimization" not in st.session_state:
+        st.session_state.optimization = None
+
+    if "session_history" not in st.session_state:
+        st.session_state.session_history = None
+
 
 def _get_default_num_rounds() -> int:
 
@@ -41,7 +70,7 @@ def _get_default_num_rounds() -> int:
         return 10
 
 
-def matchup_generation() -> None:
+def matchup_generation():
 
     st.write("## Matchup generation")
 
@@ -51,11 +80,172 @@ def matchup_generation() -> None:
         "Generate matchups [may take a while...]",
         key="button_gen_10_matchup",
         on_click=_gen_matchup_batch,
+        disabled=st.session_state.optimization is not None,
+    )
+
+    _show_optimization_progress()
+
+    # filled after the weight sliders were read, see show_matchups
+    return st.container()
+
+
+@st.fragment(run_every=1.0)
+def _show_optimization_progress() -> None:
+    """Polls the background optimization and shows the current best schedule while it runs."""
+
+    optimization = st.session_state.optimization
+
+    if optimization is None:
+        return
+
+    progress = optimization.get_progress()
+
+    if not progress.is_running:
+        _finish_optimization()
+        st.rerun()
+
+    st.progress(
+        progress.num_iterations_done / progress.num_iterations,
+        text=f"Iteration {progress.num_iterations_done}/{progress.num_iterations} "
+        f"({progress.iterations_per_second:.0f} it/s)",
+    )
+
+    st.button(
+        "Stop and keep current best",
+        key="button_stop_optimization",
+        on_click=_stop_optimization,
+    )
+
+    st.write("Current best score (lower is better):", progress.best_score)
+    st.write(progress.best_matchups)
+
+
+def _stop_optimization() -> None:
+
+    optimization = st.session_state.optimization
+
+    if optimization is None:
+        return
+
+    best_matchups, best_score = optimization.stop()
+
+    if best_matchups is not None:
+        st.session_state.matchups = best_matchups
+        st.session_state.matchup_gen_score = best_score
+
+
+def _finish_optimization() -> None:
+
+    optimization = st.session_state.optimization
+    st.session_state.optimization = None
+
+    if optimization.error is not None:
+        st.error(f"Matchup generation failed: {optimization.error}")
+        return
+
+    best_matchup_config, best_score, results, _, _ = optimization.result
+
+    if best_matchup_config is None:
+        return
+
+    st.session_state.matchups = best_matchup_config
+    st.session_state.matchup_gen_score = best_score
+    st.session_state.results = results
+    st.session_state.optimizer = optimization.optimizer
+    st.session_state.ranked_weights = dict(
+        optimization.optimizer.weights_and_metrics.weight_per_metric
     )
 
-    st.write(st.session_state.matchups)
 
-    st.write("Score (lower is better):", st.session_state.matchup_gen_score)
+def show_matchups(container) -> None:
+
+    _rerank_matchups()
+
+    with container:
+        st.write(st.session_state.matchups)
+
+        st.write("Score (lower is better):", st.session_state.matchup_gen_score)
+
+
+def _rerank_matchups() -> None:
+    """Pick the best of the retained schedules when the weights changed since the last ranking."""
+
+    optimizer = st.session_state.optimizer
+    weights = st.session_state.WEIGHT_METRIC_CONFIG
+
+    if (
+        optimizer is None
+        or st.session_state.optimization is not None
+        or weights.weight_per_metric == st.session_state.ranked_weights
+    ):
+        return
+
+    try:
+        matchups, score, results = optimizer.rerank(weights)
+    except ValueError as e:
+        st.info(f"{e} Click generate to search with the new weights.")
+        return
+
+    st.session_state.matchups = matchups
+    st.session_state.matchup_gen_score = score
+    st.session_state.results = results
+    st.session_state.ranked_weights = dict(weights.weight_per_metric)
+
+
+def replan() -> None:
+
+    optimizer = st.session_state.optimizer
+
+    if optimizer is None or not st.session_state.matchups:
+        return
+
+    st.write("#### Re-plan")
+    st.write(
+        "Players joined or left? The played rounds are kept and only the remaining rounds are re-planned."
+    )
+
+    num_played_rounds = st.number_input(
+        "Rounds already played:",
+        min_value=0,
+        max_value=len(st.session_state.matchups) // optimizer.num_fields,
+        value=0,
+        key="input_num_played_rounds",
+    )
+    left_player_names = st.multiselect(
+        "Players who left:",
+        [str(x) for x in st.session_state.players],
+        key="multiselect_left_players",
+    )
+
+    st.button(
+        "Re-plan remaining rounds",
+        key="button_replan",
+        on_click=_replan_remaining_rounds,
+        args=(num_played_rounds, left_player_names),
+        disabled=st.session_state.optimization is not None,
+    )
+
+
+def _replan_remaining_rounds(num_played_rounds: int, left_player_names: list) -> None:
+
+    players = [x for x in st.session_state.players if str(x) not in left_player_names]
+    weights = deepcopy(st.session_state.WEIGHT_METRIC_CONFIG)
+
+    try:
+        optimizer = ReplanMatchupOptimizer(
+            st.session_state.matchups,
+            num_played_rounds,
+            players,
+            st.session_state.optimizer.num_fields,
+            st.session_state.NUM_ITERATIONS,
+            weights,
+            rerank_metrics=weights.get_metric_names(),
+        )
+    except (ValueError, AssertionError) as e:
+        st.warning(str(e))
+        return
+
+    st.session_state.optimization = BackgroundOptimization(optimizer).start()
 
 
 def _show_max_matchups() -> None:
@@ -68,36 +258,80 @@ def _show_max_matchups() -> None:
 
 def _calculate_max_matchups(num_players) -> int:
 
-    n = num_players
-
-    return int(((n * n - n) / 8) * (n * n - 5 * n + 6))
+    return get_num_unique_matchups(num_players)
 
 
 def _gen_matchup_batch() -> None:
 
-    if len(st.session_state.players) < 4:
+    num_players = len(st.session_state.players)
+    report = analyze_feasibility(
+        num_players,
+        st.session_state.NUM_ROUNDS,
+        st.session_state.NUM_FIELDS,
+        unique_matchups=get_optimizer_class(num_players).requires_unique_matchups,
+    )
+
+    # more rounds than the sampler can fill with unique matchups are reduced to as many as it can
+    num_rounds = report.get_adjusted_num_rounds()
+    if 0 < num_rounds < report.num_rounds:
         st.warning(
-            f"Not enough players to generate matchups: {len(st.session_state.players)}. Four players are needed at least."
+            f"Only {num_rounds} rounds without repeated matchups can be planned, the plan is reduced to them."
+        )
+        report = analyze_feasibility(
+            num_players,
+            num_rounds,
+            st.session_state.NUM_FIELDS,
+            unique_matchups=get_optimizer_class(num_players).requires_unique_matchups,
         )
+
+    if not report.is_feasible:
+        st.warning(" ".join(report.problems))
         return
 
+    if not report.is_even_play_possible:
+        st.info(
+            f"Not all players can play equally often: {report.num_matches_per_player:.2f} matches per player."
+        )
+
     print(st.session_state.WEIGHT_METRIC_CONFIG.weight_per_metric)
 
-    optimizer = SimpleMatchupOptimizer(
+    # the sliders keep changing the session weights while the search runs in the background
+    weights = deepcopy(st.session_state.WEIGHT_METRIC_CONFIG)
+
+    st.session_state.optimization = get_optimization_pool().submit(
+        st.session_state.session_id,
         st.session_state.players,
-        st.session_state.NUM_ROUNDS,
+        num_rounds,
         st.session_state.NUM_FIELDS,
         st.session_state.NUM_ITERATIONS,
-        st.session_state.WEIGHT_METRIC_CONFIG,
+        weights,
+        # all weights can be changed in the UI, so keep every metric available for reranking
+        rerank_metrics=weights.get_metric_names(),
+        # another click refines the current plan instead of starting over
+        initial_schedules=_get_current_schedules(num_rounds),
     )
 
-    best_matchup_config, best_score, results, _, _ = (
-        optimizer.get_most_diverse_matchups()
-    )
 
-    st.session_state.matchups = best_matchup_config
-    st.session_state.matchup_gen_score = best_score
-    st.session_state.results = results
+def _get_current_schedules(num_rounds: int) -> list:
+    """The current plan as int schedule, if it fits the plan to generate."""
+
+    matchups = st.session_state.matchups
+    num_fields = st.session_state.NUM_FIELDS
+
+    if len(matchups) != num_rounds * num_fields:
+        return []
+
+    try:
+        schedule, _ = encode_matchups(
+            matchups,
+            num_fields,
+            [x.get_unique_identifier() for x in st.session_state.players],
+        )
+    except KeyError:
+        # e.g. a re-planned session with players who left
+        return []
+
+    return [schedule]
 
 
 def configure():
@@ -110,7 +344,10 @@ def configure():
         "Number of Rounds:", min_value=1, max_value=_get_default_num_rounds(), value=10
     )
     st.session_state.NUM_FIELDS = st.slider(
-        "Number of Fields:", min_value=1, max_value=10, value=1
+        "Number of Fields:",
+        min_value=1,
+        max_value=max(10, len(st.session_state.players) // 4),
+        value=1,
     )
 
     st.write("#### Optimization Params")
@@ -168,6 +405,13 @@ def configure():
         MetricType.GLOBAL_ENEMY_TEAM_SUCCESSION_INDEX, value
     )
 
+    value = st.slider(
+        "Weight for Global Enemy Player Succession Index:", 0.0, 100.0, 0.0
+    )
+    st.session_state.WEIGHT_METRIC_CONFIG.update_weight(
+        MetricType.GLOBAL_ENEMY_PLAYER_SUCCESSION_INDEX, value
+    )
+
     value = st.slider("Weight for Global Teammate Variety Index:", 0.0, 100.0, 5.0)
     st.session_state.WEIGHT_METRIC_CONFIG.update_weight(
         MetricType.GLOBAL_TEAMMATE_VARIETY_INDEX, value
@@ -238,6 +482,62 @@ def _submit_add_player(player_phrase: str) -> None:
             st.session_state.players.append(player)
 
 
+def open_session() -> None:
+    st.write("## Open Session")
+    st.write("Play round by round, without fixing the number of rounds up front.")
+
+    absent_player_names = st.multiselect(
+        "Absent players:",
+        [str(x) for x in st.session_state.players],
+        key="multiselect_absent_players",
+    )
+
+    st.button(
+        "Next round",
+        key="button_next_round",
+        on_click=_play_next_round,
+        args=(absent_player_names,),
+    )
+    st.button(
+        "Reset session",
+        key="button_reset_session",
+        on_click=_reset_session,
+    )
+
+    history = st.session_state.session_history
+    if history is None:
+        return
+
+    for i, matchups in reversed(list(enumerate(history.rounds))):
+        st.write(f"Round {i + 1}:", [str(x) for x in matchups])
+
+
+def _play_next_round(absent_player_names: list) -> None:
+
+    present_players = [
+        x for x in st.session_state.players if str(x) not in absent_player_names
+    ]
+
+    if st.session_state.session_history is None:
+        st.session_state.session_history = SessionHistory(st.session_state.NUM_FIELDS)
+
+    history = st.session_state.session_history
+    # the number of fields may change between rounds
+    history.num_fields = st.session_state.NUM_FIELDS
+
+    try:
+        matchups = next_round(history, present_players)
+    except ValueError as e:
+        st.warning(str(e))
+        return
+
+    history.add_round(matchups, present_players)
+
+
+def _reset_session() -> None:
+    st.session_state.session_history = None
+
+
 def additional_info() -> None:
     st.write("#### Additional Result Info")
     st.write("Matchup Statistics:", st.session_state.results)
@@ -254,8 +554,11 @@ def main() -> None:
     """
     )
 
-    matchup_generation()
+    matchup_container = matchup_generation()
     configure()
+    show_matchups(matchup_container)
+    replan()
+    open_session()
     additional_info()
 
 
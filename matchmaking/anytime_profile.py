@@ -0,0 +1,234 @@
+import contextlib
+import io
+import json
+import threading
+from dataclasses import asdict, dataclass
+from typing import Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from matchmaking.config import MetricWeightsConfig
+from matchmaking.simple_optimizer import SimpleMatchupOptimizer
+from matchmaking.large_scale import LargeScaleMatchupOptimizer
+from matchmaking.optimization_pool import create_placeholder_players
+
+# optimizers that plan a session from scratch, the replan optimizer continues a plan
+PROFILE_OPTIMIZERS = {
+    "simple": SimpleMatchupOptimizer,
+    "large_scale": LargeScaleMatchupOptimizer,
+}
+
+# quantiles of the best loss over all runs, the outer ones are drawn as band
+PROFILE_QUANTILES = (0.25, 0.5, 0.75)
+
+# the searches run until they are stopped by the time budget
+UNLIMITED_ITERATIONS = 10**9
+
+
+@dataclass(frozen=True)
+class RosterShape:
+    num_players: int
+    num_fields: int
+    num_rounds: int
+
+    @property
+    def name(self) -> str:
+        return (
+            f"players={self.num_players}/fields={self.num_fields}"
+            f"/rounds={self.num_rounds}"
+        )
+
+
+DEFAULT_ROSTER_SHAPES = (
+    RosterShape(10, 2, 10),
+    RosterShape(20, 4, 15),
+    RosterShape(40, 6, 20),
+    RosterShape(64, 12, 10),
+)
+
+
+@dataclass
+class Trajectory:
+    """Best loss of one run after each improvement, with the seconds since its start."""
+
+    optimizer_name: str
+    seed: int
+    seconds: List[float]
+    losses: List[float]
+
+    def get_best_losses_at(self, times: np.ndarray) -> np.ndarray:
+        """Best loss at each of the times, inf before the first plan was found."""
+        indices = np.searchsorted(self.seconds, times, side="right") - 1
+        losses = np.asarray(self.losses + [np.inf])
+        # index -1 picks the appended inf
+        return losses[indices]
+
+
+@dataclass
+class PerformanceProfile:
+    optimizer_name: str
+    times: List[float]
+    # best loss over the runs at each time, per quantile
+    loss_quantiles: Dict[float, List[float]]
+    # share of the runs that reached the target loss at each time
+    success_rates: List[float]
+    target_loss: float
+
+    def get_time_to_success_rate(self, success_rate: float = 0.5) -> float:
+        """First time at which the share of successful runs was reached, inf if never."""
+        indices = np.flatnonzero(np.asarray(self.success_rates) >= success_rate)
+        return self.times[indices[0]] if indices.size else np.inf
+
+    def to_dict(self) -> dict:
+        data = asdict(self)
+        # JSON has no infinity, quantiles are inf while too few runs found a plan
+        data["loss_quantiles"] = {
+            str(quantile): [None if np.isinf(loss) else loss for loss in losses]
+            for quantile, losses in self.loss_quantiles.items()
+        }
+        return data
+
+
+def record_trajectory(
+    optimizer_name: str,
+    shape: RosterShape,
+    time_budget_seconds: float,
+    seed: int,
+    weights_and_metrics: Optional[MetricWeightsConfig] = None,
+) -> Trajectory:
+    """Run the optimizer until the time budget is used up or it stops by itself."""
+    optimizer = PROFILE_OPTIMIZERS[optimizer_name](
+        create_placeholder_players(shape.num_players),
+        shape.num_rounds,
+        shape.num_fields,
+        UNLIMITED_ITERATIONS,
+        weights_and_metrics or MetricWeightsConfig(),
+        rng=np.random.default_rng(seed),
+    )
+
+    stop_timer = threading.Timer(time_budget_seconds, optimizer.request_stop)
+    stop_timer.start()
+    try:
+        # the optimizers report progress on stdout and stderr
+        with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(
+            io.StringIO()
+        ):
+            optimizer.get_most_diverse_matchups()
+    finally:
+        stop_timer.cancel()
+
+    return Trajectory(
+        optimizer_name,
+        seed,
+        list(optimizer.best_scores_seconds),
+        list(optimizer.best_scores),
+    )
+
+
+def _get_empirical_quantile(sorted_losses: np.ndarray, quantile: float) -> np.ndarray:
+    # no interpolation, so runs without a plan (inf) do not turn the result into nan
+    index = max(int(np.ceil(quantile * len(sorted_losses))) - 1, 0)
+    return sorted_losses[index]
+
+
+def compute_performance_profiles(
+    trajectories: Sequence[Trajectory],
+    time_budget_seconds: float,
+    num_times: int = 100,
+    tolerance: float = 0.01,
+) -> List[PerformanceProfile]:
+    """
+    Quantiles of the best loss and success rates over time, per optimizer, from
+    runs on the same roster shape. A run succeeded once it is within the relative
+    tolerance of the best loss any run reached. The times are spaced
+    logarithmically, as most improvements happen early.
+    """
+    times = np.geomspace(time_budget_seconds * 1e-3, time_budget_seconds, num_times)
+    best_loss = min(
+        (min(trajectory.losses) for trajectory in trajectories if trajectory.losses),
+        default=np.inf,
+    )
+    target_loss = best_loss + tolerance * abs(best_loss)
+
+    profiles = []
+    for optimizer_name in dict.fromkeys(t.optimizer_name for t in trajectories):
+        losses = np.stack(
+            [
+                trajectory.get_best_losses_at(times)
+                for trajectory in trajectories
+                if trajectory.optimizer_name == optimizer_name
+            ]
+        )
+        sorted_losses = np.sort(losses, axis=0)
+
+        profiles.append(
+            PerformanceProfile(
+                optimizer_name,
+                times.tolist(),
+                {
+                    quantile: _get_empirical_quantile(sorted_losses, quantile).tolist()
+                    for quantile in PROFILE_QUANTILES
+                },
+                np.mean(losses <= target_loss, axis=0).tolist(),
+                target_loss,
+            )
+        )
+
+    return profiles
+
+
+def get_fastest_optimizer(
+    profiles: Sequence[PerformanceProfile], success_rate: float = 0.5
+) -> str:
+    """Optimizer that first reaches the success rate, the lower final median loss breaks ties."""
+    return min(
+        profiles,
+        key=lambda profile: (
+            profile.get_time_to_success_rate(success_rate),
+            profile.loss_quantiles[0.5][-1],
+        ),
+    ).optimizer_name
+
+
+def run_anytime_benchmark(
+    shapes: Sequence[RosterShape] = DEFAULT_ROSTER_SHAPES,
+    optimizer_names: Sequence[str] = tuple(PROFILE_OPTIMIZERS),
+    num_runs: int = 10,
+    time_budget_seconds: float = 2.0,
+    seed: int = 0,
+    progress_callback: Optional[Callable[[RosterShape, Trajectory], None]] = None,
+) -> Dict[RosterShape, List[Trajectory]]:
+    """Trajectories of num_runs seeded runs per optimizer and shape, all optimizers use the same seeds."""
+    trajectories_per_shape = {}
+    for shape in shapes:
+        trajectories = []
+        for run_index in range(num_runs):
+            for optimizer_name in optimizer_names:
+                trajectory = record_trajectory(
+                    optimizer_name, shape, time_budget_seconds, seed + run_index
+                )
+                trajectories.append(trajectory)
+                if progress_callback is not None:
+                    progress_callback(shape, trajectory)
+
+        trajectories_per_shape[shape] = trajectories
+
+    return trajectories_per_shape
+
+
+def save_anytime_results(
+    trajectories_per_shape: Dict[RosterShape, List[Trajectory]],
+    profiles_per_shape: Dict[RosterShape, List[PerformanceProfile]],
+    out_path: str,
+) -> None:
+    data = {
+        shape.name: {
+            "shape": asdict(shape),
+            "fastest_optimizer": get_fastest_optimizer(profiles_per_shape[shape]),
+            "profiles": [profile.to_dict() for profile in profiles_per_shape[shape]],
+            "trajectories": [asdict(trajectory) for trajectory in trajectories],
+        }
+        for shape, trajectories in trajectories_per_shape.items()
+    }
+    with open(out_path, "w") as f:
+        json.dump(data, f, indent=2)
@@ -0,0 +1,27 @@
+from typing import Dict, Iterable, List
+
+import numpy as np
+
+from matchmaking.data import Player
+
+
+def create_availability_mask(
+    players: List[Player],
+    num_rounds: int,
+    available_rounds: Dict[str, Iterable[int]],
+) -> np.ndarray:
+    """
+    Boolean (players, rounds) mask from the rounds (0-based) each player can attend.
+    Players without an entry are available in every round.
+    """
+    availability = np.ones((len(players), num_rounds), dtype=bool)
+
+    for i, player in enumerate(players):
+        rounds = available_rounds.get(player.get_unique_identifier())
+        if rounds is None:
+            continue
+
+        availability[i] = False
+        availability[i, [r for r in rounds if 0 <= r < num_rounds]] = True
+
+    return availability
@@ -0,0 +1,80 @@
+import threading
+import time
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+from matchmaking.data import Matchup
+from matchmaking.optimizer import MatchupOptimizer
+
+
+@dataclass
+class OptimizationProgress:
+    best_matchups: Optional[List[Matchup]]
+    best_score: float
+    num_iterations_done: int
+    num_iterations: int
+    iterations_per_second: float
+    elapsed_seconds: float
+    is_running: bool
+
+
+class BackgroundOptimization:
+    """
+    Runs an optimizer in a daemon thread, so that a caller (e.g. a Streamlit session)
+    stays responsive, can poll the incumbent and can stop the search early.
+    """
+
+    def __init__(self, optimizer: MatchupOptimizer):
+        self.optimizer = optimizer
+        self.result: Optional[tuple] = None
+        self.error: Optional[BaseException] = None
+        self.start_time: Optional[float] = None
+        self.end_time: Optional[float] = None
+
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self) -> "BackgroundOptimization":
+        self.start_time = time.perf_counter()
+        self.thread.start()
+        return self
+
+    def _run(self) -> None:
+        try:
+            self.result = self.optimizer.get_most_diverse_matchups()
+        except Exception as e:
+            self.error = e
+        finally:
+            self.end_time = time.perf_counter()
+
+    def is_running(self) -> bool:
+        return self.thread.is_alive()
+
+    def stop(self) -> Tuple[Optional[List[Matchup]], float]:
+        """Stop the search and return the incumbent right away, without waiting for the thread."""
+        self.optimizer.request_stop()
+        return self.optimizer.get_incumbent()
+
+    def join(self, timeout: Optional[float] = None) -> None:
+        self.thread.join(timeout)
+
+    def get_progress(self) -> OptimizationProgress:
+        best_matchups, best_score = self.optimizer.get_incumbent()
+        num_iterations_done = self.optimizer.num_iterations_done
+
+        if self.start_time is None:
+            elapsed_seconds = 0.0
+        else:
+            end_time = time.perf_counter() if self.end_time is None else self.end_time
+            elapsed_seconds = end_time - self.start_time
+
+        return OptimizationProgress(
+            best_matchups=best_matchups,
+            best_score=best_score,
+            num_iterations_done=num_iterations_done,
+            num_iterations=self.optimizer.num_iterations,
+            iterations_per_second=(
+                num_iterations_done / elapsed_seconds if elapsed_seconds > 0 else 0.0
+            ),
+            elapsed_seconds=elapsed_seconds,
+            is_running=self.is_running(),
+        )
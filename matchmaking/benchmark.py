@@ -0,0 +1,511 @@
+import argparse
+import contextlib
+import io
+import itertools
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+from dataclasses import asdict, dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import psutil
+
+from matchmaking.data import Matchup, Player
+from matchmaking.config import MetricWeightsConfig
+from matchmaking.metrics import get_total_matchup_set_score
+from matchmaking.simple_optimizer import SimpleMatchupOptimizer
+from matchmaking.large_scale import LargeScaleMatchupOptimizer
+from matchmaking.replan_optimizer import ReplanMatchupOptimizer
+from matchmaking.optimization_pool import create_placeholder_players
+from matchmaking.feasibility import analyze_feasibility
+from matchmaking.anytime_profile import (
+    DEFAULT_ROSTER_SHAPES,
+    PROFILE_OPTIMIZERS,
+    RosterShape,
+    compute_performance_profiles,
+    get_fastest_optimizer,
+    run_anytime_benchmark,
+    save_anytime_results,
+)
+
+BENCHMARK_TARGETS = ("score", "sample", "simple", "large_scale", "replan")
+
+# relative slowdown or memory growth against the baseline that counts as regression
+DEFAULT_REGRESSION_THRESHOLD = 0.1
+
+
+@dataclass(frozen=True)
+class BenchmarkCase:
+    target: str
+    num_players: int
+    num_fields: int
+    num_rounds: int
+
+    @property
+    def name(self) -> str:
+        return (
+            f"{self.target}/players={self.num_players}"
+            f"/fields={self.num_fields}/rounds={self.num_rounds}"
+        )
+
+    @property
+    def num_matchups(self) -> int:
+        return self.num_fields * self.num_rounds
+
+
+@dataclass(frozen=True)
+class BenchmarkGrid:
+    player_counts: Tuple[int, ...] = (5, 10, 20, 40)
+    field_counts: Tuple[int, ...] = (1, 2, 4, 6)
+    round_counts: Tuple[int, ...] = (5, 15, 30)
+    targets: Tuple[str, ...] = BENCHMARK_TARGETS
+
+    def get_cases(self) -> List[BenchmarkCase]:
+        """All grid points a plan exists for, roster shapes without one are skipped."""
+        cases = []
+        for target, num_players, num_fields, num_rounds in itertools.product(
+            self.targets, self.player_counts, self.field_counts, self.round_counts
+        ):
+            report = analyze_feasibility(num_players, num_rounds, num_fields)
+            if not report.is_feasible:
+                continue
+            # the samplers redraw repeated matchups, so leave enough unique ones to choose from
+            if num_rounds * num_fields > report.num_unique_matchups // 2:
+                continue
+            cases.append(BenchmarkCase(target, num_players, num_fields, num_rounds))
+
+        return cases
+
+
+@dataclass
+class BenchmarkResult:
+    case: BenchmarkCase
+    num_evaluations: int
+    durations_ns: List[int]
+    evaluations_per_second: float
+    ns_per_matchup: float
+    peak_alloc_bytes: int
+    peak_rss_bytes: int
+
+    def to_dict(self) -> dict:
+        return {"name": self.case.name, **asdict(self)}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "BenchmarkResult":
+        data = {key: value for key, value in data.items() if key != "name"}
+        return cls(**{**data, "case": BenchmarkCase(**data["case"])})
+
+
+@dataclass(frozen=True)
+class Regression:
+    name: str
+    quantity: str
+    baseline: float
+    current: float
+
+    @property
+    def relative_change(self) -> float:
+        return self.current / self.baseline - 1.0
+
+
+def get_peak_rss_bytes() -> int:
+    """High water mark of the resident memory of this process."""
+    try:
+        import resource
+    except ImportError:
+        # windows, the peak working set is the closest equivalent
+        memory_info = psutil.Process().memory_info()
+        return getattr(memory_info, "peak_wset", memory_info.rss)
+
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on linux, bytes on macos
+    return peak_rss if sys.platform == "darwin" else peak_rss * 1024
+
+
+def _sample_plan(optimizer: SimpleMatchupOptimizer) -> List[Matchup]:
+    matchup_history = set()
+    matchups: List[Matchup] = []
+
+    for round_index in range(optimizer.num_rounds):
+        temp_matchups = optimizer.sample_matchups(matchup_history, round_index)
+        matchup_history.update(m.get_unique_identifier() for m in temp_matchups)
+        matchups.extend(temp_matchups)
+
+    return matchups
+
+
+def _prepare_case(
+    case: BenchmarkCase, num_iterations: int, seed: int
+) -> Callable[[], int]:
+    """
+    Set up everything the case needs outside of the timing and return the timed
+    function, which returns the number of evaluations it did. Every call draws
+    from a generator seeded with the same seed, so all calls do the same work.
+    """
+    players: List[Player] = create_placeholder_players(case.num_players)
+    weights_and_metrics = MetricWeightsConfig()
+    sampler = SimpleMatchupOptimizer(
+        players,
+        case.num_rounds,
+        case.num_fields,
+        num_iterations,
+        weights_and_metrics,
+        rng=np.random.default_rng(seed),
+    )
+
+    if case.target == "score":
+        matchups = _sample_plan(sampler)
+
+        def run() -> int:
+            for _ in range(num_iterations):
+                get_total_matchup_set_score(
+                    matchups,
+                    case.num_players,
+                    weights_and_metrics,
+                    case.num_fields,
+                    sampler.player_uids,
+                )
+            return num_iterations
+
+    elif case.target == "sample":
+
+        def run() -> int:
+            sampler.rng = np.random.default_rng(seed)
+            for _ in range(num_iterations):
+                _sample_plan(sampler)
+            return num_iterations
+
+    elif case.target in ("simple", "large_scale"):
+        optimizer_class = (
+            SimpleMatchupOptimizer
+            if case.target == "simple"
+            else LargeScaleMatchupOptimizer
+        )
+        # a fixed amount of work, the large-scale engine would stop early otherwise
+        kwargs = {"patience": None} if case.target == "large_scale" else {}
+
+        def run() -> int:
+            optimizer = optimizer_class(
+                players,
+                case.num_rounds,
+                case.num_fields,
+                num_iterations,
+                weights_and_metrics,
+                rng=np.random.default_rng(seed),
+                **kwargs,
+            )
+            optimizer.get_most_diverse_matchups()
+            return optimizer.num_iterations_done
+
+    elif case.target == "replan":
+        plan = _sample_plan(sampler)
+
+        def run() -> int:
+            optimizer = ReplanMatchupOptimizer(
+                plan,
+                case.num_rounds // 2,
+                players,
+                case.num_fields,
+                num_iterations,
+                weights_and_metrics,
+                rng=np.random.default_rng(seed),
+            )
+            optimizer.get_most_diverse_matchups()
+            return optimizer.num_iterations_done
+
+    else:
+        raise ValueError(f"Unknown benchmark target {case.target}.")
+
+    return run
+
+
+def run_case(
+    case: BenchmarkCase,
+    num_iterations: int = 20,
+    num_repeats: int = 5,
+    num_warmup_runs: int = 1,
+    seed: int = 0,
+) -> BenchmarkResult:
+    """
+    Time the case num_repeats times after the warm-up runs. Every run draws from
+    the same seed, so all runs do the same work, and the fastest run is reported,
+    as slower runs only add noise from other processes. Memory is measured in an
+    extra run, as tracing the allocations slows the code down.
+    """
+    run = _prepare_case(case, num_iterations, seed)
+
+    # the optimizers report progress on stdout and stderr
+    with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(
+        io.StringIO()
+    ):
+        for _ in range(num_warmup_runs):
+            run()
+
+        durations_ns = []
+        for _ in range(num_repeats):
+            start = time.perf_counter_ns()
+            num_evaluations = run()
+            durations_ns.append(time.perf_counter_ns() - start)
+
+        tracemalloc.start()
+        try:
+            run()
+            _, peak_alloc_bytes = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+    duration_ns = min(durations_ns)
+    num_evaluations = max(num_evaluations, 1)
+
+    return BenchmarkResult(
+        case,
+        num_evaluations,
+        durations_ns,
+        num_evaluations / duration_ns * 1e9,
+        duration_ns / (num_evaluations * case.num_matchups),
+        peak_alloc_bytes,
+        get_peak_rss_bytes(),
+    )
+
+
+def run_benchmarks(
+    grid: BenchmarkGrid,
+    num_iterations: int = 20,
+    num_repeats: int = 5,
+    num_warmup_runs: int = 1,
+    seed: int = 0,
+    progress_callback: Optional[Callable[[BenchmarkResult], None]] = None,
+) -> List[BenchmarkResult]:
+    results = []
+    for case in grid.get_cases():
+        result = run_case(case, num_iterations, num_repeats, num_warmup_runs, seed)
+        results.append(result)
+        if progress_callback is not None:
+            progress_callback(result)
+
+    return results
+
+
+def save_results(
+    results: List[BenchmarkResult], out_path: str, settings: Dict[str, int]
+) -> None:
+    data = {
+        "environment": {
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "processor": platform.processor(),
+        },
+        "settings": settings,
+        "results": [result.to_dict() for result in results],
+    }
+    with open(out_path, "w") as f:
+        json.dump(data, f, indent=2)
+
+
+def load_results(path: str) -> List[BenchmarkResult]:
+    with open(path) as f:
+        data = json.load(f)
+
+    return [BenchmarkResult.from_dict(result) for result in data["results"]]
+
+
+def compare_results(
+    baseline: List[BenchmarkResult],
+    current: List[BenchmarkResult],
+    threshold: float = DEFAULT_REGRESSION_THRESHOLD,
+) -> List[Regression]:
+    """
+    Cases whose time per matchup or peak allocation grew by more than threshold,
+    relative to the baseline. Cases missing in either result are not compared.
+    """
+    baseline_per_name = {result.case.name: result for result in baseline}
+
+    regressions = []
+    for result in current:
+        baseline_result = baseline_per_name.get(result.case.name)
+        if baseline_result is None:
+            continue
+
+        for quantity in ("ns_per_matchup", "peak_alloc_bytes"):
+            baseline_value = getattr(baseline_result, quantity)
+            current_value = getattr(result, quantity)
+            if baseline_value > 0 and current_value > baseline_value * (
+                1.0 + threshold
+            ):
+                regressions.append(
+                    Regression(
+                        result.case.name, quantity, baseline_value, current_value
+                    )
+                )
+
+    return regressions
+
+
+def _print_result(result: BenchmarkResult) -> None:
+    print(
+        f"{result.case.name:<45} {result.evaluations_per_second:>12.1f} evals/s "
+        f"{result.ns_per_matchup:>12.0f} ns/matchup "
+        f"{result.peak_alloc_bytes / 2**20:>8.2f} MiB alloc "
+        f"{result.peak_rss_bytes / 2**20:>8.1f} MiB rss"
+    )
+
+
+def _parse_roster_shape(text: str) -> RosterShape:
+    num_players, num_fields, num_rounds = (int(value) for value in text.split(","))
+    return RosterShape(num_players, num_fields, num_rounds)
+
+
+def _run_anytime_profiles(args: argparse.Namespace) -> None:
+    # plotting libraries are only loaded for the profiles, not for the timing runs
+    from matchmaking.visualizer import Visualizer
+
+    def print_trajectory(shape, trajectory):
+        final_loss = trajectory.losses[-1] if trajectory.losses else float("inf")
+        print(
+            f"{shape.name:<32} {trajectory.optimizer_name:<12} seed {trajectory.seed:<4}"
+            f" {len(trajectory.losses):>5} improvements, best {final_loss:.2f}"
+        )
+
+    trajectories_per_shape = run_anytime_benchmark(
+        args.shapes,
+        args.optimizers,
+        args.runs,
+        args.time_budget,
+        args.seed,
+        progress_callback=print_trajectory,
+    )
+    profiles_per_shape = {
+        shape: compute_performance_profiles(
+            trajectories, args.time_budget, tolerance=args.tolerance
+        )
+        for shape, trajectories in trajectories_per_shape.items()
+    }
+
+    os.makedirs(args.out_dir, exist_ok=True)
+    save_anytime_results(
+        trajectories_per_shape,
+        profiles_per_shape,
+        os.path.join(args.out_dir, "anytime_profiles.json"),
+    )
+    for shape, profiles in profiles_per_shape.items():
+        Visualizer.plot_performance_profiles(
+            profiles,
+            args.out_dir,
+            f"profile_{shape.num_players}_{shape.num_fields}_{shape.num_rounds}",
+            shape.name,
+        )
+        print(f"{shape.name}: fastest optimizer is {get_fastest_optimizer(profiles)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark the scorer, the sampler and the optimizers."
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="run the benchmark grid")
+    run_parser.add_argument("--out", default="output/benchmark.json")
+    run_parser.add_argument(
+        "--players", type=int, nargs="+", default=BenchmarkGrid.player_counts
+    )
+    run_parser.add_argument(
+        "--fields", type=int, nargs="+", default=BenchmarkGrid.field_counts
+    )
+    run_parser.add_argument(
+        "--rounds", type=int, nargs="+", default=BenchmarkGrid.round_counts
+    )
+    run_parser.add_argument(
+        "--targets", nargs="+", choices=BENCHMARK_TARGETS, default=BENCHMARK_TARGETS
+    )
+    run_parser.add_argument("--iterations", type=int, default=20)
+    run_parser.add_argument("--repeats", type=int, default=5)
+    run_parser.add_argument("--warmup", type=int, default=1)
+    run_parser.add_argument("--seed", type=int, default=0)
+
+    profile_parser = subparsers.add_parser(
+        "profile", help="record anytime quality-versus-time profiles"
+    )
+    profile_parser.add_argument("--out-dir", default="output/anytime")
+    profile_parser.add_argument(
+        "--shapes",
+        type=_parse_roster_shape,
+        nargs="+",
+        default=DEFAULT_ROSTER_SHAPES,
+        help="roster shapes as players,fields,rounds",
+    )
+    profile_parser.add_argument(
+        "--optimizers",
+        nargs="+",
+        choices=tuple(PROFILE_OPTIMIZERS),
+        default=tuple(PROFILE_OPTIMIZERS),
+    )
+    profile_parser.add_argument("--runs", type=int, default=10)
+    profile_parser.add_argument(
+        "--time-budget", type=float, default=2.0, help="seconds per run"
+    )
+    profile_parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.01,
+        help="relative distance to the best loss that counts as success",
+    )
+    profile_parser.add_argument("--seed", type=int, default=0)
+
+    compare_parser = subparsers.add_parser(
+        "compare", help="flag regressions of a result file against a baseline"
+    )
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument(
+        "--threshold", type=float, default=DEFAULT_REGRESSION_THRESHOLD
+    )
+    args = parser.parse_args()
+
+    if args.command == "run":
+        grid = BenchmarkGrid(
+            tuple(args.players),
+            tuple(args.fields),
+            tuple(args.rounds),
+            tuple(args.targets),
+        )
+        settings = {
+            "iterations": args.iterations,
+            "repeats": args.repeats,
+            "warmup": args.warmup,
+            "seed": args.seed,
+        }
+        results = run_benchmarks(
+            grid,
+            args.iterations,
+            args.repeats,
+            args.warmup,
+            args.seed,
+            progress_callback=_print_result,
+        )
+        save_results(results, args.out, settings)
+        print(f"Saved {len(results)} results to {args.out}.")
+        return
+
+    if args.command == "profile":
+        _run_anytime_profiles(args)
+        return
+
+    regressions = compare_results(
+        load_results(args.baseline), load_results(args.current), args.threshold
+    )
+    for regression in regressions:
+        print(
+            f"{regression.name} {regression.quantity}: {regression.baseline:.0f} -> "
+            f"{regression.current:.0f} ({regression.relative_change:+.1%})"
+        )
+    print(f"{len(regressions)} regressions beyond {args.threshold:.0%}.")
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,338 @@
+# Shared intermediates and global metrics registered with the metric registry
+import numpy as np
+
+from matchmaking.metric_type import MetricType
+from matchmaking.metric_registry import (
+    MetricEvaluationContext,
+    register_intermediate,
+    register_metric,
+)
+from matchmaking.schedule import (
+    RESTING,
+    compute_play_mask,
+    compute_partner_matrix,
+    compute_opponent_matrix,
+    compute_enemy_team_matrix,
+)
+from matchmaking.metric_compute_functions import (
+    run_length_encode_2d,
+    select_runs,
+    filter_runs,
+    compute_run_lengths_stdev_per_row,
+    compute_nth_run_length_per_row,
+    compute_break_shortness,
+    compact_played_rounds,
+    find_consecutive_repeats,
+    compute_pair_counts,
+    compute_nonzero_stdev_per_row,
+    compute_unique_people_not_met_per_row,
+)
+
+# ====== INTERMEDIATES ======
+
+
+@register_intermediate("play_mask")
+def _play_mask(context: MetricEvaluationContext) -> np.ndarray:
+    return compute_play_mask(context.schedule, context.num_encoded_players)
+
+
+@register_intermediate("active_players", requires=("play_mask",))
+def _active_players(context: MetricEvaluationContext) -> np.ndarray:
+    return np.any(context["play_mask"], axis=1)
+
+
+@register_intermediate("run_lengths", requires=("play_mask",))
+def _run_lengths(context: MetricEvaluationContext):
+    return run_length_encode_2d(context["play_mask"])
+
+
+@register_intermediate("break_runs", requires=("run_lengths",))
+def _break_runs(context: MetricEvaluationContext):
+    return select_runs(context["run_lengths"], False)
+
+
+@register_intermediate("session_runs", requires=("run_lengths",))
+def _session_runs(context: MetricEvaluationContext):
+    return select_runs(context["run_lengths"], True)
+
+
+@register_intermediate("partner_matrix")
+def _partner_matrix(context: MetricEvaluationContext) -> np.ndarray:
+    return compute_partner_matrix(context.schedule, context.num_encoded_players)
+
+
+@register_intermediate("opponent_matrix")
+def _opponent_matrix(context: MetricEvaluationContext) -> np.ndarray:
+    return compute_opponent_matrix(context.schedule, context.num_encoded_players)
+
+
+@register_intermediate("enemy_team_matrix", requires=("opponent_matrix",))
+def _enemy_team_matrix(context: MetricEvaluationContext) -> np.ndarray:
+    return compute_enemy_team_matrix(
+        context["opponent_matrix"], context.num_encoded_players
+    )
+
+
+@register_intermediate("teammate_counts", requires=("partner_matrix",))
+def _teammate_counts(context: MetricEvaluationContext) -> np.ndarray:
+    teammate_counts = compute_pair_counts(
+        context["partner_matrix"], context.num_encoded_players, RESTING
+    )
+    if context.league_prior is not None:
+        teammate_counts += context.league_prior.teammate_counts
+    return teammate_counts
+
+
+@register_intermediate("opponent_counts", requires=("opponent_matrix",))
+def _opponent_counts(context: MetricEvaluationContext) -> np.ndarray:
+    opponent_counts = compute_pair_counts(
+        context["opponent_matrix"], context.num_encoded_players, RESTING
+    )
+    if context.league_prior is not None:
+        opponent_counts += context.league_prior.opponent_counts
+    return opponent_counts
+
+
+@register_intermediate("enemy_team_runs", requires=("enemy_team_matrix",))
+def _enemy_team_runs(context: MetricEvaluationContext):
+    # sorting each row groups equal enemy teams, so run lengths are the counts per enemy team
+    run_lengths = run_length_encode_2d(np.sort(context["enemy_team_matrix"], axis=1))
+    return filter_runs(run_lengths, run_lengths.values != RESTING)
+
+
+@register_intermediate(
+    "played_partner_matrix", requires=("partner_matrix", "play_mask")
+)
+def _played_partner_matrix(context: MetricEvaluationContext) -> np.ndarray:
+    return compact_played_rounds(
+        context["partner_matrix"], context["play_mask"], RESTING
+    )
+
+
+@register_intermediate(
+    "played_enemy_team_matrix", requires=("enemy_team_matrix", "play_mask")
+)
+def _played_enemy_team_matrix(context: MetricEvaluationContext) -> np.ndarray:
+    return compact_played_rounds(
+        context["enemy_team_matrix"], context["play_mask"], RESTING
+    )
+
+
+@register_intermediate(
+    "played_opponent_matrix", requires=("opponent_matrix", "play_mask")
+)
+def _played_opponent_matrix(context: MetricEvaluationContext) -> np.ndarray:
+    return compact_played_rounds(
+        context["opponent_matrix"], context["play_mask"], RESTING
+    )
+
+
+@register_intermediate("consecutive_teammates", requires=("played_partner_matrix",))
+def _consecutive_teammates(context: MetricEvaluationContext) -> np.ndarray:
+    return find_consecutive_repeats(context["played_partner_matrix"], RESTING)
+
+
+@register_intermediate(
+    "consecutive_enemy_teams", requires=("played_enemy_team_matrix",)
+)
+def _consecutive_enemy_teams(context: MetricEvaluationContext) -> np.ndarray:
+    return find_consecutive_repeats(context["played_enemy_team_matrix"], RESTING)
+
+
+@register_intermediate(
+    "consecutive_enemy_players", requires=("played_opponent_matrix",)
+)
+def _consecutive_enemy_players(context: MetricEvaluationContext) -> np.ndarray:
+    return find_consecutive_repeats(context["played_opponent_matrix"], RESTING)
+
+
+@register_intermediate("consecutive_teammates_rounds", requires=("partner_matrix",))
+def _consecutive_teammates_rounds(context: MetricEvaluationContext) -> np.ndarray:
+    return find_consecutive_repeats(context["partner_matrix"], RESTING)
+
+
+@register_intermediate(
+    "consecutive_enemy_teams_rounds", requires=("enemy_team_matrix",)
+)
+def _consecutive_enemy_teams_rounds(context: MetricEvaluationContext) -> np.ndarray:
+    return find_consecutive_repeats(context["enemy_team_matrix"], RESTING)
+
+
+@register_intermediate(
+    "consecutive_enemy_players_rounds", requires=("opponent_matrix",)
+)
+def _consecutive_enemy_players_rounds(
+    context: MetricEvaluationContext,
+) -> np.ndarray:
+    return find_consecutive_repeats(context["opponent_matrix"], RESTING)
+
+
+# ====== METRICS ======
+
+
+@register_metric(
+    MetricType.GLOBAL_NOT_PLAYING_PLAYERS_INDEX, requires=("active_players",)
+)
+def compute_not_playing_players_index(context: MetricEvaluationContext) -> int:
+    return context.num_players - np.sum(context["active_players"])
+
+
+@register_metric(
+    MetricType.GLOBAL_PLAYED_MATCHES_INDEX, requires=("play_mask", "active_players")
+)
+def compute_played_matches_index(context: MetricEvaluationContext) -> float:
+    num_played_matches = np.sum(context["play_mask"], axis=1)
+
+    if context.availability is not None:
+        # played share of the available rounds, scaled to the whole session
+        num_rounds = context.availability.shape[1]
+        num_available_rounds = np.maximum(np.sum(context.availability, axis=1), 1)
+        num_played_matches = num_played_matches * num_rounds / num_available_rounds
+
+    return np.std(num_played_matches[context["active_players"]])
+
+
+@register_metric(
+    MetricType.GLOBAL_MATCHUP_SESSION_LENGTH_BETWEEN_BREAKS_INDEX,
+    requires=("session_runs", "active_players"),
+)
+def compute_second_continous_matchup_length_focused_on_short_sessions_index(
+    context: MetricEvaluationContext,
+) -> float:
+    second_session_lengths = compute_nth_run_length_per_row(
+        context["session_runs"], context.num_encoded_players, n=1, default=10.0
+    )
+    return np.std(second_session_lengths[context["active_players"]])
+
+
+@register_metric(MetricType.GLOBAL_BREAK_SHORTNESS_INDEX, requires=("break_runs",))
+def compute_break_shortness_index(context: MetricEvaluationContext) -> float:
+    """This metric computes, the summed squared break lengths above length of 1 for all players, to penalize longer breaks."""
+    return compute_break_shortness(context["break_runs"])
+
+
+@register_metric(
+    MetricType.GLOBAL_TEAMMATE_VARIETY_INDEX,
+    requires=("teammate_counts", "active_players"),
+)
+def compute_teammate_variety_index(context: MetricEvaluationContext) -> float:
+    teammate_hist_stdev = compute_nonzero_stdev_per_row(context["teammate_counts"])
+    return np.sum(teammate_hist_stdev[context["active_players"]])
+
+
+@register_metric(
+    MetricType.GLOBAL_ENEMY_TEAM_VARIETY_INDEX,
+    requires=("enemy_team_runs", "active_players"),
+)
+def compute_enemy_team_variety_index(context: MetricEvaluationContext) -> float:
+    enemy_teams_hist_stdev = compute_run_lengths_stdev_per_row(
+        context["enemy_team_runs"], context.num_encoded_players
+    )
+    return np.sum(enemy_teams_hist_stdev[context["active_players"]])
+
+
+@register_metric(
+    MetricType.GLOBAL_TEAMMATE_SUCCESSION_INDEX, requires=("consecutive_teammates",)
+)
+def compute_teammate_succession_index(context: MetricEvaluationContext) -> float:
+    return np.sum(context["consecutive_teammates"])
+
+
+@register_metric(
+    MetricType.GLOBAL_ENEMY_TEAM_SUCCESSION_INDEX,
+    requires=("consecutive_enemy_teams",),
+)
+def compute_enemy_team_succession_index(context: MetricEvaluationContext) -> float:
+    return np.sum(context["consecutive_enemy_teams"])
+
+
+@register_metric(
+    MetricType.GLOBAL_ENEMY_PLAYER_SUCCESSION_INDEX,
+    requires=("consecutive_enemy_players",),
+)
+def compute_enemy_player_succession_index(context: MetricEvaluationContext) -> float:
+    return np.sum(context["consecutive_enemy_players"])
+
+
+@register_metric(
+    MetricType.GLOBAL_TEAMMATE_ROUND_SUCCESSION_INDEX,
+    requires=("consecutive_teammates_rounds",),
+)
+def compute_teammate_round_succession_index(
+    context: MetricEvaluationContext,
+) -> float:
+    return np.sum(context["consecutive_teammates_rounds"])
+
+
+@register_metric(
+    MetricType.GLOBAL_ENEMY_TEAM_ROUND_SUCCESSION_INDEX,
+    requires=("consecutive_enemy_teams_rounds",),
+)
+def compute_enemy_team_round_succession_index(
+    context: MetricEvaluationContext,
+) -> float:
+    return np.sum(context["consecutive_enemy_teams_rounds"])
+
+
+@register_metric(
+    MetricType.GLOBAL_ENEMY_PLAYER_ROUND_SUCCESSION_INDEX,
+    requires=("consecutive_enemy_players_rounds",),
+)
+def compute_enemy_player_round_succession_index(
+    context: MetricEvaluationContext,
+) -> float:
+    return np.sum(context["consecutive_enemy_players_rounds"])
+
+
+def _compute_unique_people_not_played_with_or_against(
+    context: MetricEvaluationContext,
+) -> np.ndarray:
+    return compute_unique_people_not_met_per_row(
+        context.num_players, context["teammate_counts"] + context["opponent_counts"]
+    )[context["active_players"]]
+
+
+@register_metric(
+    MetricType.GLOBAL_PLAYER_ENGAGEMENT_FAIRNESS_INDEX,
+    requires=("teammate_counts", "opponent_counts", "active_players"),
+)
+def compute_player_engagement_fairness_index(
+    context: MetricEvaluationContext,
+) -> float:
+    return np.std(_compute_unique_people_not_played_with_or_against(context))
+
+
+@register_metric(
+    MetricType.GLOBAL_NOT_PLAYED_WITH_OR_AGAINST_PLAYERS_INDEX,
+    requires=("teammate_counts", "opponent_counts", "active_players"),
+)
+def compute_not_played_with_or_against_players_index(
+    context: MetricEvaluationContext,
+) -> float:
+    return np.sum(_compute_unique_people_not_played_with_or_against(context))
+
+
+@register_metric(
+    MetricType.GLOBAL_NOT_PLAYED_WITH_PLAYERS_INDEX,
+    requires=("teammate_counts", "active_players"),
+)
+def compute_not_played_with_players_index(context: MetricEvaluationContext) -> float:
+    return np.sum(
+        compute_unique_people_not_met_per_row(
+            context.num_players, context["teammate_counts"]
+        )[context["active_players"]]
+    )
+
+
+@register_metric(
+    MetricType.GLOBAL_NOT_PLAYED_AGAINST_PLAYERS_INDEX,
+    requires=("opponent_counts", "active_players"),
+)
+def compute_not_played_against_players_index(
+    context: MetricEvaluationContext,
+) -> float:
+    return np.sum(
+        compute_unique_people_not_met_per_row(
+            context.num_players, context["opponent_counts"]
+        )[context["active_players"]]
+    )
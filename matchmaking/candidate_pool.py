@@ -0,0 +1,64 @@
+from typing import List, Optional
+
+import numpy as np
+
+
+class CandidatePool:
+    """
+    The K lowest-loss distinct schedules seen by an optimizer, with their raw metric
+    vectors, so they can be rescored under new weights as one matrix-vector product.
+    """
+
+    def __init__(self, num_metrics: int, max_size: int = 200, schedule_dtype=np.int16):
+        self.max_size = max_size
+        self.schedule_dtype = schedule_dtype
+
+        self.schedules: Optional[np.ndarray] = None
+        self.metrics = np.zeros((0, num_metrics), dtype=np.float64)
+        self.losses = np.zeros(0, dtype=np.float64)
+        self._keys: List[bytes] = []
+        self._key_set = set()
+
+    def __len__(self) -> int:
+        return self.losses.shape[0]
+
+    def add(self, schedule: np.ndarray, metric_vector: np.ndarray, loss: float) -> bool:
+        """Add a schedule if it is new and better than the worst pooled one. Returns whether it was added."""
+        if self.max_size <= 0:
+            return False
+
+        is_full = len(self) >= self.max_size
+        if is_full and loss >= self.losses.max():
+            return False
+
+        schedule = schedule.astype(self.schedule_dtype)
+        key = schedule.tobytes()
+        if key in self._key_set:
+            return False
+
+        if self.schedules is None:
+            self.schedules = np.zeros(
+                (self.max_size,) + schedule.shape, dtype=self.schedule_dtype
+            )
+
+        if is_full:
+            index = int(np.argmax(self.losses))
+            self.metrics[index] = metric_vector
+            self.losses[index] = loss
+            self._key_set.remove(self._keys[index])
+            self._keys[index] = key
+        else:
+            index = len(self)
+            self.metrics = np.concatenate([self.metrics, metric_vector[None]])
+            self.losses = np.append(self.losses, loss)
+            self._keys.append(key)
+
+        self._key_set.add(key)
+        self.schedules[index] = schedule
+
+        return True
+
+    def get_schedules(self) -> np.ndarray:
+        if self.schedules is None:
+            return np.zeros((0,), dtype=self.schedule_dtype)
+        return self.schedules[: len(self)]
@@ -0,0 +1,56 @@
+# Compact checkpoint files of a running search, see MatchupOptimizer.save_checkpoint
+import json
+import os
+import tempfile
+from pathlib import Path
+from typing import Dict, Tuple, Union
+
+import numpy as np
+
+# 2: the state of the optimizer's own generator instead of numpy's global one
+CHECKPOINT_FORMAT_VERSION = 2
+
+DEFAULT_CHECKPOINT_INTERVAL_SECONDS = 60.0
+
+# key of the JSON encoded scalars and names next to the arrays of a checkpoint
+_META_KEY = "meta"
+
+
+def write_checkpoint(
+    path: Union[str, Path], arrays: Dict[str, np.ndarray], meta: dict
+) -> None:
+    """
+    Write the arrays and the JSON serializable meta data to a compressed .npz file.
+    The old checkpoint is only replaced once the new one is complete, so a process
+    killed while writing leaves the previous checkpoint intact.
+    """
+    out_dir = Path(path).parent
+    os.makedirs(out_dir, exist_ok=True)
+
+    file_descriptor, temp_path = tempfile.mkstemp(dir=out_dir, suffix=".npz")
+    try:
+        with os.fdopen(file_descriptor, "wb") as f:
+            np.savez_compressed(
+                f,
+                **{_META_KEY: np.array(json.dumps(meta))},
+                **arrays,
+            )
+        os.replace(temp_path, path)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+
+
+def read_checkpoint(path: Union[str, Path]) -> Tuple[Dict[str, np.ndarray], dict]:
+    """Arrays and meta data of a checkpoint written by write_checkpoint."""
+    with np.load(path) as data:
+        arrays = {key: data[key] for key in data.files if key != _META_KEY}
+        meta = json.loads(str(data[_META_KEY]))
+
+    if meta.get("format_version") != CHECKPOINT_FORMAT_VERSION:
+        raise ValueError(
+            f"Checkpoint {path} has format version {meta.get('format_version')}, "
+            f"expected {CHECKPOINT_FORMAT_VERSION}."
+        )
+
+    return arrays, meta
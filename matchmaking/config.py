@@ -1,4 +1,9 @@
+from typing import Tuple, Union
+
+import numpy as np
+
 from matchmaking.metric_type import MetricType
+from matchmaking.metric_registry import get_metric_name
 
 
 class MetricWeightsConfig:
@@ -38,5 +43,28 @@ class MetricWeightsConfig:
     #         GLOBAL_NOT_PLAYED_WITH_PLAYERS_INDEX = "global_not_played_with_players_index"
     # GLOBAL_NOT_PLAYED_AGAINST_PLAYERS_INDEX = "global_not_played_against_players_index"
 
-    def update_weight(self, metric: MetricType, new_value: float):
+    def update_weight(self, metric: Union[MetricType, str], new_value: float):
         self.weight_per_metric[metric] = new_value
+
+    def get_weighted_metric_names(self) -> Tuple[str, ...]:
+        """Names of all metrics with a non-zero weight, which are the only ones needed for the loss."""
+        return tuple(
+            get_metric_name(metric)
+            for metric, weight in self.weight_per_metric.items()
+            if weight != 0.0
+        )
+
+    def get_metric_names(self) -> Tuple[str, ...]:
+        """Names of all configured metrics, including those weighted with 0."""
+        return tuple(get_metric_name(metric) for metric in self.weight_per_metric)
+
+    def get_weight_vector(self, metric_names: Tuple[str, ...]) -> np.ndarray:
+        """Weights in the order of the given metric names, 0 for unweighted metrics."""
+        weight_per_metric_name = {
+            get_metric_name(metric): weight
+            for metric, weight in self.weight_per_metric.items()
+        }
+        return np.array(
+            [weight_per_metric_name.get(name, 0.0) for name in metric_names],
+            dtype=np.float64,
+        )
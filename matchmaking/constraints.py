@@ -0,0 +1,327 @@
+from dataclasses import dataclass, field
+from itertools import combinations
+from typing import Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+from matchmaking.data import Matchup, Player, Team
+
+# the three ways to split four players into two teams, as slots of a sorted 4-tuple
+_TEAM_SPLITS = np.array([[0, 1, 2, 3], [0, 2, 1, 3], [0, 3, 1, 2]])
+
+# the catalog grows with the fourth power of the roster (about 100 MB of masks and
+# index at 48 players), larger rosters are planned by the large-scale engine
+MAX_CATALOG_PLAYERS = 48
+
+
+@dataclass
+class ConstraintSpec:
+    """
+    Hard constraints of a plan, by player uid. Pinned matchups are given per round
+    index (0-based) and fill the first fields of that round.
+    """
+
+    forbidden_teammates: List[Tuple[str, str]] = field(default_factory=list)
+    forbidden_opponents: List[Tuple[str, str]] = field(default_factory=list)
+    pinned_matchups: Dict[int, List[Matchup]] = field(default_factory=dict)
+
+
+def build_matchup_catalog(num_players: int) -> np.ndarray:
+    """All distinct matchups of num_players players as rows (a0, a1, b0, b1), a0 < a1, b0 < b1, a0 < b0."""
+    quadruples = np.array(list(combinations(range(num_players), 4)), dtype=np.int64)
+    if quadruples.size == 0:
+        return np.zeros((0, 4), dtype=np.int64)
+
+    return quadruples[:, _TEAM_SPLITS].reshape(-1, 4)
+
+
+def _get_pair_matrix(
+    pairs: List[Tuple[str, str]], index_per_uid: Dict[str, int]
+) -> np.ndarray:
+    num_players = len(index_per_uid)
+    matrix = np.zeros((num_players, num_players), dtype=bool)
+
+    for uid_a, uid_b in pairs:
+        a, b = index_per_uid[uid_a], index_per_uid[uid_b]
+        matrix[a, b] = matrix[b, a] = True
+
+    return matrix
+
+
+class CompiledConstraints:
+    """
+    A ConstraintSpec compiled once into boolean masks over the catalog of all
+    matchups of the roster. Samplers draw directly from the feasible entries instead
+    of rejecting infeasible samples.
+    """
+
+    def __init__(
+        self,
+        spec: ConstraintSpec,
+        players: List[Player],
+        num_rounds: int,
+        num_fields: int,
+        availability: Optional[np.ndarray] = None,
+    ):
+        if len(players) > MAX_CATALOG_PLAYERS:
+            raise ValueError(
+                f"Constraints are supported for at most {MAX_CATALOG_PLAYERS} players, "
+                f"got {len(players)}."
+            )
+
+        self.players = players
+        self.num_rounds = num_rounds
+        self.num_fields = num_fields
+
+        self.index_per_uid = {
+            player.get_unique_identifier(): i for i, player in enumerate(players)
+        }
+        unknown_uids = {
+            uid
+            for pair in spec.forbidden_teammates + spec.forbidden_opponents
+            for uid in pair
+        } - set(self.index_per_uid)
+        if unknown_uids:
+            raise ValueError(f"Unknown players in constraints: {sorted(unknown_uids)}")
+
+        self.catalog = build_matchup_catalog(len(players))
+        # one bit per player, so a candidate check is a single vectorized AND
+        self.catalog_bits = (
+            np.bitwise_or.reduce(
+                np.left_shift(np.uint64(1), self.catalog.astype(np.uint64)), axis=1
+            )
+            if len(players) <= 64
+            else None
+        )
+        self.catalog_index_per_key = {
+            self._get_key(row): i for i, row in enumerate(self.catalog.tolist())
+        }
+
+        forbidden_teammates = _get_pair_matrix(
+            spec.forbidden_teammates, self.index_per_uid
+        )
+        forbidden_opponents = _get_pair_matrix(
+            spec.forbidden_opponents, self.index_per_uid
+        )
+
+        a0, a1, b0, b1 = self.catalog.T
+        self.feasible = ~(
+            forbidden_teammates[a0, a1]
+            | forbidden_teammates[b0, b1]
+            | forbidden_opponents[a0, b0]
+            | forbidden_opponents[a0, b1]
+            | forbidden_opponents[a1, b0]
+            | forbidden_opponents[a1, b1]
+        )
+
+        self.pinned_per_round: Dict[int, List[int]] = {
+            round_index: [self.get_catalog_index(matchup) for matchup in matchups]
+            for round_index, matchups in spec.pinned_matchups.items()
+        }
+
+        # pinned matchups are only played in their round
+        self.free = self.feasible.copy()
+        for indices in self.pinned_per_round.values():
+            self.free[indices] = False
+
+        self.availability = (
+            np.ones((len(players), num_rounds), dtype=bool)
+            if availability is None
+            else availability
+        )
+
+        self.check_feasibility()
+
+    @staticmethod
+    def _get_key(row) -> Tuple[int, int, int, int]:
+        a0, a1, b0, b1 = row
+        team_a, team_b = sorted([tuple(sorted((a0, a1))), tuple(sorted((b0, b1)))])
+        return team_a + team_b
+
+    def get_catalog_index(self, matchup: Matchup) -> int:
+        try:
+            row = [self.index_per_uid[uid] for uid in matchup.get_all_player_uids()]
+        except KeyError as e:
+            raise ValueError(f"Unknown player in pinned matchup {matchup}: {e}")
+        return self.catalog_index_per_key[self._get_key(row)]
+
+    def get_matchup(self, catalog_index: int) -> Matchup:
+        a0, a1, b0, b1 = self.catalog[catalog_index].tolist()
+        players = self.players
+        return Matchup(Team(players[a0], players[a1]), Team(players[b0], players[b1]))
+
+    def check_feasibility(self) -> None:
+        """
+        Raise a ValueError if the constraints can not be met, before any search. This
+        checks necessary conditions: valid pinned matchups, and for every round enough
+        available players that take part in at least one feasible matchup.
+        """
+        all_pinned = [i for indices in self.pinned_per_round.values() for i in indices]
+        if len(all_pinned) != len(set(all_pinned)):
+            raise ValueError("A matchup is pinned more than once.")
+
+        for round_index, indices in self.pinned_per_round.items():
+            if not 0 <= round_index < self.num_rounds:
+                raise ValueError(f"Pinned round {round_index} is not part of the plan.")
+            if len(indices) > self.num_fields:
+                raise ValueError(
+                    f"More pinned matchups than fields in round {round_index}."
+                )
+            if not np.all(self.feasible[indices]):
+                raise ValueError(
+                    f"A pinned matchup of round {round_index} breaks a forbidden pairing."
+                )
+
+            pinned_players = self.catalog[indices].ravel()
+            if len(set(pinned_players.tolist())) != pinned_players.size:
+                raise ValueError(
+                    f"A player is pinned to several matchups in round {round_index}."
+                )
+            if not np.all(self.availability[pinned_players, round_index]):
+                raise ValueError(
+                    f"A pinned player is not available in round {round_index}."
+                )
+
+        for round_index in range(self.num_rounds):
+            num_free_fields = self.num_fields - len(
+                self.pinned_per_round.get(round_index, [])
+            )
+            if num_free_fields == 0:
+                continue
+
+            candidates = self.get_candidates(
+                self.availability[:, round_index], self.get_pinned_players(round_index)
+            )
+            num_coverable_players = np.unique(self.catalog[candidates]).size
+
+            if num_coverable_players < num_free_fields * 4:
+                raise ValueError(
+                    f"Round {round_index} can not be filled: only {num_coverable_players} "
+                    f"players fit into a feasible matchup, {num_free_fields * 4} are needed."
+                )
+
+        num_needed = self.num_rounds * self.num_fields - len(all_pinned)
+        if np.sum(self.free) < num_needed:
+            raise ValueError(
+                f"Only {np.sum(self.free)} feasible matchups for {num_needed} unique matchups."
+            )
+
+    def is_round_valid(self, round_index: int, matchups: List[Matchup]) -> bool:
+        """True if the round contains its pinned matchups and otherwise only free feasible ones."""
+        indices = [self.get_catalog_index(matchup) for matchup in matchups]
+        pinned = self.pinned_per_round.get(round_index, [])
+
+        return set(pinned) <= set(indices) and all(
+            self.free[i] or i in pinned for i in indices
+        )
+
+    def get_pinned_players(self, round_index: int) -> np.ndarray:
+        used_players = np.zeros(len(self.players), dtype=bool)
+        used_players[self.catalog[self.pinned_per_round.get(round_index, [])]] = True
+        return used_players
+
+    def get_candidates(
+        self, draftable_players: np.ndarray, used_players: np.ndarray
+    ) -> np.ndarray:
+        """Indices of free catalog entries with only draftable and not yet used players."""
+        allowed_players = draftable_players & ~used_players
+
+        if self.catalog_bits is None:
+            return np.flatnonzero(
+                self.free & np.all(allowed_players[self.catalog], axis=1)
+            )
+
+        blocked_bits = np.bitwise_or.reduce(
+            np.left_shift(
+                np.uint64(1), np.flatnonzero(~allowed_players).astype(np.uint64)
+            ),
+            initial=np.uint64(0),
+        )
+        return np.flatnonzero(self.free & ((self.catalog_bits & blocked_bits) == 0))
+
+    def _draw_candidate(
+        self,
+        candidates: np.ndarray,
+        matchup_history: Set[str],
+        rng: np.random.Generator,
+        player_weights: Optional[np.ndarray] = None,
+    ) -> Optional[int]:
+        """
+        A random candidate that was not played yet, None if all were. With player
+        weights, a candidate is drawn in proportion to the product of the weights of
+        its players.
+        """
+        if candidates.size == 0:
+            return None
+
+        if player_weights is None:
+            draws = rng.integers(candidates.size, size=8)
+        else:
+            weights = np.prod(player_weights[self.catalog[candidates]], axis=1)
+            probabilities = weights / weights.sum()
+            draws = rng.choice(candidates.size, size=8, p=probabilities)
+
+        # already played matchups are few compared to the candidates, so a random
+        # draw rarely hits one, the shuffled scan only runs if it keeps hitting
+        for index in draws:
+            if not self._is_in_history(candidates[index], matchup_history):
+                return int(candidates[index])
+
+        order = (
+            rng.permutation(candidates)
+            if player_weights is None
+            else candidates[
+                rng.choice(
+                    candidates.size, candidates.size, replace=False, p=probabilities
+                )
+            ]
+        )
+        return next(
+            (int(i) for i in order if not self._is_in_history(i, matchup_history)),
+            None,
+        )
+
+    def _is_in_history(self, catalog_index: int, matchup_history: Set[str]) -> bool:
+        return (
+            self.get_matchup(catalog_index).get_unique_identifier() in matchup_history
+        )
+
+    def sample_round(
+        self,
+        round_index: int,
+        draftable_players: np.ndarray,
+        matchup_history: Set[str],
+        max_attempts: int = 100,
+        rng: Optional[np.random.Generator] = None,
+        player_weights: Optional[np.ndarray] = None,
+    ) -> List[Matchup]:
+        """
+        Pinned matchups of the round followed by matchups drawn field by field from
+        the feasible ones. Only a dead end, where no feasible matchup is left for a
+        field, restarts the round. Player weights, indexed like the players, e.g.
+        their draft probability scores, favour the matchups of heavier players.
+        """
+        pinned = self.pinned_per_round.get(round_index, [])
+        rng = np.random.default_rng() if rng is None else rng
+
+        for _ in range(max_attempts):
+            used_players = self.get_pinned_players(round_index)
+            indices = list(pinned)
+
+            while len(indices) < self.num_fields:
+                index = self._draw_candidate(
+                    self.get_candidates(draftable_players, used_players),
+                    matchup_history,
+                    rng,
+                    player_weights,
+                )
+                if index is None:
+                    break
+
+                indices.append(index)
+                used_players[self.catalog[index]] = True
+
+            if len(indices) == self.num_fields:
+                return [self.get_matchup(i) for i in indices]
+
+        raise ValueError(f"No feasible matchups found for round {round_index}.")
@@ -137,9 +137,9 @@ class Matchup:
             return None
 
     def get_enemy_team(self, player_uid: str) -> Optional[Team]:
-        if player_uid in self.team_a.get_unique_identifier():
+        if player_uid in self.team_a.get_all_player_uids():
             return self.team_b
-        elif player_uid in self.team_b.get_unique_identifier():
+        elif player_uid in self.team_b.get_all_player_uids():
             return self.team_a
         else:
             return None
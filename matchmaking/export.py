@@ -2,15 +2,19 @@ from typing import List
 import os
 from pathlib import Path
 import json
+import csv
 from copy import deepcopy
 
 import pandas as pd
 import numpy as np
+from openpyxl import Workbook
 
 from matchmaking.data import Matchup, Team, Player
 from matchmaking.metrics import PlayerStatistics
+from matchmaking.timer import profiled
 
 
+@profiled("export_results_to_json")
 def export_results_to_json(results: dict, out_path: str):
     out_dir = Path(out_path).parent
     if out_dir:
@@ -28,6 +32,10 @@ def export_results_to_json(results: dict, out_path: str):
     for key in results.keys():
         if key == "global":
             continue
+        elif key == "costs":
+            results_jsonified[key] = {
+                name: cost.jsonify() for name, cost in results[key].items()
+            }
         else:
             results_jsonified[key] = deepcopy(results[key]).jsonify()
 
@@ -48,6 +56,55 @@ def convert_npint64_and_npfloat64_to_int_and_float_in_dict(data: dict) -> dict:
 
 
 # TODO: add point differences to excel sheet and respective formula (not just points that someone has made on their team side!)
+EXCEL_COLUMN_NAMES = [
+    "Round",
+    "Field",
+    "Team 1",
+    "Team 1",
+    "VS",
+    "Team 2",
+    "Team 2",
+    "",
+    "Points Team 1",
+    "Points Team 2",
+    "",
+]
+
+
+def _create_matchup_row(
+    index: int, matchup: Matchup, num_fields: int, num_players: int
+) -> list:
+    """Row of the index-th matchup of the plan, with empty result cells."""
+    row = [
+        index // num_fields,
+        f"Field {index%num_fields}",
+        matchup.team_a.player_1.get_unique_identifier(),
+        matchup.team_a.player_2.get_unique_identifier(),
+        "vs.",
+        matchup.team_b.player_1.get_unique_identifier(),
+        matchup.team_b.player_2.get_unique_identifier(),
+    ]
+    row += [None]  # spacer
+    row += [None]  # sets team 1 result
+    row += [None]  # sets team 2 result
+    row += [None]  # spacer
+
+    for player_id in range(num_players):
+        if index == 0 and player_id == 0:
+            row += [
+                "'=IF(OR($C2=L$1; $D2=L$1); IF($I2>$J2; 3; IF($I2=$J2; 1; 0)); IF(OR($F2=L$1; $G2=L$1); IF($J2>$I2; 3; IF($I2=$J2; 1; 0)); 0))"
+            ]
+        else:
+            row += [None]  # empty cells for each player, later used for result points
+
+    return row
+
+
+def _create_sum_row(num_matchups: int) -> list:
+    return [None] * 10 + ["Summe"] + [f"=SUM(L2:L{num_matchups+1})"]
+
+
+@profiled("export_to_excel")
 def export_to_excel(
     matchups: List[Matchup], players: List[Player], num_fields: int, out_path: str
 ):
@@ -58,53 +115,75 @@ def export_to_excel(
 
     # Create a DataFrame and write it to an Excel file
 
-    df_list = []
-    for i, matchup in enumerate(matchups):
-
-        team1_player_1_str = matchup.team_a.player_1.get_unique_identifier()
-        team1_player_2_str = matchup.team_a.player_2.get_unique_identifier()
-        team2_player_1_str = matchup.team_b.player_1.get_unique_identifier()
-        team2_player_2_str = matchup.team_b.player_2.get_unique_identifier()
-        row = [
-            i // num_fields,
-            f"Field {i%num_fields}",
-            team1_player_1_str,
-            team1_player_2_str,
-            "vs.",
-            team2_player_1_str,
-            team2_player_2_str,
-        ]
-        row += [None]  # spacer
-        row += [None]  # sets team 1 result
-        row += [None]  # sets team 2 result
-        row += [None]  # spacer
-
-        for player_id, _ in enumerate(players):
-            if i == 0 and player_id == 0:
-                row += [
-                    "'=IF(OR($C2=L$1; $D2=L$1); IF($I2>$J2; 3; IF($I2=$J2; 1; 0)); IF(OR($F2=L$1; $G2=L$1); IF($J2>$I2; 3; IF($I2=$J2; 1; 0)); 0))"
-                ]
-            else:
-                row += [
-                    None
-                ]  # empty cells for each player, later used for result points
-
-        df_list.append(row)
-
-    df_list.append([None] * 10 + ["Summe"] + [f"=SUM(L2:L{len(matchups)+1})"])  # spacer
-
-    column_names = [
-        "Round",
-        "Field",
-        "Team 1",
-        "Team 1",
-        "VS",
-        "Team 2",
-        "Team 2",
-        "",
-        "Points Team 1",
-        "Points Team 2",
-        "",
-    ] + players
+    df_list = [
+        _create_matchup_row(i, matchup, num_fields, len(players))
+        for i, matchup in enumerate(matchups)
+    ]
+    df_list.append(_create_sum_row(len(matchups)))  # spacer
+
+    column_names = EXCEL_COLUMN_NAMES + players
     df = pd.DataFrame(df_list, columns=column_names)
     df.to_excel(out_path, index=False)
+
+
+class StreamingExporter:
+    """
+    Appends the rows of finalized rounds to an .xlsx or .csv file in the layout of
+    export_to_excel, so long events never hold the whole plan in memory. The .xlsx
+    sheet is written in openpyxl's write-only mode, which buffers rows on disk.
+    """
+
+    def __init__(self, out_path: str, players: List[Player], num_fields: int):
+        self.out_path = out_path
+        self.num_players = len(players)
+        self.num_fields = num_fields
+        self.num_matchups = 0
+
+        out_dir = Path(out_path).parent
+        if out_dir:
+            os.makedirs(out_dir, exist_ok=True)
+
+        header = EXCEL_COLUMN_NAMES + [str(player) for player in players]
+        self.is_csv = Path(out_path).suffix.lower() == ".csv"
+
+        if self.is_csv:
+            self.file = open(out_path, "w", newline="")
+            self.writer = csv.writer(self.file)
+            self.writer.writerow(header)
+        else:
+            self.workbook = Workbook(write_only=True)
+            self.sheet = self.workbook.create_sheet()
+            self.sheet.append(header)
+
+    def _append(self, row: list) -> None:
+        if self.is_csv:
+            self.writer.writerow(row)
+        else:
+            self.sheet.append(row)
+
+    @profiled("export_round")
+    def write_round(self, matchups: List[Matchup]) -> None:
+        for matchup in matchups:
+            self._append(
+                _create_matchup_row(
+                    self.num_matchups, matchup, self.num_fields, self.num_players
+                )
+            )
+            self.num_matchups += 1
+
+        if self.is_csv:
+            self.file.flush()
+
+    def close(self) -> None:
+        self._append(_create_sum_row(self.num_matchups))
+
+        if self.is_csv:
+            self.file.close()
+        else:
+            self.workbook.save(self.out_path)
+
+    def __enter__(self) -> "StreamingExporter":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
@@ -0,0 +1,169 @@
+from dataclasses import dataclass, field
+from math import comb, factorial
+from typing import List, Optional
+
+import numpy as np
+
+from matchmaking.constraints import CompiledConstraints
+
+# share of the unique matchups the random samplers reliably use up when several
+# fields share a round, the last unused matchups rarely form a round of disjoint ones
+SAMPLED_MATCHUP_SHARE = 0.75
+
+
+def get_num_unique_matchups(num_players: int) -> int:
+    # each group of 4 players can be split into 3 different pairs of teams
+    return comb(num_players, 4) * 3
+
+
+def get_num_valid_rounds(num_players: int, num_fields: int) -> int:
+    """Distinct rounds of num_players players on num_fields fields, regardless of the field order."""
+    num_playing = num_fields * 4
+    if num_players < num_playing:
+        return 0
+
+    # the playing players split into groups of 4, each group into teams in 3 ways
+    return (
+        comb(num_players, num_playing)
+        * factorial(num_playing)
+        // (8**num_fields * factorial(num_fields))
+    )
+
+
+@dataclass
+class FeasibilityReport:
+    num_players: int
+    num_rounds: int
+    num_fields: int
+    num_resting_per_round: int
+    # matchups a plan can draw from, and distinct rounds of its smallest round
+    num_unique_matchups: int
+    num_valid_rounds: int
+    # most rounds without repeated matchups, None if matchups may repeat. A counting
+    # bound, the samplers only reliably reach max_num_sampled_rounds, so plans above
+    # that are rejected
+    max_num_rounds: Optional[int]
+    max_num_sampled_rounds: Optional[int]
+    num_matches_per_player: float
+    # every player plays, and so rests, equally often
+    is_even_play_possible: bool
+    # reasons the plan can not be built at all
+    problems: List[str] = field(default_factory=list)
+
+    @property
+    def is_feasible(self) -> bool:
+        return not self.problems
+
+    @property
+    def is_even_rest_possible(self) -> bool:
+        # a player rests in every round they do not play
+        return self.is_even_play_possible
+
+    def check(self) -> None:
+        """Raise a ValueError with all problems if the plan can not be built."""
+        if self.problems:
+            raise ValueError(" ".join(self.problems))
+
+    def get_adjusted_num_rounds(self) -> int:
+        """The requested number of rounds, reduced to max_num_sampled_rounds if that is fewer."""
+        if self.max_num_sampled_rounds is None:
+            return self.num_rounds
+
+        return min(self.num_rounds, self.max_num_sampled_rounds)
+
+
+def analyze_feasibility(
+    num_players: int,
+    num_rounds: int,
+    num_fields: int,
+    availability: Optional[np.ndarray] = None,
+    constraints: Optional[CompiledConstraints] = None,
+    unique_matchups: bool = True,
+    num_used_matchups: int = 0,
+) -> FeasibilityReport:
+    """
+    What a plan of the given shape can achieve, in closed form, so entry points can
+    reject or adjust a request before any search starts. With unique_matchups, no
+    matchup may be played twice (e.g. by the sampling optimizers), num_used_matchups
+    were already played, e.g. in the frozen rounds of a re-plan. The checks are
+    necessary conditions, the compiled constraints check their own. Without an
+    availability mask, the cost does not depend on the number of rounds.
+    """
+    problems = []
+    num_playing = num_fields * 4
+
+    if num_players < num_playing:
+        problems.append("Not enough players for the given number of fields!")
+
+    # players of the smallest round, per round counts only exist with a mask
+    min_num_available = num_players
+    if availability is not None:
+        num_available = np.sum(availability, axis=0)
+        min_num_available = int(np.min(num_available, initial=num_players))
+
+        short_rounds = np.flatnonzero(num_available < num_playing)
+        if short_rounds.size > 0:
+            problems.append(
+                f"Not enough available players for {num_fields} field(s) in rounds "
+                f"{short_rounds.tolist()} (available: {num_available[short_rounds].tolist()})."
+            )
+
+    if constraints is not None:
+        num_unique_matchups = int(np.sum(constraints.feasible))
+    elif availability is not None:
+        num_unique_matchups = get_num_unique_matchups(
+            int(np.sum(np.any(availability, axis=1)))
+        )
+    else:
+        num_unique_matchups = get_num_unique_matchups(num_players)
+
+    max_num_rounds = max_num_sampled_rounds = None
+    if unique_matchups:
+        num_left_matchups = max(num_unique_matchups - num_used_matchups, 0)
+        max_num_rounds = num_left_matchups // num_fields
+        # a single field can use every matchup that is left
+        max_num_sampled_rounds = (
+            max_num_rounds
+            if num_fields == 1
+            else int(num_left_matchups * SAMPLED_MATCHUP_SHARE) // num_fields
+        )
+        if num_rounds > max_num_rounds:
+            problems.append(
+                f"{num_rounds} rounds on {num_fields} field(s) need "
+                f"{num_rounds * num_fields} unique matchups, only "
+                f"{num_left_matchups} are left for {num_players} players. At most "
+                f"{max_num_sampled_rounds} round(s) can be planned."
+            )
+        elif num_rounds > max_num_sampled_rounds:
+            problems.append(
+                f"{num_rounds} rounds on {num_fields} field(s) need "
+                f"{num_rounds * num_fields} of the {num_left_matchups} unique matchups "
+                f"left for {num_players} players, the sampler does not reliably find "
+                f"rounds among the last ones. At most {max_num_sampled_rounds} "
+                f"round(s) can be planned."
+            )
+
+    # a player can only play the even share in rounds they attend
+    num_matches = num_playing * num_rounds
+    is_even_play_possible = (
+        num_players > 0
+        and num_matches % num_players == 0
+        and (
+            availability is None
+            or bool(np.all(np.sum(availability, axis=1) >= num_matches // num_players))
+        )
+    )
+
+    return FeasibilityReport(
+        num_players,
+        num_rounds,
+        num_fields,
+        max(num_players - num_playing, 0),
+        num_unique_matchups,
+        get_num_valid_rounds(min_num_available, num_fields),
+        max_num_rounds,
+        max_num_sampled_rounds,
+        num_matches / num_players if num_players else 0.0,
+        is_even_play_possible,
+        problems,
+    )
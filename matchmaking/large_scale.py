@@ -0,0 +1,475 @@
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from tqdm import tqdm
+
+from matchmaking.data import Player, Matchup
+from matchmaking.config import MetricWeightsConfig
+from matchmaking.constraints import MAX_CATALOG_PLAYERS, ConstraintSpec
+from matchmaking.optimizer import MatchupOptimizer
+from matchmaking.schedule import RESTING, decode_schedule
+from matchmaking.league import LeaguePrior
+from matchmaking.score_cache import DEFAULT_SCORE_CACHE_SIZE
+from matchmaking.online import ONLINE_COST_WEIGHTS
+from matchmaking.timer import profiled, span
+
+# rosters from this size on are planned with the large-scale engine
+LARGE_SCALE_MIN_PLAYERS = 48
+
+# cost of playing a matchup (both teams) that was already played in the plan
+REPEATED_MATCHUP_COST = 100.0
+
+# the three ways to split four players into two teams
+_TEAM_SPLITS = ((0, 1, 2, 3), (0, 2, 1, 3), (0, 3, 1, 2))
+
+
+class SparsePairCounts:
+    """
+    Symmetric counts of player pairs. Only pairs that met are stored, so memory grows
+    with the number of matches played instead of with players².
+    """
+
+    def __init__(self, num_players: int):
+        self.num_players = num_players
+        self.counts: Dict[int, int] = {}
+
+    def _get_key(self, a: int, b: int) -> int:
+        return a * self.num_players + b if a < b else b * self.num_players + a
+
+    def __len__(self) -> int:
+        return len(self.counts)
+
+    def get(self, a: int, b: int) -> int:
+        return self.counts.get(self._get_key(a, b), 0)
+
+    def get_many(self, a: int, others: Iterable[int]) -> np.ndarray:
+        return np.array([self.get(a, b) for b in others], dtype=np.int64)
+
+    def add(self, a: int, b: int, value: int = 1) -> None:
+        key = self._get_key(a, b)
+        count = self.counts.get(key, 0) + value
+        if count == 0:
+            del self.counts[key]
+        else:
+            self.counts[key] = count
+
+    def to_dense(self) -> np.ndarray:
+        counts = np.zeros((self.num_players, self.num_players), dtype=np.int64)
+        for key, count in self.counts.items():
+            a, b = divmod(key, self.num_players)
+            counts[a, b] = counts[b, a] = count
+        return counts
+
+
+class LargeScaleMatchupOptimizer(MatchupOptimizer):
+    """
+    Engine for large tournaments (hundreds of players, dozens of fields).
+
+    Instead of sampling whole plans, the plan is built round by round: the players
+    who rested most often play first, they are greedily paired into teams and teams
+    into matchups by the partner and opponent counts so far, and a local repair
+    exchanges players between matchups as long as that lowers the cost of the
+    round. Each iteration then re-matches the players of one random round against
+    all other rounds and keeps the result if the weighted loss improves.
+
+    Pair counts are sparse and all other state is (players, rounds), so memory grows
+    linearly with the plan.
+    """
+
+    # re-matching rounds may repeat matchups, so any number of rounds can be planned
+    requires_unique_matchups = False
+
+    def __init__(
+        self,
+        players: List[Player],
+        num_rounds: int,
+        num_fields: int,
+        num_iterations: int,
+        weights_and_metrics: MetricWeightsConfig,
+        pareto_archive_size: int = 100,
+        candidate_pool_size: int = 200,
+        rerank_metrics: Iterable[str] = (),
+        availability: Optional[np.ndarray] = None,
+        constraints: Optional[ConstraintSpec] = None,
+        league_prior: Optional[LeaguePrior] = None,
+        patience: Optional[int] = 1000,
+        num_repair_partners: int = 8,
+        frozen_rounds: Optional[np.ndarray] = None,
+        rng: Optional[np.random.Generator] = None,
+        score_cache_size: int = DEFAULT_SCORE_CACHE_SIZE,
+        initial_schedules: Optional[Iterable[np.ndarray]] = None,
+    ):
+        # rounds are re-matched greedily, nothing keeps them within the constraints
+        if constraints is not None:
+            raise ValueError(
+                "The large-scale engine does not support constraints, plan at most "
+                f"{MAX_CATALOG_PLAYERS} players with the sampling optimizers to use them."
+            )
+
+        super().__init__(
+            players,
+            num_rounds,
+            num_fields,
+            num_iterations,
+            weights_and_metrics,
+            pareto_archive_size,
+            candidate_pool_size,
+            rerank_metrics,
+            availability,
+            league_prior=league_prior,
+            rng=rng,
+            score_cache_size=score_cache_size,
+            initial_schedules=initial_schedules,
+        )
+
+        # iterations without improvement after which the search ends early, None to run all
+        self.patience = patience
+        self.num_iterations_without_improvement = 0
+        self.num_repair_partners = num_repair_partners
+
+        num_players = len(players)
+        self.schedule = np.full((num_rounds, num_fields, 4), RESTING, dtype=np.int64)
+        self.partner_counts = SparsePairCounts(num_players)
+        self.opponent_counts = SparsePairCounts(num_players)
+        self.matchup_counts: Dict[Tuple[int, int], int] = {}
+
+        if league_prior is not None:
+            self._add_prior(league_prior)
+
+        # int schedule of rounds played before, e.g. the end of the previous window of a
+        # streamed event, they count for all metrics but are never changed
+        self.num_frozen_rounds = 0 if frozen_rounds is None else len(frozen_rounds)
+        for round_index in range(self.num_frozen_rounds):
+            self._set_round(round_index, frozen_rounds[round_index])
+
+    def _add_prior(self, league_prior: LeaguePrior) -> None:
+        for counts, prior_counts in [
+            (self.partner_counts, league_prior.teammate_counts),
+            (self.opponent_counts, league_prior.opponent_counts),
+        ]:
+            for a, b in zip(*np.nonzero(np.triu(prior_counts, k=1))):
+                counts.add(int(a), int(b), int(prior_counts[a, b]))
+
+    # ====== COSTS ======
+
+    def _get_team_key(self, a: int, b: int) -> int:
+        return a * len(self.players) + b if a < b else b * len(self.players) + a
+
+    def _get_matchup_key(self, matchup) -> Tuple[int, int]:
+        team_a = self._get_team_key(matchup[0], matchup[1])
+        team_b = self._get_team_key(matchup[2], matchup[3])
+        return (team_a, team_b) if team_a < team_b else (team_b, team_a)
+
+    def _load_neighbour_pairings(self, round_index: int) -> None:
+        """Teams and (player, enemy team) pairs of the rounds before and after the round."""
+        self.neighbour_teams = set()
+        self.neighbour_enemy_teams = set()
+
+        for r in (round_index - 1, round_index + 1):
+            if not 0 <= r < self.num_rounds:
+                continue
+
+            for a0, a1, b0, b1 in self.schedule[r].tolist():
+                if a0 == RESTING:
+                    # not planned yet
+                    continue
+                team_a, team_b = self._get_team_key(a0, a1), self._get_team_key(b0, b1)
+                self.neighbour_teams.update((team_a, team_b))
+                self.neighbour_enemy_teams.update(
+                    ((a0, team_b), (a1, team_b), (b0, team_a), (b1, team_a))
+                )
+
+    def _get_team_cost(self, a: int, b: int) -> float:
+        return ONLINE_COST_WEIGHTS["partner_count"] * self.partner_counts.get(
+            a, b
+        ) + ONLINE_COST_WEIGHTS["consecutive_teammate"] * (
+            self._get_team_key(a, b) in self.neighbour_teams
+        )
+
+    def _get_opponent_cost(self, team_a, team_b) -> float:
+        (a0, a1), (b0, b1) = team_a, team_b
+        opponent_count = sum(
+            self.opponent_counts.get(a, b) for a in (a0, a1) for b in (b0, b1)
+        )
+
+        key_a, key_b = self._get_team_key(a0, a1), self._get_team_key(b0, b1)
+        consecutive_enemy_team = (
+            ((a0, key_b) in self.neighbour_enemy_teams)
+            + ((a1, key_b) in self.neighbour_enemy_teams)
+            + ((b0, key_a) in self.neighbour_enemy_teams)
+            + ((b1, key_a) in self.neighbour_enemy_teams)
+        )
+        return (
+            ONLINE_COST_WEIGHTS["opponent_count"] * opponent_count
+            + ONLINE_COST_WEIGHTS["consecutive_enemy_team"] * consecutive_enemy_team
+        )
+
+    def _get_matchup_cost(self, matchup) -> float:
+        a0, a1, b0, b1 = matchup
+        return (
+            self._get_team_cost(a0, a1)
+            + self._get_team_cost(b0, b1)
+            + self._get_opponent_cost((a0, a1), (b0, b1))
+            + REPEATED_MATCHUP_COST
+            * (self._get_matchup_key(matchup) in self.matchup_counts)
+        )
+
+    def _get_best_split(self, players) -> Tuple[float, List[int]]:
+        """Cheapest of the three splits of four players into two teams."""
+        splits = [[players[i] for i in split] for split in _TEAM_SPLITS]
+        costs = [self._get_matchup_cost(split) for split in splits]
+        best_index = int(np.argmin(costs))
+        return costs[best_index], splits[best_index]
+
+    # ====== ROUNDS ======
+
+    def _update_round(self, round_index: int, value: int) -> None:
+        """Add (value 1) or remove (value -1) the matchups of a round to the counts."""
+        for a0, a1, b0, b1 in self.schedule[round_index].tolist():
+            self.partner_counts.add(a0, a1, value)
+            self.partner_counts.add(b0, b1, value)
+            for a in (a0, a1):
+                for b in (b0, b1):
+                    self.opponent_counts.add(a, b, value)
+
+            key = self._get_matchup_key((a0, a1, b0, b1))
+            count = self.matchup_counts.get(key, 0) + value
+            if count == 0:
+                del self.matchup_counts[key]
+            else:
+                self.matchup_counts[key] = count
+
+    def _set_round(self, round_index: int, matchups: np.ndarray) -> None:
+        """Set the matchups of a round whose counts were removed or never added."""
+        self.schedule[round_index] = matchups
+        self._update_round(round_index, 1)
+
+    def _form_teams(self, playing: np.ndarray) -> List[List[int]]:
+        """Pair every player with the cheapest partner left, in random order."""
+        unpaired = self.rng.permutation(playing).tolist()
+        teams = []
+
+        while unpaired:
+            player = unpaired.pop()
+            costs = [self._get_team_cost(player, x) for x in unpaired]
+            partner = unpaired.pop(int(np.argmin(costs)))
+            teams.append([player, partner])
+
+        return teams
+
+    def _form_matchups(self, teams: List[List[int]]) -> np.ndarray:
+        """Pair every team with the cheapest enemy team left, in random order."""
+        unmatched = [teams[i] for i in self.rng.permutation(len(teams))]
+        matchups = []
+
+        while unmatched:
+            team = unmatched.pop()
+            costs = [self._get_opponent_cost(team, other) for other in unmatched]
+            enemy_team = unmatched.pop(int(np.argmin(costs)))
+            matchups.append(team + enemy_team)
+
+        return np.array(matchups, dtype=np.int64)
+
+    def _repair_round(self, matchups: np.ndarray) -> np.ndarray:
+        """
+        Local repair: for the most expensive matchups, try to exchange one player with
+        another matchup of the round and re-split both, keep the cheapest exchange that
+        lowers their summed cost.
+        """
+        costs = np.array([self._get_matchup_cost(m) for m in matchups.tolist()])
+
+        for i in np.argsort(-costs):
+            if costs[i] == 0 or self.num_fields < 2:
+                break
+
+            others = self.rng.permutation(np.delete(np.arange(self.num_fields), i))[
+                : self.num_repair_partners
+            ]
+
+            for j in others:
+                best = None
+                best_cost = costs[i] + costs[j]
+
+                for x in range(4):
+                    for y in range(4):
+                        first, second = matchups[i].tolist(), matchups[j].tolist()
+                        first[x], second[y] = second[y], first[x]
+
+                        first_cost, first = self._get_best_split(first)
+                        second_cost, second = self._get_best_split(second)
+
+                        if first_cost + second_cost < best_cost:
+                            best_cost = first_cost + second_cost
+                            best = (first, first_cost, second, second_cost)
+
+                if best is not None:
+                    matchups[i], costs[i], matchups[j], costs[j] = best
+                    if costs[i] == 0:
+                        break
+
+        return matchups
+
+    @profiled("match_round")
+    def _match_round(self, round_index: int, playing: np.ndarray) -> np.ndarray:
+        self._load_neighbour_pairings(round_index)
+        teams = self._form_teams(playing)
+        matchups = self._form_matchups(teams)
+        return self._repair_round(matchups)
+
+    def _select_playing(
+        self, round_index: int, num_rested: np.ndarray, rest_streak: np.ndarray
+    ) -> np.ndarray:
+        """
+        Players of a round. Those who rested most often while available play first,
+        then those resting for the longest time, remaining ties are broken randomly.
+        """
+        available = (
+            np.arange(len(self.players))
+            if self.availability is None
+            else np.flatnonzero(self.availability[:, round_index])
+        )
+        order = np.lexsort(
+            (
+                self.rng.random(available.size),
+                -rest_streak[available],
+                -num_rested[available],
+            )
+        )
+        return available[order[: self.num_fields * 4]]
+
+    def build_initial_schedule(self) -> np.ndarray:
+        """Greedy plan, built round by round against the rounds before."""
+        num_players = len(self.players)
+        num_rested = (
+            np.zeros(num_players, dtype=np.int64)
+            if self.league_prior is None
+            else self.league_prior.num_rested.copy()
+        )
+        rest_streak = np.zeros(num_players, dtype=np.int64)
+
+        for round_index in range(self.num_rounds):
+            if round_index < self.num_frozen_rounds:
+                playing = self.schedule[round_index].ravel()
+            else:
+                playing = self._select_playing(round_index, num_rested, rest_streak)
+                self._set_round(round_index, self._match_round(round_index, playing))
+
+            is_resting = np.ones(num_players, dtype=bool)
+            is_resting[playing] = False
+            if self.availability is not None:
+                is_resting &= self.availability[:, round_index]
+
+            num_rested[is_resting] += 1
+            rest_streak[is_resting] += 1
+            rest_streak[playing] = 0
+
+        return self.schedule.copy()
+
+    def get_most_diverse_matchups(
+        self,
+    ) -> Tuple[List[Matchup], float, dict, List[float], List[int]]:
+
+        self.search()
+        results, _ = self.get_matchup_set_score(self.best_matchup_config)
+
+        return (
+            self.best_matchup_config,
+            self.min_score,
+            results,
+            self.best_scores,
+            self.best_scores_iterations,
+        )
+
+    @profiled("search")
+    def search(self) -> np.ndarray:
+        """Build and improve the plan, returns its int schedule without scoring all statistics."""
+        self.start_search()
+        if self.is_resumed():
+            # rejected re-matches are undone, so the plan is always the incumbent
+            score = self.min_score
+        else:
+            self.build_initial_schedule()
+            _, score = self.evaluate_schedule(self.schedule.copy())
+        # a resumed search continues from them as well if they are better
+        for schedule in self.initial_schedules:
+            score = self._start_from_better(schedule, score)
+        if score < self.min_score:
+            self._accept(score, self.num_iterations_done)
+            self.num_iterations_without_improvement = 0
+
+        # a resumed search continues after the iterations of its checkpoint
+        for iter in tqdm(
+            range(self.num_iterations_done, self.num_iterations),
+            disable=not self.show_progress_bar(),
+        ):
+            if self.is_stop_requested():
+                break
+            if (
+                self.patience is not None
+                and self.num_iterations_without_improvement >= self.patience
+            ) or self.num_frozen_rounds == self.num_rounds:
+                break
+
+            # re-match the same players, so the play and rest counts do not change
+            round_index = self.rng.integers(self.num_frozen_rounds, self.num_rounds)
+            old_matchups = self.schedule[round_index].copy()
+
+            self._update_round(round_index, -1)
+            self._set_round(
+                round_index, self._match_round(round_index, old_matchups.ravel())
+            )
+
+            _, candidate_score = self.evaluate_schedule(self.schedule.copy())
+            if candidate_score < score:
+                score = candidate_score
+                self._accept(score, iter)
+                self.num_iterations_without_improvement = 0
+            else:
+                self._update_round(round_index, -1)
+                self._set_round(round_index, old_matchups)
+                self.num_iterations_without_improvement += 1
+
+            self.num_iterations_done = iter + 1
+            self.report_progress()
+
+        self.finish_search()
+        return self.schedule.copy()
+
+    def get_checkpoint_state(self) -> Tuple[Dict[str, np.ndarray], dict]:
+        arrays, meta = super().get_checkpoint_state()
+        meta["num_iterations_without_improvement"] = (
+            self.num_iterations_without_improvement
+        )
+        return arrays, meta
+
+    def set_checkpoint_state(self, arrays: Dict[str, np.ndarray], meta: dict) -> None:
+        super().set_checkpoint_state(arrays, meta)
+        self.num_iterations_without_improvement = meta[
+            "num_iterations_without_improvement"
+        ]
+
+        if "best_schedule" in arrays:
+            for round_index in range(self.num_frozen_rounds, self.num_rounds):
+                self._set_round(round_index, arrays["best_schedule"][round_index])
+
+    def _start_from_better(self, schedule: np.ndarray, score: float) -> float:
+        """Continue with the schedule instead of the plan if it scores better, its frozen rounds are ignored."""
+        candidate = np.concatenate(
+            [
+                self.schedule[: self.num_frozen_rounds],
+                schedule[self.num_frozen_rounds :],
+            ]
+        )
+        _, candidate_score = self.evaluate_schedule(candidate)
+        if candidate_score >= score:
+            return score
+
+        for round_index in range(self.num_frozen_rounds, self.num_rounds):
+            self._update_round(round_index, -1)
+            self._set_round(round_index, candidate[round_index])
+        return candidate_score
+
+    def _accept(self, score: float, iter: int) -> None:
+        with span("copy_best_matchups"):
+            self.set_incumbent(decode_schedule(self.schedule, self.players), score)
+        self.record_best_score(score, iter)
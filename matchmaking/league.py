@@ -0,0 +1,174 @@
+import os
+import tempfile
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Union
+
+import numpy as np
+
+from matchmaking.data import Matchup, Player
+from matchmaking.schedule import (
+    RESTING,
+    encode_matchups,
+    compute_play_mask,
+    compute_partner_matrix,
+    compute_opponent_matrix,
+)
+from matchmaking.metric_compute_functions import compute_pair_counts
+
+
+@dataclass
+class LeaguePrior:
+    """
+    Cumulative pairing history of earlier sessions, indexed like the roster of the
+    next session. Players new to the league have zero counts.
+    """
+
+    teammate_counts: np.ndarray
+    opponent_counts: np.ndarray
+    num_played: np.ndarray
+    num_rested: np.ndarray
+
+    def get_rest_shares(self) -> np.ndarray:
+        """Share of the attended rounds each player rested, 0 for players new to the league."""
+        num_attended = self.num_played + self.num_rested
+        return np.divide(
+            self.num_rested,
+            num_attended,
+            out=np.zeros(num_attended.shape),
+            where=num_attended > 0,
+        )
+
+
+class LeagueStore:
+    """
+    Teammate and opponent count matrices and rest counts accumulated over all
+    sessions of a league, kept in a small .npz file. A played session is added as its
+    own count matrices, so earlier sessions are never rescored.
+    """
+
+    def __init__(self):
+        self.player_uids: List[str] = []
+        self.index_per_uid: Dict[str, int] = {}
+        self.num_sessions = 0
+
+        self.teammate_counts = np.zeros((0, 0), dtype=np.int64)
+        self.opponent_counts = np.zeros((0, 0), dtype=np.int64)
+        self.num_played = np.zeros(0, dtype=np.int64)
+        self.num_rested = np.zeros(0, dtype=np.int64)
+
+    @property
+    def num_players(self) -> int:
+        return len(self.player_uids)
+
+    @classmethod
+    def load(cls, path: Union[str, Path]) -> "LeagueStore":
+        """The store saved at path, an empty one if the file does not exist yet."""
+        store = cls()
+        if not Path(path).exists():
+            return store
+
+        with np.load(path, allow_pickle=False) as data:
+            store.player_uids = data["player_uids"].tolist()
+            store.num_sessions = int(data["num_sessions"])
+            store.teammate_counts = data["teammate_counts"]
+            store.opponent_counts = data["opponent_counts"]
+            store.num_played = data["num_played"]
+            store.num_rested = data["num_rested"]
+
+        store.index_per_uid = {uid: i for i, uid in enumerate(store.player_uids)}
+        return store
+
+    def save(self, path: Union[str, Path]) -> None:
+        """Write the store to path, replacing the old file only once it is complete."""
+        out_dir = Path(path).parent
+        os.makedirs(out_dir, exist_ok=True)
+
+        file_descriptor, temp_path = tempfile.mkstemp(dir=out_dir, suffix=".npz")
+        try:
+            with os.fdopen(file_descriptor, "wb") as f:
+                np.savez_compressed(
+                    f,
+                    player_uids=np.array(self.player_uids, dtype=str),
+                    num_sessions=self.num_sessions,
+                    teammate_counts=self.teammate_counts,
+                    opponent_counts=self.opponent_counts,
+                    num_played=self.num_played,
+                    num_rested=self.num_rested,
+                )
+            os.replace(temp_path, path)
+        except BaseException:
+            os.remove(temp_path)
+            raise
+
+    def _get_indices(self, player_uids: List[str]) -> np.ndarray:
+        """Indices of the players in the store, new players are added."""
+        for uid in player_uids:
+            if uid not in self.index_per_uid:
+                self.index_per_uid[uid] = len(self.player_uids)
+                self.player_uids.append(uid)
+
+        num_new = self.num_players - self.num_played.shape[0]
+        if num_new > 0:
+            self.teammate_counts = np.pad(self.teammate_counts, (0, num_new))
+            self.opponent_counts = np.pad(self.opponent_counts, (0, num_new))
+            self.num_played = np.pad(self.num_played, (0, num_new))
+            self.num_rested = np.pad(self.num_rested, (0, num_new))
+
+        return np.array(
+            [self.index_per_uid[uid] for uid in player_uids], dtype=np.int64
+        )
+
+    def add_session(
+        self, matchups: List[Matchup], players: List[Player], num_fields: int
+    ) -> None:
+        """
+        Add a played session. All players of the roster attended, those without a
+        match in a round rested in it.
+        """
+        player_uids = [player.get_unique_identifier() for player in players]
+        schedule, _ = encode_matchups(matchups, num_fields, player_uids)
+        num_players = len(player_uids)
+
+        indices = self._get_indices(player_uids)
+        pairs = np.ix_(indices, indices)
+
+        self.teammate_counts[pairs] += compute_pair_counts(
+            compute_partner_matrix(schedule, num_players), num_players, RESTING
+        )
+        self.opponent_counts[pairs] += compute_pair_counts(
+            compute_opponent_matrix(schedule, num_players), num_players, RESTING
+        )
+
+        num_played = np.sum(compute_play_mask(schedule, num_players), axis=1)
+        self.num_played[indices] += num_played
+        self.num_rested[indices] += schedule.shape[0] - num_played
+
+        self.num_sessions += 1
+
+    def get_prior(self, players: List[Player]) -> LeaguePrior:
+        """The league history of the players, in the order of the roster."""
+        num_players = len(players)
+        known = [
+            (i, self.index_per_uid[player.get_unique_identifier()])
+            for i, player in enumerate(players)
+            if player.get_unique_identifier() in self.index_per_uid
+        ]
+        roster_indices = np.array([i for i, _ in known], dtype=np.int64)
+        store_indices = np.array([j for _, j in known], dtype=np.int64)
+
+        prior = LeaguePrior(
+            teammate_counts=np.zeros((num_players, num_players), dtype=np.int64),
+            opponent_counts=np.zeros((num_players, num_players), dtype=np.int64),
+            num_played=np.zeros(num_players, dtype=np.int64),
+            num_rested=np.zeros(num_players, dtype=np.int64),
+        )
+
+        roster_pairs = np.ix_(roster_indices, roster_indices)
+        store_pairs = np.ix_(store_indices, store_indices)
+        prior.teammate_counts[roster_pairs] = self.teammate_counts[store_pairs]
+        prior.opponent_counts[roster_pairs] = self.opponent_counts[store_pairs]
+        prior.num_played[roster_indices] = self.num_played[store_indices]
+        prior.num_rested[roster_indices] = self.num_rested[store_indices]
+
+        return prior
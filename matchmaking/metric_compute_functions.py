@@ -1,5 +1,5 @@
 # Compute functions for metrics
-from typing import List, Tuple
+from typing import List, NamedTuple, Tuple
 from collections import Counter
 from itertools import groupby
 from matchmaking.data import Matchup
@@ -144,7 +144,103 @@ def compute_unique_people_not_played_against(
 
 
 def _find_consecutive_numbers(arr, target_number: int):
-    return [len(list(group)) for key, group in groupby(arr) if key == target_number]
+    run_lengths = run_length_encode_2d(np.asarray(arr).reshape(1, -1))
+    return run_lengths.lengths[run_lengths.values == target_number].tolist()
+
+
+class RunLengthEncoding(NamedTuple):
+    """Runs of equal values of a 2D array, ordered by row and then by start column."""
+
+    rows: np.ndarray
+    starts: np.ndarray
+    lengths: np.ndarray
+    values: np.ndarray
+
+
+def run_length_encode_2d(arr: np.ndarray) -> RunLengthEncoding:
+    """
+    Run-length encode every row of a 2D array at once, e.g. the (players, rounds) play mask.
+
+    A run starts at the first column and wherever a value differs from its left
+    neighbour; every row is padded with a boundary at its end so runs never cross rows.
+    """
+    arr = np.asarray(arr)
+    num_rows, num_cols = arr.shape
+
+    if num_cols == 0:
+        empty = np.zeros(0, dtype=np.int64)
+        return RunLengthEncoding(empty, empty, empty, arr.reshape(-1))
+
+    boundaries = np.ones((num_rows, num_cols + 1), dtype=bool)
+    boundaries[:, 1:-1] = arr[:, 1:] != arr[:, :-1]
+
+    boundary_positions = np.flatnonzero(boundaries)
+    boundary_rows, boundary_cols = np.divmod(boundary_positions, num_cols + 1)
+
+    # every boundary except the padded one closing a row starts a run, which ends at the next boundary
+    is_start = boundary_cols < num_cols
+    rows = boundary_rows[is_start]
+    starts = boundary_cols[is_start]
+    lengths = np.diff(boundary_cols)[is_start[:-1]]
+
+    return RunLengthEncoding(rows, starts, lengths, arr[rows, starts])
+
+
+def filter_runs(run_lengths: RunLengthEncoding, keep: np.ndarray) -> RunLengthEncoding:
+    return RunLengthEncoding(*(x[keep] for x in run_lengths))
+
+
+def select_runs(run_lengths: RunLengthEncoding, value) -> RunLengthEncoding:
+    return filter_runs(run_lengths, run_lengths.values == value)
+
+
+def split_run_lengths_per_row(
+    run_lengths: RunLengthEncoding, num_rows: int
+) -> List[np.ndarray]:
+    split_indices = np.searchsorted(run_lengths.rows, np.arange(1, num_rows))
+    return np.split(run_lengths.lengths, split_indices)
+
+
+def compute_run_lengths_avg_per_row(
+    run_lengths: RunLengthEncoding, num_rows: int
+) -> np.ndarray:
+    counts = np.bincount(run_lengths.rows, minlength=num_rows)
+    sums = np.bincount(
+        run_lengths.rows, weights=run_lengths.lengths, minlength=num_rows
+    )
+    return np.divide(sums, counts, out=np.zeros(num_rows), where=counts > 0)
+
+
+def compute_run_lengths_stdev_per_row(
+    run_lengths: RunLengthEncoding, num_rows: int
+) -> np.ndarray:
+    counts = np.bincount(run_lengths.rows, minlength=num_rows)
+    avgs = compute_run_lengths_avg_per_row(run_lengths, num_rows)
+    squared_deviations = (run_lengths.lengths - avgs[run_lengths.rows]) ** 2
+    variances = np.bincount(
+        run_lengths.rows, weights=squared_deviations, minlength=num_rows
+    )
+    variances = np.divide(variances, counts, out=np.zeros(num_rows), where=counts > 0)
+    return np.sqrt(variances)
+
+
+def compute_nth_run_length_per_row(
+    run_lengths: RunLengthEncoding, num_rows: int, n: int, default: float
+) -> np.ndarray:
+    # position of each run within its row, rows are sorted so the first run of a row is found by searchsorted
+    positions = np.arange(len(run_lengths.rows)) - np.searchsorted(
+        run_lengths.rows, run_lengths.rows
+    )
+    nth_run_lengths = np.full(num_rows, default, dtype=np.float64)
+    is_nth = positions == n
+    nth_run_lengths[run_lengths.rows[is_nth]] = run_lengths.lengths[is_nth]
+    return nth_run_lengths
+
+
+def compute_break_shortness(break_run_lengths: RunLengthEncoding) -> int:
+    """Summed squared break lengths, ignoring breaks of length 1."""
+    long_breaks = break_run_lengths.lengths[break_run_lengths.lengths > 1]
+    return np.sum(long_breaks**2)
 
 
 # def _find_consecutive_numbers(arr, target_number: int):
@@ -164,3 +260,87 @@ def _find_consecutive_numbers(arr, target_number: int):
 #         lengths.append(length)
 
 #     return lengths
+
+
+def compact_played_rounds(
+    ids: np.ndarray, play_mask: np.ndarray, fill_value: int
+) -> np.ndarray:
+    """
+    Shift the ids of played rounds of every player to the left, so that each row
+    becomes the sequence of played matches; trailing entries are set to fill_value.
+    """
+    order = np.argsort(~play_mask, axis=1, kind="stable")
+    is_played = np.take_along_axis(play_mask, order, axis=1)
+
+    if ids.ndim == 3:
+        order = order[..., None]
+        is_played = is_played[..., None]
+
+    compacted = np.take_along_axis(ids, order, axis=1)
+    return np.where(is_played, compacted, fill_value)
+
+
+def find_consecutive_repeats(ids: np.ndarray, fill_value: int) -> np.ndarray:
+    """
+    Boolean mask of ids that also occurred in the previous column of the same row,
+    shape (rows, cols - 1) for 2D ids. For 3D ids (rows, cols, k), e.g. the two
+    opponents per round, every entry is compared against all k entries of the
+    previous column, giving shape (rows, cols - 1, k).
+    """
+    ids_2d = ids.ndim == 2
+    if ids_2d:
+        ids = ids[..., None]
+
+    current_ids = ids[:, 1:]
+    previous_ids = ids[:, :-1]
+
+    repeats = np.any(current_ids[..., :, None] == previous_ids[..., None, :], axis=-1)
+    repeats &= current_ids != fill_value
+
+    return repeats[..., 0] if ids_2d else repeats
+
+
+def count_consecutive_repeats_per_row(repeats: np.ndarray) -> np.ndarray:
+    return repeats.reshape(repeats.shape[0], -1).sum(axis=1)
+
+
+def compute_pair_counts(
+    ids: np.ndarray, num_players: int, fill_value: int
+) -> np.ndarray:
+    """
+    (players, players) matrix of how often each player met each other player, from a
+    (players, rounds) partner id matrix or a (players, rounds, 2) opponent id matrix.
+    """
+    rows = np.broadcast_to(
+        np.arange(num_players).reshape((-1,) + (1,) * (ids.ndim - 1)), ids.shape
+    )
+    is_valid = ids != fill_value
+    pair_indices = rows[is_valid] * num_players + ids[is_valid]
+    return np.bincount(pair_indices, minlength=num_players * num_players).reshape(
+        num_players, num_players
+    )
+
+
+def compute_nonzero_stdev_per_row(counts: np.ndarray) -> np.ndarray:
+    """Standard deviation of the non-zero entries of every row, 0 for empty rows."""
+    num_rows = counts.shape[0]
+    is_nonzero = counts > 0
+    num_nonzero = is_nonzero.sum(axis=1)
+
+    means = np.divide(
+        counts.sum(axis=1), num_nonzero, out=np.zeros(num_rows), where=num_nonzero > 0
+    )
+    squared_deviations = np.where(is_nonzero, (counts - means[:, None]) ** 2, 0.0)
+    variances = np.divide(
+        squared_deviations.sum(axis=1),
+        num_nonzero,
+        out=np.zeros(num_rows),
+        where=num_nonzero > 0,
+    )
+    return np.sqrt(variances)
+
+
+def compute_unique_people_not_met_per_row(
+    num_players: int, pair_counts: np.ndarray
+) -> np.ndarray:
+    return (num_players - 1) - np.count_nonzero(pair_counts, axis=1)
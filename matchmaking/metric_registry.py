@@ -0,0 +1,216 @@
+import time
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple, Union
+
+import numpy as np
+
+from matchmaking.metric_type import MetricType
+from matchmaking.league import LeaguePrior
+from matchmaking.timer import span
+
+
+@dataclass(frozen=True)
+class IntermediateDefinition:
+    name: str
+    requires: Tuple[str, ...]
+    compute: Callable[["MetricEvaluationContext"], Any]
+
+
+@dataclass(frozen=True)
+class MetricDefinition:
+    name: str
+    requires: Tuple[str, ...]
+    reducer: Callable[["MetricEvaluationContext"], float]
+
+
+@dataclass
+class MetricCost:
+    """How often a metric or intermediate was computed and how long that took in total."""
+
+    kind: str
+    count: int = 0
+    total_ns: int = 0
+
+    @property
+    def mean_ns(self) -> float:
+        return self.total_ns / self.count if self.count else 0.0
+
+    def add(self, duration_ns: int) -> None:
+        self.count += 1
+        self.total_ns += duration_ns
+
+    def jsonify(self) -> dict:
+        return {
+            "kind": self.kind,
+            "count": self.count,
+            "total_ms": self.total_ns / 1e6,
+            "mean_us": self.mean_ns / 1e3,
+        }
+
+
+INTERMEDIATE_REGISTRY: Dict[str, IntermediateDefinition] = {}
+METRIC_REGISTRY: Dict[str, MetricDefinition] = {}
+
+
+def get_metric_name(metric: Union[MetricType, str]) -> str:
+    return metric.value if isinstance(metric, MetricType) else metric
+
+
+def register_intermediate(name: str, requires: Iterable[str] = ()):
+    """
+    Register a shared intermediate (e.g. the play mask) that is computed at most
+    once per evaluation from the schedule and the intermediates it requires.
+    """
+
+    def decorator(compute: Callable[["MetricEvaluationContext"], Any]):
+        INTERMEDIATE_REGISTRY[name] = IntermediateDefinition(
+            name, tuple(requires), compute
+        )
+        get_evaluation_plan.cache_clear()
+        return compute
+
+    return decorator
+
+
+def register_metric(metric: Union[MetricType, str], requires: Iterable[str] = ()):
+    """
+    Register a global metric. The reducer receives the evaluation context with all
+    required intermediates computed and returns a single value. House-rule metrics
+    can be registered under a plain string name and weighted like any MetricType.
+    """
+
+    def decorator(reducer: Callable[["MetricEvaluationContext"], float]):
+        name = get_metric_name(metric)
+        METRIC_REGISTRY[name] = MetricDefinition(name, tuple(requires), reducer)
+        get_evaluation_plan.cache_clear()
+        return reducer
+
+    return decorator
+
+
+class MetricEvaluationContext:
+    """
+    Inputs of a single evaluation and the intermediates computed for it.
+
+    num_players is the size of the roster, num_encoded_players the number of player
+    ids the schedule is encoded with (players without matches included). The optional
+    availability mask has shape (num_encoded_players, rounds). An optional league
+    prior adds the pairings of earlier sessions to the teammate and opponent counts.
+    If a costs dict is given, the time of each computed metric and intermediate is
+    added to it.
+    """
+
+    def __init__(
+        self,
+        schedule: np.ndarray,
+        num_players: int,
+        num_encoded_players: Optional[int] = None,
+        availability: Optional[np.ndarray] = None,
+        league_prior: Optional[LeaguePrior] = None,
+        costs: Optional[Dict[str, MetricCost]] = None,
+    ):
+        self.schedule = schedule
+        self.num_players = num_players
+        self.num_encoded_players = (
+            num_players if num_encoded_players is None else num_encoded_players
+        )
+        self.availability = availability
+        self.league_prior = league_prior
+        self.costs = costs
+        self.intermediates: Dict[str, Any] = {}
+
+    def __getitem__(self, name: str) -> Any:
+        return self.intermediates[name]
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.intermediates
+
+
+def _resolve_intermediates(requires: Iterable[str]) -> List[IntermediateDefinition]:
+    """Order the required intermediates and their dependencies topologically."""
+    ordered: List[IntermediateDefinition] = []
+    visited = set()
+    in_progress = set()
+
+    def visit(name: str):
+        if name in visited:
+            return
+        if name in in_progress:
+            raise ValueError(f"Cyclic dependency of intermediate '{name}'")
+        if name not in INTERMEDIATE_REGISTRY:
+            raise KeyError(f"Unknown intermediate '{name}'")
+
+        in_progress.add(name)
+        intermediate = INTERMEDIATE_REGISTRY[name]
+        for dependency in intermediate.requires:
+            visit(dependency)
+        in_progress.remove(name)
+
+        visited.add(name)
+        ordered.append(intermediate)
+
+    for name in requires:
+        visit(name)
+
+    return ordered
+
+
+def _compute(
+    name: str,
+    kind: str,
+    compute: Callable[[MetricEvaluationContext], Any],
+    context: MetricEvaluationContext,
+) -> Any:
+    with span(name):
+        if context.costs is None:
+            return compute(context)
+
+        start_ns = time.perf_counter_ns()
+        value = compute(context)
+        context.costs.setdefault(name, MetricCost(kind)).add(
+            time.perf_counter_ns() - start_ns
+        )
+        return value
+
+
+class MetricEvaluationPlan:
+    """
+    The metrics to evaluate and the intermediates they need, in dependency order.
+    Intermediates that no selected metric needs are never computed.
+    """
+
+    def __init__(
+        self, metric_names: Tuple[str, ...], extra_requires: Tuple[str, ...] = ()
+    ):
+        self.metrics = [METRIC_REGISTRY[name] for name in metric_names]
+
+        requires = [name for metric in self.metrics for name in metric.requires]
+        self.intermediates = _resolve_intermediates(
+            list(requires) + list(extra_requires)
+        )
+
+    def compute_intermediates(self, context: MetricEvaluationContext) -> None:
+        for intermediate in self.intermediates:
+            if intermediate.name not in context:
+                context.intermediates[intermediate.name] = _compute(
+                    intermediate.name, "intermediate", intermediate.compute, context
+                )
+
+    def evaluate(self, context: MetricEvaluationContext) -> Dict[str, float]:
+        self.compute_intermediates(context)
+
+        results = {}
+        for metric in self.metrics:
+            results[metric.name] = _compute(
+                metric.name, "metric", metric.reducer, context
+            )
+
+        return results
+
+
+@lru_cache(maxsize=64)
+def get_evaluation_plan(
+    metric_names: Tuple[str, ...], extra_requires: Tuple[str, ...] = ()
+) -> MetricEvaluationPlan:
+    return MetricEvaluationPlan(metric_names, extra_requires)
@@ -10,6 +10,14 @@ class MetricType(Enum):
     GLOBAL_PLAYER_ENGAGEMENT_FAIRNESS_INDEX = "global_player_engagement_fairness_index"
     GLOBAL_TEAMMATE_SUCCESSION_INDEX = "global_teammate_succession_index"
     GLOBAL_ENEMY_TEAM_SUCCESSION_INDEX = "global_enemy_team_succession_index"
+    GLOBAL_ENEMY_PLAYER_SUCCESSION_INDEX = "global_enemy_player_succession_index"
+    GLOBAL_TEAMMATE_ROUND_SUCCESSION_INDEX = "global_teammate_round_succession_index"
+    GLOBAL_ENEMY_TEAM_ROUND_SUCCESSION_INDEX = (
+        "global_enemy_team_round_succession_index"
+    )
+    GLOBAL_ENEMY_PLAYER_ROUND_SUCCESSION_INDEX = (
+        "global_enemy_player_round_succession_index"
+    )
     GLOBAL_TEAMMATE_VARIETY_INDEX = "global_teammate_variety_index"
     GLOBAL_ENEMY_TEAM_VARIETY_INDEX = "global_enemy_team_variety_index"
     GLOBAL_BREAK_OCCURRENCE_INDEX = "global_break_occurrence_index"
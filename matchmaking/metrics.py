@@ -1,38 +1,32 @@
-from typing import List, Tuple, Dict
-import statistics
+from typing import List, Tuple, Dict, Optional
+import time
 from collections import Counter
-from abc import ABC, abstractmethod
-from dataclasses import dataclass, field
+from dataclasses import dataclass
 
 import numpy as np
 
-from matchmaking.data import Matchup, Team, Player
+from matchmaking.data import Matchup
 from matchmaking.config import MetricWeightsConfig
-from matchmaking.metric_type import MetricType
+from matchmaking.schedule import encode_matchups, get_enemy_team_uid
+from matchmaking.league import LeaguePrior
+from matchmaking.metric_registry import (
+    METRIC_REGISTRY,
+    MetricCost,
+    MetricEvaluationContext,
+    get_evaluation_plan,
+    get_metric_name,
+)
+import matchmaking.builtin_metrics  # registers the built-in intermediates and metrics
 
 from matchmaking.metric_compute_functions import (
-    compute_num_played_matches,
-    compute_break_lengths,
-    compute_break_lengths_avg,
-    compute_break_lengths_stdev,
     compute_break_lengths_hist,
-    compute_matchup_lengths_played_between_breaks,
-    compute_matchup_lengths_played_between_breaks_second_length,
-    compute_teammate_hist,
-    compute_teammate_hist_stdev,
-    compute_enemy_teams_hist,
-    compute_enemy_teams_hist_stdev,
-    compute_consecutive_teammates_hist,
-    compute_consecutive_enemies_hist,
-    compute_consecutive_teammates_total,
-    compute_consecutive_enemies_total,
-    compute_unique_people_not_played_with_or_against,
-    compute_unique_people_not_played_with,
-    compute_unique_people_not_played_against,
-    _find_consecutive_numbers,
-    _get_teammate_uids,
-    _get_enemy_teams,
-    _count_consecutive_occurences,
+    compute_run_lengths_avg_per_row,
+    compute_run_lengths_stdev_per_row,
+    compute_nth_run_length_per_row,
+    compute_nonzero_stdev_per_row,
+    compute_unique_people_not_met_per_row,
+    count_consecutive_repeats_per_row,
+    split_run_lengths_per_row,
 )
 
 
@@ -53,6 +47,10 @@ class PlayerStatistics:
     consecutive_enemies_hist: Counter[str]
     consecutive_teammates_total: int
     consecutive_enemies_total: int
+    consecutive_enemy_players_total: int
+    consecutive_teammates_rounds_total: int
+    consecutive_enemies_rounds_total: int
+    consecutive_enemy_players_rounds_total: int
     num_unique_people_not_played_with_or_against: int
     num_unique_people_not_played_with: int
     num_unique_people_not_played_against: int
@@ -78,241 +76,211 @@ class PlayerStatistics:
         return attributes
 
 
-class PlayerMetricCalculator:
+# intermediates needed on top of the global metrics to fill PlayerStatistics
+PLAYER_STATISTICS_REQUIRES = (
+    "play_mask",
+    "active_players",
+    "break_runs",
+    "session_runs",
+    "teammate_counts",
+    "opponent_counts",
+    "enemy_team_runs",
+    "played_partner_matrix",
+    "played_enemy_team_matrix",
+    "consecutive_teammates",
+    "consecutive_enemy_teams",
+    "consecutive_enemy_players",
+    "consecutive_teammates_rounds",
+    "consecutive_enemy_teams_rounds",
+    "consecutive_enemy_players_rounds",
+)
 
-    def __init__(
-        self,
-        matchups: List[Matchup],
-        num_players: int,
-        num_fields: int,
-        player_uid: str,
-    ):
-        self.matchups = matchups
-        self.num_players = num_players
-        self.player_uid = player_uid
-        self.num_fields = num_fields
+# cost entry of filling PlayerStatistics from the intermediates
+PLAYER_STATISTICS_COST = "player_statistics"
 
-        self.calculate_base_statistics()
 
-    # TODO: add check for consecutive enemy players (not just team composition)
-    # TODO: maybe get actual histo of all players instead of just hist of the played players, at least for specific metrics (not for consecutive teammate hist)
+def _split_rows(values: np.ndarray, rows: np.ndarray, num_rows: int) -> List:
+    return np.split(values, np.searchsorted(rows, np.arange(1, num_rows)))
 
-    def calculate_base_statistics(self):
 
-        self.played_matches = self.get_played_matches()
+# TODO: maybe get actual histo of all players instead of just hist of the played players, at least for specific metrics (not for consecutive teammate hist)
+def _calculate_all_player_statistics(
+    context: MetricEvaluationContext, player_uids: List[str]
+) -> Dict[str, PlayerStatistics]:
+    """Per player statistics of all active players, computed from the shared intermediates."""
+
+    num_rows = context.num_encoded_players
+
+    break_runs = context["break_runs"]
+    session_runs = context["session_runs"]
+    teammate_counts = context["teammate_counts"]
+    opponent_counts = context["opponent_counts"]
+    enemy_team_runs = context["enemy_team_runs"]
+
+    num_played_matches = np.sum(context["play_mask"], axis=1)
+    break_lengths = split_run_lengths_per_row(break_runs, num_rows)
+    break_lengths_avg = compute_run_lengths_avg_per_row(break_runs, num_rows)
+    break_lengths_stdev = compute_run_lengths_stdev_per_row(break_runs, num_rows)
+    matchup_lengths = split_run_lengths_per_row(session_runs, num_rows)
+    # optimized for short sessions
+    second_session_lengths = compute_nth_run_length_per_row(
+        session_runs, num_rows, n=1, default=10.0
+    )
 
-        self.break_lengths = _find_consecutive_numbers(self.played_matches, 0)
+    teammate_hist_stdev = compute_nonzero_stdev_per_row(teammate_counts)
+    enemy_teams_hist_stdev = compute_run_lengths_stdev_per_row(
+        enemy_team_runs, num_rows
+    )
+    enemy_team_ids = _split_rows(enemy_team_runs.values, enemy_team_runs.rows, num_rows)
+    enemy_team_counts = split_run_lengths_per_row(enemy_team_runs, num_rows)
+
+    consecutive_totals = {
+        name: count_consecutive_repeats_per_row(context[name])
+        for name in [
+            "consecutive_teammates",
+            "consecutive_enemy_teams",
+            "consecutive_enemy_players",
+            "consecutive_teammates_rounds",
+            "consecutive_enemy_teams_rounds",
+            "consecutive_enemy_players_rounds",
+        ]
+    }
 
-        self.matchup_lengths_played_between_breaks = _find_consecutive_numbers(
-            self.played_matches, 1
-        )
+    not_played_with_or_against = compute_unique_people_not_met_per_row(
+        context.num_players, teammate_counts + opponent_counts
+    )
+    not_played_with = compute_unique_people_not_met_per_row(
+        context.num_players, teammate_counts
+    )
+    not_played_against = compute_unique_people_not_met_per_row(
+        context.num_players, opponent_counts
+    )
 
-        self.teammate_uids = _get_teammate_uids(self.matchups, self.player_uid)
-        self.teammate_hist = Counter(self.teammate_uids)
-        # TODO: fix this! (and also for enemies)
-        self.consecutive_teammates_hist = _count_consecutive_occurences(
-            self.teammate_uids
-        )
+    results = {}
+    for i in np.flatnonzero(context["active_players"]):
 
-        self.enemy_team_uids, self.enemy_player_uids = _get_enemy_teams(
-            self.matchups, self.player_uid
+        teammate_hist = Counter(
+            {
+                player_uids[j]: int(teammate_counts[i, j])
+                for j in np.flatnonzero(teammate_counts[i])
+            }
         )
-        self.enemy_teams_hist = Counter(self.enemy_team_uids)
-
-        self.consecutive_enemies_hist = _count_consecutive_occurences(
-            self.enemy_team_uids
+        enemy_teams_hist = Counter(
+            {
+                get_enemy_team_uid(team_id, player_uids): int(count)
+                for team_id, count in zip(enemy_team_ids[i], enemy_team_counts[i])
+            }
         )
 
-    def get_played_matches(self) -> np.ndarray:
-        # Get a list of all player UIDs for each matchup and convert it into a boolean array
-        played_matches = np.array(
-            [self.player_uid in x.get_all_player_uids() for x in self.matchups]
-        )
+        repeated_partners = context["played_partner_matrix"][i, 1:][
+            context["consecutive_teammates"][i]
+        ]
+        repeated_enemy_teams = context["played_enemy_team_matrix"][i, 1:][
+            context["consecutive_enemy_teams"][i]
+        ]
 
-        # Reshape the array into rounds with num_fields columns
-        played_matches = played_matches.reshape(-1, self.num_fields)
-
-        # Check if the player played on ANY field for each round (axis=1)
-        played_matches_per_round = np.any(played_matches, axis=1)
-
-        return played_matches_per_round
-
-    def calculate_player_stats(self) -> PlayerStatistics:
-        return PlayerStatistics(
-            num_played_matches=compute_num_played_matches(self.played_matches),
-            break_lengths=compute_break_lengths(self.played_matches),
-            break_lengths_avg=compute_break_lengths_avg(self.break_lengths),
-            break_lengths_stdev=compute_break_lengths_stdev(self.break_lengths),
-            break_lengths_hist=compute_break_lengths_hist(self.break_lengths),
-            matchup_lengths_played_between_breaks_second_session_only=compute_matchup_lengths_played_between_breaks_second_length(
-                self.matchup_lengths_played_between_breaks
-            ),  # optimized for short sessions
-            matchup_lengths_played_between_breaks=compute_matchup_lengths_played_between_breaks(
-                self.matchup_lengths_played_between_breaks
-            ),
-            teammate_hist=compute_teammate_hist(self.teammate_uids),
-            teammate_hist_stdev=compute_teammate_hist_stdev(self.teammate_hist),
-            enemy_teams_hist=compute_enemy_teams_hist(self.enemy_team_uids),
-            enemy_teams_hist_stdev=compute_enemy_teams_hist_stdev(
-                self.enemy_teams_hist
-            ),
-            consecutive_teammates_hist=compute_consecutive_teammates_hist(
-                self.teammate_uids
+        results[player_uids[i]] = PlayerStatistics(
+            num_played_matches=num_played_matches[i],
+            break_lengths=break_lengths[i].tolist(),
+            break_lengths_avg=break_lengths_avg[i],
+            break_lengths_stdev=break_lengths_stdev[i],
+            break_lengths_hist=compute_break_lengths_hist(break_lengths[i].tolist()),
+            matchup_lengths_played_between_breaks_second_session_only=second_session_lengths[
+                i
+            ],
+            matchup_lengths_played_between_breaks=matchup_lengths[i].tolist(),
+            teammate_hist=teammate_hist,
+            teammate_hist_stdev=teammate_hist_stdev[i],
+            enemy_teams_hist=enemy_teams_hist,
+            enemy_teams_hist_stdev=enemy_teams_hist_stdev[i],
+            consecutive_teammates_hist=Counter(
+                player_uids[x] for x in repeated_partners
             ),
-            consecutive_enemies_hist=compute_consecutive_enemies_hist(
-                self.enemy_team_uids
-            ),
-            consecutive_teammates_total=compute_consecutive_teammates_total(
-                self.consecutive_teammates_hist
-            ),
-            consecutive_enemies_total=compute_consecutive_enemies_total(
-                self.consecutive_enemies_hist
-            ),
-            num_unique_people_not_played_with_or_against=compute_unique_people_not_played_with_or_against(
-                self.num_players, self.enemy_player_uids, self.teammate_uids
-            ),
-            num_unique_people_not_played_with=compute_unique_people_not_played_with(
-                self.num_players, self.teammate_uids
-            ),
-            num_unique_people_not_played_against=compute_unique_people_not_played_against(
-                self.num_players, self.enemy_player_uids
+            consecutive_enemies_hist=Counter(
+                get_enemy_team_uid(x, player_uids) for x in repeated_enemy_teams
             ),
+            consecutive_teammates_total=consecutive_totals["consecutive_teammates"][i],
+            consecutive_enemies_total=consecutive_totals["consecutive_enemy_teams"][i],
+            consecutive_enemy_players_total=consecutive_totals[
+                "consecutive_enemy_players"
+            ][i],
+            consecutive_teammates_rounds_total=consecutive_totals[
+                "consecutive_teammates_rounds"
+            ][i],
+            consecutive_enemies_rounds_total=consecutive_totals[
+                "consecutive_enemy_teams_rounds"
+            ][i],
+            consecutive_enemy_players_rounds_total=consecutive_totals[
+                "consecutive_enemy_players_rounds"
+            ][i],
+            num_unique_people_not_played_with_or_against=not_played_with_or_against[i],
+            num_unique_people_not_played_with=not_played_with[i],
+            num_unique_people_not_played_against=not_played_against[i],
         )
 
-
-def _calculate_all_player_statistics(
-    unique_players: List[str],
-    matchups: List[Matchup],
-    num_players: int,
-    num_fields: int,
-) -> dict:
-
-    results = {}
-    for player_uid in unique_players:
-
-        metric_calculator = PlayerMetricCalculator(
-            matchups, num_players, num_fields, player_uid
-        )
-
-        results[player_uid] = metric_calculator.calculate_player_stats()
-
     return results
 
 
-# TODO: combine compute of per player metrics and global metrics into one class
-class GlobalMetricCalculator:
-    def __init__(self, player_stats: Dict[str, PlayerStatistics], num_players: int):
-        self.player_stats = player_stats
-        self.num_players = num_players
-
-    def compute_not_playing_players_index(self) -> int:
-        unique_players = len(self.player_stats)
-        return self.num_players - unique_players
-
-    def compute_played_matches_index(self) -> float:
-        global_num_played_matches = [
-            stat.num_played_matches for stat in self.player_stats.values()
-        ]
-        return np.std(global_num_played_matches)
+def compute_weighted_loss(
+    global_results: Dict[str, float], weights_and_metrics: MetricWeightsConfig
+) -> float:
+    loss = 0.0
 
-    # def compute_break_even_occurrence_index(self) -> float:
-    #     global_break_lengths_stdev = [
-    #         stat.break_lengths_stdev for stat in self.player_stats.values()
-    #     ]
-    #     return np.sum(global_break_lengths_stdev)
+    for metric_type, metric_weight in weights_and_metrics.weight_per_metric.items():
+        if metric_weight == 0.0:
+            continue
+        loss += metric_weight * global_results[get_metric_name(metric_type)]
 
-    def compute_break_shortness_index(self) -> float:
-        """This metric computes, the summed squared break lengths above length of 1 for all players, to penalize longer breaks."""
+    return loss
 
-        global_player_break_lengths = []
-        for stat in self.player_stats.values():
-            global_player_break_lengths.extend(stat.break_lengths)
 
-        # filter out breaks of length 1
-        global_player_break_lengths_filtered = np.array(
-            [x for x in global_player_break_lengths if x > 1]
-        )
+def compute_schedule_loss(
+    schedule: np.ndarray,
+    num_players: int,
+    weights_and_metrics: MetricWeightsConfig,
+    num_encoded_players: Optional[int] = None,
+) -> float:
+    """
+    Loss of an int schedule, evaluating only the metrics with non-zero weight and
+    the intermediates they need. This is the hot path of the optimizers.
+    """
+    context = MetricEvaluationContext(schedule, num_players, num_encoded_players)
 
-        return np.sum(global_player_break_lengths_filtered**2)
+    plan = get_evaluation_plan(weights_and_metrics.get_weighted_metric_names())
 
-    def compute_second_continous_matchup_length_focused_on_short_sessions_index(
-        self,
-    ) -> float:
-        per_player_matchup_length_second_element = [
-            stat.matchup_lengths_played_between_breaks_second_session_only
-            for stat in self.player_stats.values()
-        ]
-        return np.std(per_player_matchup_length_second_element)
+    return compute_weighted_loss(plan.evaluate(context), weights_and_metrics)
 
-    def compute_teammate_variety_index(self) -> float:  # TODO: correct?
-        per_player_teammate_hist_stdev = [
-            stat.teammate_hist_stdev for stat in self.player_stats.values()
-        ]
-        return np.sum(per_player_teammate_hist_stdev)
 
-    def compute_enemy_team_variety_index(self) -> float:  # TODO: correct?
-        per_player_enemy_teams_hist_stdev = [
-            stat.enemy_teams_hist_stdev for stat in self.player_stats.values()
-        ]
-        return np.sum(per_player_enemy_teams_hist_stdev)
-
-    def compute_teammate_succession_index(self) -> float:
-        per_player_consecutive_teammates_amount = [
-            stat.consecutive_teammates_total for stat in self.player_stats.values()
-        ]
-        return np.sum(per_player_consecutive_teammates_amount)
+def compute_schedule_metrics(
+    schedule: np.ndarray,
+    num_players: int,
+    metric_names: Tuple[str, ...],
+    num_encoded_players: Optional[int] = None,
+    availability: Optional[np.ndarray] = None,
+    league_prior: Optional[LeaguePrior] = None,
+    costs: Optional[Dict[str, MetricCost]] = None,
+) -> np.ndarray:
+    """Raw values of the given metrics for an int schedule, in the order of metric_names."""
+    context = MetricEvaluationContext(
+        schedule, num_players, num_encoded_players, availability, league_prior, costs
+    )
 
-    def compute_enemy_team_succession_index(self) -> float:
-        per_player_consecutive_enemies_amount = [
-            stat.consecutive_enemies_total for stat in self.player_stats.values()
-        ]
-        return np.sum(per_player_consecutive_enemies_amount)
+    global_results = get_evaluation_plan(metric_names).evaluate(context)
 
-    def compute_player_engagement_fairness_index(self) -> float:
-        per_player_unique_people_not_played_with_or_against = [
-            stat.num_unique_people_not_played_with_or_against
-            for stat in self.player_stats.values()
-        ]
-        return np.std(per_player_unique_people_not_played_with_or_against)
+    return np.array([global_results[name] for name in metric_names], dtype=np.float64)
 
-    def compute_not_played_with_or_against_players_index(self) -> float:
-        per_player_unique_people_not_played_with_or_against = [
-            stat.num_unique_people_not_played_with_or_against
-            for stat in self.player_stats.values()
-        ]
-        return np.sum(per_player_unique_people_not_played_with_or_against)
 
-    def compute_not_played_with_players_index(self) -> float:
-        per_player_unique_people_not_played_with = [
-            stat.num_unique_people_not_played_with
-            for stat in self.player_stats.values()
-        ]
-        return np.sum(per_player_unique_people_not_played_with)
+def get_matchup_set_loss(
+    matchups: List[Matchup],
+    num_players: int,
+    weights_and_metrics: MetricWeightsConfig,
+    num_fields: int,
+) -> float:
+    schedule, unique_players = encode_matchups(matchups, num_fields)
 
-    def compute_not_played_against_players_index(self) -> float:
-        per_player_unique_people_not_played_against = [
-            stat.num_unique_people_not_played_against
-            for stat in self.player_stats.values()
-        ]
-        return np.sum(per_player_unique_people_not_played_against)
-
-    def calculate_global_stats(self) -> Dict[str, float]:
-        stats = {
-            MetricType.GLOBAL_NOT_PLAYING_PLAYERS_INDEX.value: self.compute_not_playing_players_index(),
-            MetricType.GLOBAL_PLAYED_MATCHES_INDEX.value: self.compute_played_matches_index(),
-            MetricType.GLOBAL_MATCHUP_SESSION_LENGTH_BETWEEN_BREAKS_INDEX.value: self.compute_second_continous_matchup_length_focused_on_short_sessions_index(),
-            # MetricType.GLOBAL_BREAK_OCCURRENCE_INDEX.value: self.compute_break_even_occurrence_index(),
-            MetricType.GLOBAL_BREAK_SHORTNESS_INDEX.value: self.compute_break_shortness_index(),
-            MetricType.GLOBAL_TEAMMATE_VARIETY_INDEX.value: self.compute_teammate_variety_index(),
-            MetricType.GLOBAL_ENEMY_TEAM_VARIETY_INDEX.value: self.compute_enemy_team_variety_index(),
-            MetricType.GLOBAL_TEAMMATE_SUCCESSION_INDEX.value: self.compute_teammate_succession_index(),
-            MetricType.GLOBAL_ENEMY_TEAM_SUCCESSION_INDEX.value: self.compute_enemy_team_succession_index(),
-            MetricType.GLOBAL_PLAYER_ENGAGEMENT_FAIRNESS_INDEX.value: self.compute_player_engagement_fairness_index(),
-            MetricType.GLOBAL_NOT_PLAYED_WITH_OR_AGAINST_PLAYERS_INDEX.value: self.compute_not_played_with_or_against_players_index(),
-            MetricType.GLOBAL_NOT_PLAYED_WITH_PLAYERS_INDEX.value: self.compute_not_played_with_players_index(),
-            MetricType.GLOBAL_NOT_PLAYED_AGAINST_PLAYERS_INDEX.value: self.compute_not_played_against_players_index(),
-        }
-        return stats
+    return compute_schedule_loss(
+        schedule, num_players, weights_and_metrics, len(unique_players)
+    )
 
 
 # TODO: fix break calculation for multiple fields
@@ -323,30 +291,42 @@ def get_total_matchup_set_score(
     num_players: int,
     weights_and_metrics: MetricWeightsConfig,
     num_fields: int,
+    player_uids: Optional[List[str]] = None,
+    availability: Optional[np.ndarray] = None,
+    league_prior: Optional[LeaguePrior] = None,
+    costs: Optional[Dict[str, MetricCost]] = None,
 ) -> int:
+    """
+    Statistics per player uid, the global metrics under "global" and the weighted
+    loss. Given a costs dict, the time spent per metric, intermediate and on the
+    player statistics is added to it and returned under "costs" as well.
+    """
 
-    # Get unique player identifiers
-    players = []
-    for matchup in matchups:
-        players += matchup.get_all_player_uids()
+    # Get unique player identifiers in order of appearance, unless the roster order is given
+    schedule, unique_players = encode_matchups(matchups, num_fields, player_uids)
 
-    unique_players = list(set(players))
-
-    # Calculate all player statistics
-    results: Dict[str, PlayerStatistics] = _calculate_all_player_statistics(
-        unique_players, matchups, num_players, num_fields
+    context = MetricEvaluationContext(
+        schedule, num_players, len(unique_players), availability, league_prior, costs
     )
 
     # TODO: calculate entropy, energy or something similar to quantify how good the variety of matchups played is
-    global_metric_calculator = GlobalMetricCalculator(results, num_players)
+    plan = get_evaluation_plan(tuple(METRIC_REGISTRY), PLAYER_STATISTICS_REQUIRES)
+    global_results = plan.evaluate(context)
 
-    global_results = global_metric_calculator.calculate_global_stats()
+    # Calculate all player statistics
+    start_ns = time.perf_counter_ns()
+    results: Dict[str, PlayerStatistics] = _calculate_all_player_statistics(
+        context, unique_players
+    )
+    if costs is not None:
+        costs.setdefault(PLAYER_STATISTICS_COST, MetricCost("statistics")).add(
+            time.perf_counter_ns() - start_ns
+        )
 
     results["global"] = global_results
+    if costs is not None:
+        results["costs"] = costs
 
-    loss = 0.0
-
-    for metric_type, metric_weight in weights_and_metrics.weight_per_metric.items():
-        loss += metric_weight * global_results[metric_type.value]
+    loss = compute_weighted_loss(global_results, weights_and_metrics)
 
     return results, loss
@@ -0,0 +1,212 @@
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from matchmaking.data import Matchup, Player, Team
+
+# cost of a candidate round, per repeated pairing
+ONLINE_COST_WEIGHTS = {
+    "partner_count": 1.0,
+    "opponent_count": 0.5,
+    "consecutive_teammate": 5.0,
+    "consecutive_enemy_team": 5.0,
+}
+
+NO_PLAYER = -1
+
+
+class SessionHistory:
+    """
+    Rounds played in an open-ended session, with the partner, opponent and rest
+    counters that next_round needs. The counters are updated once per added round,
+    so proposing a round does not depend on the number of rounds played.
+
+    Players are indexed in order of their first appearance, so the roster may grow
+    while the session runs.
+    """
+
+    def __init__(self, num_fields: int):
+        self.num_fields = num_fields
+        self.rounds: List[List[Matchup]] = []
+
+        self.player_indices: Dict[str, int] = {}
+        self.players: List[Player] = []
+
+        self.num_played = np.zeros(0, dtype=np.int64)
+        self.num_rested = np.zeros(0, dtype=np.int64)
+        self.rest_streak = np.zeros(0, dtype=np.int64)
+        self.play_streak = np.zeros(0, dtype=np.int64)
+        self.last_partner = np.zeros(0, dtype=np.int64)
+        self.last_opponents = np.zeros((0, 2), dtype=np.int64)
+        self.partner_counts = np.zeros((0, 0), dtype=np.int64)
+        self.opponent_counts = np.zeros((0, 0), dtype=np.int64)
+
+    @property
+    def num_rounds(self) -> int:
+        return len(self.rounds)
+
+    @property
+    def matchups(self) -> List[Matchup]:
+        return [matchup for matchups in self.rounds for matchup in matchups]
+
+    def get_indices(self, players: List[Player]) -> np.ndarray:
+        """Indices of the players in the counters, new players are added."""
+        for player in players:
+            if player.get_unique_identifier() not in self.player_indices:
+                self.player_indices[player.get_unique_identifier()] = len(self.players)
+                self.players.append(player)
+
+        self._grow(len(self.players))
+
+        return np.array(
+            [self.player_indices[player.get_unique_identifier()] for player in players],
+            dtype=np.int64,
+        )
+
+    def _grow(self, num_players: int) -> None:
+        num_new = num_players - self.num_played.shape[0]
+        if num_new <= 0:
+            return
+
+        def pad(values: np.ndarray, fill_value: int) -> np.ndarray:
+            padding = [(0, num_new)] + [(0, 0)] * (values.ndim - 1)
+            return np.pad(values, padding, constant_values=fill_value)
+
+        self.num_played = pad(self.num_played, 0)
+        self.num_rested = pad(self.num_rested, 0)
+        self.rest_streak = pad(self.rest_streak, 0)
+        self.play_streak = pad(self.play_streak, 0)
+        self.last_partner = pad(self.last_partner, NO_PLAYER)
+        self.last_opponents = pad(self.last_opponents, NO_PLAYER)
+        self.partner_counts = np.pad(self.partner_counts, (0, num_new))
+        self.opponent_counts = np.pad(self.opponent_counts, (0, num_new))
+
+    def add_round(self, matchups: List[Matchup], present_players: List[Player]):
+        """Record a played round. Present players without a match rested in it."""
+        present = self.get_indices(present_players)
+        round_ids = self.get_indices(
+            [player for matchup in matchups for player in matchup.players]
+        ).reshape(-1, 4)
+
+        playing = round_ids.ravel()
+        resting = np.setdiff1d(present, playing)
+
+        self.num_played[playing] += 1
+        self.play_streak[playing] += 1
+        self.rest_streak[playing] = 0
+
+        self.num_rested[resting] += 1
+        self.rest_streak[resting] += 1
+        self.play_streak[resting] = 0
+
+        partners = round_ids[:, [1, 0, 3, 2]].ravel()
+        opponents = round_ids[:, [2, 3, 2, 3, 0, 1, 0, 1]].reshape(-1, 4, 2)
+        opponents = np.sort(opponents, axis=2).reshape(-1, 2)
+
+        np.add.at(self.partner_counts, (playing, partners), 1)
+        np.add.at(self.opponent_counts, (playing, opponents[:, 0]), 1)
+        np.add.at(self.opponent_counts, (playing, opponents[:, 1]), 1)
+
+        # pairings of players who rested do not count as consecutive anymore
+        self.last_partner[resting] = NO_PLAYER
+        self.last_opponents[resting] = NO_PLAYER
+        self.last_partner[playing] = partners
+        self.last_opponents[playing] = opponents
+
+        self.rounds.append(matchups)
+
+
+def _select_playing(
+    history: SessionHistory, present: np.ndarray, rng: np.random.Generator
+) -> np.ndarray:
+    """
+    Players of the next round. Those who rested most often while present play first,
+    then those resting for the longest time, then those with the shortest session.
+    Remaining ties are broken randomly.
+    """
+    num_playing = 4 * history.num_fields
+
+    order = np.lexsort(
+        (
+            rng.random(present.shape[0]),
+            history.play_streak[present],
+            -history.rest_streak[present],
+            -history.num_rested[present],
+        )
+    )
+    return present[order[:num_playing]]
+
+
+def _compute_round_costs(history: SessionHistory, rounds: np.ndarray) -> np.ndarray:
+    """Cost of candidate rounds of shape (candidates, fields, 4) in player indices."""
+    a0, a1, b0, b1 = (rounds[..., i] for i in range(4))
+
+    partner_count = (
+        history.partner_counts[a0, a1] + history.partner_counts[b0, b1]
+    ).sum(axis=1)
+
+    opponent_count = (
+        history.opponent_counts[a0, b0]
+        + history.opponent_counts[a0, b1]
+        + history.opponent_counts[a1, b0]
+        + history.opponent_counts[a1, b1]
+    ).sum(axis=1)
+
+    consecutive_teammate = (
+        (history.last_partner[a0] == a1).astype(np.int64)
+        + (history.last_partner[b0] == b1)
+    ).sum(axis=1)
+
+    def is_last_enemy_team(player: np.ndarray, x: np.ndarray, y: np.ndarray):
+        enemy_team = np.sort(np.stack([x, y], axis=-1), axis=-1)
+        return np.all(history.last_opponents[player] == enemy_team, axis=-1)
+
+    consecutive_enemy_team = (
+        is_last_enemy_team(a0, b0, b1).astype(np.int64)
+        + is_last_enemy_team(a1, b0, b1)
+        + is_last_enemy_team(b0, a0, a1)
+        + is_last_enemy_team(b1, a0, a1)
+    ).sum(axis=1)
+
+    return (
+        ONLINE_COST_WEIGHTS["partner_count"] * partner_count
+        + ONLINE_COST_WEIGHTS["opponent_count"] * opponent_count
+        + ONLINE_COST_WEIGHTS["consecutive_teammate"] * consecutive_teammate
+        + ONLINE_COST_WEIGHTS["consecutive_enemy_team"] * consecutive_enemy_team
+    )
+
+
+def next_round(
+    history: SessionHistory,
+    present_players: List[Player],
+    num_candidates: int = 256,
+    rng: Optional[np.random.Generator] = None,
+) -> List[Matchup]:
+    """
+    Propose the next round of an open-ended session. The players to play are picked
+    by the rest counters, then the cheapest of num_candidates random splits into
+    fields and teams is taken. New players are registered in the history, the
+    counters only change once the round is added as played.
+    """
+    if len(present_players) < 4 * history.num_fields:
+        raise ValueError(
+            f"Not enough players present for {history.num_fields} field(s): {len(present_players)}"
+        )
+
+    rng = np.random.default_rng() if rng is None else rng
+
+    present = history.get_indices(present_players)
+    playing = _select_playing(history, present, rng)
+
+    permutations = np.argsort(rng.random((num_candidates, playing.shape[0])), axis=1)
+    candidates = playing[permutations].reshape(num_candidates, history.num_fields, 4)
+
+    best_round = candidates[np.argmin(_compute_round_costs(history, candidates))]
+
+    return [
+        Matchup(
+            Team(history.players[a0], history.players[a1]),
+            Team(history.players[b0], history.players[b1]),
+        )
+        for a0, a1, b0, b1 in best_round
+    ]
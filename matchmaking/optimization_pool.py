@@ -0,0 +1,510 @@
+import multiprocessing
+import os
+import threading
+from collections import Counter, OrderedDict, deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from copy import deepcopy
+from dataclasses import dataclass
+from typing import Deque, Dict, Iterable, List, Optional, Tuple, Type
+
+import numpy as np
+
+from matchmaking.data import Matchup, Player
+from matchmaking.config import MetricWeightsConfig
+from matchmaking.metric_type import MetricType
+from matchmaking.metrics import get_total_matchup_set_score
+from matchmaking.optimizer import MatchupOptimizer
+from matchmaking.simple_optimizer import SimpleMatchupOptimizer
+from matchmaking.large_scale import LargeScaleMatchupOptimizer, LARGE_SCALE_MIN_PLAYERS
+from matchmaking.background import BackgroundOptimization, OptimizationProgress
+from matchmaking.schedule import decode_schedule
+
+# fixed width, so no placeholder uid is part of another one
+PLACEHOLDER_PLAYER_NAME = "Player {:03d}"
+
+# plan shapes whose last best schedule the pool keeps as start of the next job
+DEFAULT_MAX_CACHED_SCHEDULES = 100
+
+
+def create_placeholder_players(num_players: int) -> List[Player]:
+    return [Player(PLACEHOLDER_PLAYER_NAME.format(i)) for i in range(num_players)]
+
+
+def _to_metric(name: str):
+    try:
+        return MetricType(name)
+    except ValueError:
+        # house rule metric registered under a plain string name
+        return name
+
+
+@dataclass(frozen=True)
+class OptimizationRequest:
+    """
+    Everything a search depends on. Player names do not matter, schedules are found
+    per player index, so requests of rosters with the same size are identical.
+    """
+
+    num_players: int
+    num_rounds: int
+    num_fields: int
+    num_iterations: int
+    weights: Tuple[Tuple[str, float], ...]
+    rerank_metrics: Tuple[str, ...] = ()
+    time_budget_seconds: Optional[float] = None
+
+    @classmethod
+    def create(
+        cls,
+        num_players: int,
+        num_rounds: int,
+        num_fields: int,
+        num_iterations: int,
+        weights_and_metrics: MetricWeightsConfig,
+        rerank_metrics: Iterable[str] = (),
+        time_budget_seconds: Optional[float] = None,
+    ) -> "OptimizationRequest":
+        weights = tuple(
+            sorted(
+                zip(
+                    weights_and_metrics.get_metric_names(),
+                    weights_and_metrics.weight_per_metric.values(),
+                )
+            )
+        )
+        return cls(
+            num_players,
+            num_rounds,
+            num_fields,
+            num_iterations,
+            weights,
+            tuple(sorted(rerank_metrics)),
+            time_budget_seconds,
+        )
+
+    def create_weights_and_metrics(self) -> MetricWeightsConfig:
+        weights_and_metrics = MetricWeightsConfig()
+        weights_and_metrics.weight_per_metric = {
+            _to_metric(name): weight for name, weight in self.weights
+        }
+        return weights_and_metrics
+
+
+def _get_plan_shape(request: OptimizationRequest) -> Tuple[int, int, int]:
+    return request.num_players, request.num_rounds, request.num_fields
+
+
+def get_optimizer_class(num_players: int) -> Type[MatchupOptimizer]:
+    return (
+        LargeScaleMatchupOptimizer
+        if num_players >= LARGE_SCALE_MIN_PLAYERS
+        else SimpleMatchupOptimizer
+    )
+
+
+def run_optimization_request(
+    request: OptimizationRequest,
+    progress,
+    stop_event,
+    report_interval: float,
+    initial_schedules: Iterable[np.ndarray] = (),
+) -> MatchupOptimizer:
+    """
+    Entry point of the worker processes. The search runs in a background thread, so
+    this thread can publish the incumbent to the shared progress dict, forward stop
+    requests and end the search when the time budget is used up.
+    """
+    optimizer = get_optimizer_class(request.num_players)(
+        create_placeholder_players(request.num_players),
+        request.num_rounds,
+        request.num_fields,
+        request.num_iterations,
+        request.create_weights_and_metrics(),
+        rerank_metrics=request.rerank_metrics,
+        initial_schedules=initial_schedules,
+    )
+
+    optimization = BackgroundOptimization(optimizer).start()
+
+    while optimization.is_running():
+        optimization.join(report_interval)
+
+        is_over_budget = (
+            request.time_budget_seconds is not None
+            and optimization.get_progress().elapsed_seconds
+            >= request.time_budget_seconds
+        )
+        if is_over_budget or stop_event.is_set():
+            optimization.stop()
+
+        _report_progress(progress, optimization)
+
+    if optimization.error is not None:
+        raise optimization.error
+
+    return optimizer
+
+
+def _report_progress(progress, optimization: BackgroundOptimization) -> None:
+    snapshot = optimization.get_progress()
+
+    progress.update(
+        best_schedule=(
+            None
+            if snapshot.best_matchups is None
+            else optimization.optimizer.encode(snapshot.best_matchups)
+        ),
+        best_score=snapshot.best_score,
+        num_iterations_done=snapshot.num_iterations_done,
+        elapsed_seconds=snapshot.elapsed_seconds,
+    )
+
+
+class PoolJob:
+    """A request queued or running in the pool, shared by all sessions that submitted it."""
+
+    def __init__(
+        self,
+        request: OptimizationRequest,
+        session_id: str,
+        progress,
+        stop_event,
+        initial_schedules: Iterable[np.ndarray] = (),
+    ):
+        self.request = request
+        self.session_id = session_id
+        self.progress = progress
+        self.stop_event = stop_event
+        self.initial_schedules = list(initial_schedules)
+
+        self.num_subscribers = 0
+        self.future: Optional[Future] = None
+        self.optimizer: Optional[MatchupOptimizer] = None
+        self.error: Optional[BaseException] = None
+        self.done_event = threading.Event()
+
+
+class PooledOptimization:
+    """
+    A session's view on a pool job, with the same interface as BackgroundOptimization.
+    Results are translated to the session's own players and weights.
+    """
+
+    def __init__(
+        self,
+        pool: "OptimizationPool",
+        job: PoolJob,
+        players: List[Player],
+        weights_and_metrics: MetricWeightsConfig,
+    ):
+        self.pool = pool
+        self.job = job
+        self.players = players
+        self.weights_and_metrics = weights_and_metrics
+
+        self.is_detached = False
+        self._incumbent: Tuple[Optional[List[Matchup]], float] = (None, np.inf)
+        self._result: Optional[tuple] = None
+        self._optimizer: Optional[MatchupOptimizer] = None
+
+    @property
+    def optimizer(self) -> Optional[MatchupOptimizer]:
+        if self._optimizer is None and self.job.optimizer is not None:
+            if not self.is_detached:
+                # the job result may be shared with other sessions
+                self._optimizer = deepcopy(self.job.optimizer)
+                self._optimizer.assign_players(self.players)
+                self._optimizer.weights_and_metrics = self.weights_and_metrics
+        return self._optimizer
+
+    @property
+    def error(self) -> Optional[BaseException]:
+        return None if self.is_detached else self.job.error
+
+    @property
+    def result(self) -> Optional[tuple]:
+        if self._result is not None or self.is_running():
+            return self._result
+
+        optimizer = self.optimizer
+
+        if optimizer is None:
+            best_matchups, best_score = self._incumbent
+            best_scores, best_scores_iterations = [], []
+        else:
+            best_matchups, best_score = optimizer.get_incumbent()
+            best_scores = optimizer.best_scores
+            best_scores_iterations = optimizer.best_scores_iterations
+
+        results = {}
+        if best_matchups is not None:
+            results, _ = get_total_matchup_set_score(
+                best_matchups,
+                len(self.players),
+                self.weights_and_metrics,
+                self.job.request.num_fields,
+            )
+
+        self._result = (
+            best_matchups,
+            best_score,
+            results,
+            best_scores,
+            best_scores_iterations,
+        )
+        return self._result
+
+    def is_running(self) -> bool:
+        return not self.is_detached and not self.job.done_event.is_set()
+
+    def is_queued(self) -> bool:
+        """True while the job waits for a free worker."""
+        return self.is_running() and self.job.future is None
+
+    def stop(self) -> Tuple[Optional[List[Matchup]], float]:
+        """
+        Leave the job and return the last reported incumbent right away. The search
+        itself is only stopped if no other session is waiting for it.
+        """
+        if not self.is_detached:
+            self._incumbent = self._get_reported_incumbent()
+            self.is_detached = True
+            self.pool.unsubscribe(self.job)
+        return self._incumbent
+
+    def join(self, timeout: Optional[float] = None) -> None:
+        if not self.is_detached:
+            self.job.done_event.wait(timeout)
+
+    def _get_reported_incumbent(self) -> Tuple[Optional[List[Matchup]], float]:
+        best_schedule = self.job.progress.get("best_schedule")
+
+        if best_schedule is None:
+            return None, np.inf
+
+        return (
+            decode_schedule(best_schedule, self.players),
+            self.job.progress["best_score"],
+        )
+
+    def get_progress(self) -> OptimizationProgress:
+        if self.is_detached:
+            best_matchups, best_score = self._incumbent
+        else:
+            best_matchups, best_score = self._get_reported_incumbent()
+
+        progress = self.job.progress.copy()
+        num_iterations_done = progress.get("num_iterations_done", 0)
+        elapsed_seconds = progress.get("elapsed_seconds", 0.0)
+
+        return OptimizationProgress(
+            best_matchups=best_matchups,
+            best_score=best_score,
+            num_iterations_done=num_iterations_done,
+            num_iterations=self.job.request.num_iterations,
+            iterations_per_second=(
+                num_iterations_done / elapsed_seconds if elapsed_seconds > 0 else 0.0
+            ),
+            elapsed_seconds=elapsed_seconds,
+            is_running=self.is_running(),
+        )
+
+
+class OptimizationPool:
+    """
+    Process pool shared by all sessions of a server, so concurrent searches run on
+    separate cores instead of competing for the GIL of the server process.
+
+    At most max_workers jobs run at once. Queued jobs are started round-robin over the
+    sessions that submitted them, with at most max_running_per_session jobs of one
+    session running at a time. A request identical to a queued or running one joins
+    that job instead of starting a new search. New jobs start from the best schedule
+    of the last finished job of the same roster size, rounds and fields.
+
+    The worker processes are only created with the first submitted job.
+    """
+
+    def __init__(
+        self,
+        max_workers: Optional[int] = None,
+        max_running_per_session: int = 1,
+        report_interval: float = 0.5,
+        max_cached_schedules: int = DEFAULT_MAX_CACHED_SCHEDULES,
+    ):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_running_per_session = max_running_per_session
+        self.report_interval = report_interval
+        self.max_cached_schedules = max_cached_schedules
+
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._manager = None
+        self._lock = threading.Lock()
+
+        # queued jobs per session, in round-robin order of the sessions
+        self._queued_jobs: "OrderedDict[str, Deque[PoolJob]]" = OrderedDict()
+        self._active_jobs: Dict[OptimizationRequest, PoolJob] = {}
+        self._num_running = 0
+        self._num_running_per_session: Counter = Counter()
+        # best schedule of the last finished job per (players, rounds, fields)
+        self._best_schedules: "OrderedDict[Tuple[int, int, int], np.ndarray]" = (
+            OrderedDict()
+        )
+
+    def _ensure_started(self) -> None:
+        if self._executor is None:
+            # forking the multi-threaded server process is not safe
+            context = multiprocessing.get_context("spawn")
+            self._manager = context.Manager()
+            self._executor = ProcessPoolExecutor(self.max_workers, mp_context=context)
+
+    def submit(
+        self,
+        session_id: str,
+        players: List[Player],
+        num_rounds: int,
+        num_fields: int,
+        num_iterations: int,
+        weights_and_metrics: MetricWeightsConfig,
+        rerank_metrics: Iterable[str] = (),
+        time_budget_seconds: Optional[float] = None,
+        initial_schedules: Iterable[np.ndarray] = (),
+    ) -> PooledOptimization:
+        """
+        Queue the search or join an identical one. The initial schedules, e.g. the
+        session's previous plan, are only used if a new job is started.
+        """
+        request = OptimizationRequest.create(
+            len(players),
+            num_rounds,
+            num_fields,
+            num_iterations,
+            weights_and_metrics,
+            rerank_metrics,
+            time_budget_seconds,
+        )
+
+        with self._lock:
+            self._ensure_started()
+
+            job = self._active_jobs.get(request)
+            if job is None:
+                job = PoolJob(
+                    request,
+                    session_id,
+                    self._manager.dict(),
+                    self._manager.Event(),
+                    self._get_initial_schedules(request, initial_schedules),
+                )
+                self._active_jobs[request] = job
+                self._queued_jobs.setdefault(session_id, deque()).append(job)
+
+            job.num_subscribers += 1
+            self._dispatch()
+
+        return PooledOptimization(self, job, players, weights_and_metrics)
+
+    def unsubscribe(self, job: PoolJob) -> None:
+        """Stop or dequeue a job once no session is interested in it anymore."""
+        with self._lock:
+            job.num_subscribers -= 1
+
+            if job.num_subscribers > 0 or job.done_event.is_set():
+                return
+
+            if job.future is None:
+                self._queued_jobs[job.session_id].remove(job)
+                self._finish(job)
+            else:
+                job.stop_event.set()
+
+    def get_num_running(self) -> int:
+        with self._lock:
+            return self._num_running
+
+    def get_num_queued(self) -> int:
+        with self._lock:
+            return sum(len(jobs) for jobs in self._queued_jobs.values())
+
+    def _dispatch(self) -> None:
+        while self._executor is not None and self._num_running < self.max_workers:
+            job = self._pop_next_job()
+            if job is None:
+                return
+
+            self._num_running += 1
+            self._num_running_per_session[job.session_id] += 1
+
+            job.future = self._executor.submit(
+                run_optimization_request,
+                job.request,
+                job.progress,
+                job.stop_event,
+                self.report_interval,
+                job.initial_schedules,
+            )
+            job.future.add_done_callback(lambda future, job=job: self._on_done(job))
+
+    def _pop_next_job(self) -> Optional[PoolJob]:
+        for session_id in list(self._queued_jobs):
+            jobs = self._queued_jobs[session_id]
+
+            if not jobs:
+                del self._queued_jobs[session_id]
+                continue
+
+            if (
+                self._num_running_per_session[session_id]
+                >= self.max_running_per_session
+            ):
+                continue
+
+            # the session goes to the back of the line
+            self._queued_jobs.move_to_end(session_id)
+            return jobs.popleft()
+
+        return None
+
+    def _get_initial_schedules(
+        self, request: OptimizationRequest, initial_schedules: Iterable[np.ndarray]
+    ) -> List[np.ndarray]:
+        schedules = list(initial_schedules)
+        best_schedule = self._best_schedules.get(_get_plan_shape(request))
+        if best_schedule is not None:
+            schedules.append(best_schedule)
+        return schedules
+
+    def _cache_best_schedule(self, job: PoolJob) -> None:
+        best_schedule = job.progress.get("best_schedule")
+        if best_schedule is None or self.max_cached_schedules <= 0:
+            return
+
+        shape = _get_plan_shape(job.request)
+        self._best_schedules[shape] = best_schedule
+        self._best_schedules.move_to_end(shape)
+        if len(self._best_schedules) > self.max_cached_schedules:
+            self._best_schedules.popitem(last=False)
+
+    def _on_done(self, job: PoolJob) -> None:
+        try:
+            job.optimizer = job.future.result()
+        except BaseException as e:
+            job.error = e
+
+        with self._lock:
+            self._cache_best_schedule(job)
+            self._num_running -= 1
+            self._num_running_per_session[job.session_id] -= 1
+            self._finish(job)
+            self._dispatch()
+
+    def _finish(self, job: PoolJob) -> None:
+        if self._active_jobs.get(job.request) is job:
+            del self._active_jobs[job.request]
+        job.done_event.set()
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(cancel_futures=True)
+            self._manager.shutdown()
+            self._executor = None
+            self._manager = None
@@ -1,15 +1,44 @@
+import threading
+import time
 from abc import ABC, abstractmethod
-from typing import List
+from typing import Dict, Iterable, List, Optional, Tuple
 
 import numpy as np
 
 from matchmaking.data import Player, Matchup, Team
-from matchmaking.metrics import get_total_matchup_set_score
+from matchmaking.metrics import get_total_matchup_set_score, compute_schedule_metrics
 from matchmaking.config import MetricWeightsConfig
+from matchmaking.pareto import ParetoArchive
+from matchmaking.candidate_pool import CandidatePool
+from matchmaking.schedule import encode_matchups, decode_schedule
+from matchmaking.constraints import CompiledConstraints, ConstraintSpec
+from matchmaking.feasibility import FeasibilityReport, analyze_feasibility
+from matchmaking.league import LeaguePrior
+from matchmaking.timer import is_profiling_enabled, profiled, span
+from matchmaking.metric_registry import MetricCost
+from matchmaking.score_cache import (
+    DEFAULT_SCORE_CACHE_SIZE,
+    ScoreCache,
+    get_matchup_keys,
+)
+from matchmaking.telemetry import (
+    DEFAULT_HEARTBEAT_INTERVAL_SECONDS,
+    TelemetryEmitter,
+    TelemetrySink,
+)
+from matchmaking.checkpoint import (
+    CHECKPOINT_FORMAT_VERSION,
+    DEFAULT_CHECKPOINT_INTERVAL_SECONDS,
+    read_checkpoint,
+    write_checkpoint,
+)
 
 
 class MatchupOptimizer(ABC):
 
+    # the sampled plans never repeat a matchup, which limits the number of rounds
+    requires_unique_matchups = True
+
     def __init__(
         self,
         players: List[Player],
@@ -17,35 +46,553 @@ class MatchupOptimizer(ABC):
         num_fields: int,
         num_iterations: int,
         weights_and_metrics: MetricWeightsConfig,
+        pareto_archive_size: int = 100,
+        candidate_pool_size: int = 200,
+        rerank_metrics: Iterable[str] = (),
+        availability: Optional[np.ndarray] = None,
+        constraints: Optional[ConstraintSpec] = None,
+        league_prior: Optional[LeaguePrior] = None,
+        rng: Optional[np.random.Generator] = None,
+        score_cache_size: int = DEFAULT_SCORE_CACHE_SIZE,
+        initial_schedules: Optional[Iterable[np.ndarray]] = None,
     ):
         self.players = players
         self.num_rounds = num_rounds
         self.num_fields = num_fields
         self.num_iterations = num_iterations
         self.weights_and_metrics = weights_and_metrics
+        # all random draws of the search, seed it (or give each worker a spawned
+        # seed sequence) for reproducible and independent searches
+        self.rng = np.random.default_rng() if rng is None else rng
+
+        # (players, rounds) mask of the rounds each player can attend, None if all can attend all
+        self.availability = availability
+        if availability is not None:
+            assert availability.shape == (
+                len(players),
+                num_rounds,
+            ), "The availability mask must have the shape (players, rounds)."
+        self.available_players_per_round = self._get_available_players_per_round()
+
+        # compiled once, raises if the constraints can not be met
+        self.constraints = (
+            None
+            if constraints is None
+            else CompiledConstraints(
+                constraints, players, num_rounds, num_fields, availability
+            )
+        )
+
+        # raises before any search if the plan can not be built, e.g. more rounds than
+        # unique matchups, which would keep the sampler drawing forever
+        self.feasibility_report = self.get_feasibility_report()
+        self.feasibility_report.check()
+
+        # pairings of earlier league sessions, the pairing metrics count them as well
+        self.league_prior = league_prior
+        if league_prior is not None:
+            assert league_prior.teammate_counts.shape == (
+                len(players),
+                len(players),
+            ), "The league prior must be indexed like the roster."
+
+        self.player_uids = [player.get_unique_identifier() for player in self.players]
+        # metrics with weight 0 are only evaluated if they should be available for reranking
+        self.metric_names = tuple(
+            dict.fromkeys(
+                weights_and_metrics.get_weighted_metric_names() + tuple(rerank_metrics)
+            )
+        )
+        self.weight_vector = weights_and_metrics.get_weight_vector(self.metric_names)
+        self.pareto_archive = ParetoArchive(self.metric_names, pareto_archive_size)
+        self.candidate_pool = CandidatePool(len(self.metric_names), candidate_pool_size)
+        # scores of evaluated schedules, e.g. the large-scale engine often re-matches
+        # a round into the plan it started from
+        self.score_cache = ScoreCache(score_cache_size)
+
+        # incumbent and progress, may be read from another thread while the search runs
+        self.best_scores: List[float] = []
+        self.best_scores_iterations: List[int] = []
+        # seconds since the search started at each improvement, for anytime profiles
+        self.best_scores_seconds: List[float] = []
+        self.search_start_time: Optional[float] = None
+        # search time of the run a checkpoint was loaded from
+        self.resumed_search_seconds: float = 0.0
+        self.min_score: float = np.inf
+        self.best_matchup_config: Optional[List[Matchup]] = None
+        self.num_iterations_done: int = 0
+        self.incumbent_lock = threading.Lock()
+        self.stop_event = threading.Event()
+
+        # time spent per metric and intermediate over all evaluations, while profiling
+        self.metric_costs: Optional[Dict[str, MetricCost]] = (
+            {} if is_profiling_enabled() else None
+        )
+
+        # structured progress events, see attach_telemetry
+        self.telemetry: Optional[TelemetryEmitter] = None
+        self.last_metric_vector: Optional[np.ndarray] = None
+
+        # periodic checkpoints of the search state, see enable_checkpoints
+        self.checkpoint_path: Optional[str] = None
+        self.checkpoint_interval_seconds = DEFAULT_CHECKPOINT_INTERVAL_SECONDS
+        self.last_checkpoint_time = 0.0
 
         for i, player in enumerate(self.players):
             player.assign_numeric_identifier(i)
 
-        assert (
-            self.player_uids_are_unique()
-        ), "Player UIDs are not unique! Maybe some names are part of other names? (e.g. 'John' and 'Johnny')"
+        assert self.player_uids_are_unique(), "Player UIDs are not unique!"
+
+        # int schedules of earlier searches to start from, e.g. the incumbent of a
+        # retry, one schedule or many. A search resumed from a checkpoint keeps its
+        # incumbent unless one of them is better
+        self.initial_schedules = self._get_initial_schedules(initial_schedules)
+
+    def _get_initial_schedules(
+        self, initial_schedules: Optional[Iterable[np.ndarray]]
+    ) -> List[np.ndarray]:
+        if initial_schedules is None:
+            return []
+        if isinstance(initial_schedules, np.ndarray) and initial_schedules.ndim == 3:
+            initial_schedules = [initial_schedules]
+
+        schedules = [
+            np.asarray(schedule, dtype=np.int64) for schedule in initial_schedules
+        ]
+        for schedule in schedules:
+            problem = self.get_schedule_problem(schedule)
+            if problem is not None:
+                raise ValueError(
+                    f"The initial schedule does not fit the plan: {problem}"
+                )
+
+        return schedules
+
+    def get_schedule_problem(self, schedule: np.ndarray) -> Optional[str]:
+        """Why the int schedule is no valid plan of this search, None if it is one."""
+        shape = (self.num_rounds, self.num_fields, 4)
+        if schedule.shape != shape:
+            return f"shape {schedule.shape} instead of {shape}."
+        if np.any((schedule < 0) | (schedule >= len(self.players))):
+            return "unknown player indices."
+
+        players_per_round = np.sort(schedule.reshape(self.num_rounds, -1), axis=1)
+        if np.any(players_per_round[:, 1:] == players_per_round[:, :-1]):
+            return "a player plays twice in one round."
+        if self.availability is not None and not np.all(
+            self.availability[players_per_round, np.arange(self.num_rounds)[:, None]]
+        ):
+            return "a player plays in a round they do not attend."
+        if self.requires_unique_matchups and (
+            np.unique(get_matchup_keys(schedule, len(self.players))).size
+            != self.num_rounds * self.num_fields
+        ):
+            return "a matchup is played twice."
+        if self.constraints is not None and not all(
+            self.constraints.is_round_valid(
+                round_index, decode_schedule(schedule[round_index], self.players)
+            )
+            for round_index in range(self.num_rounds)
+        ):
+            return "a round breaks the constraints."
+
+        return None
+
+    def get_feasibility_report(self) -> FeasibilityReport:
+        return analyze_feasibility(
+            len(self.players),
+            self.num_rounds,
+            self.num_fields,
+            self.availability,
+            self.constraints,
+            self.requires_unique_matchups,
+        )
+
+    def _get_available_players_per_round(self) -> Optional[List[List[Player]]]:
+        """Candidate players of each round, so sampling never has to reject unavailable ones."""
+        if self.availability is None:
+            return None
+
+        return [
+            [
+                player
+                for player, is_available in zip(self.players, self.availability[:, r])
+                if is_available
+            ]
+            for r in range(self.num_rounds)
+        ]
 
     def player_uids_are_unique(self) -> bool:
-        player_uids = [player.get_unique_identifier() for player in self.players]
+        # uids are compared as a whole everywhere, so names may be part of other names
+        return len(set(self.player_uids)) == len(self.player_uids)
+
+    def __getstate__(self) -> dict:
+        # locks and events can not be pickled, e.g. to return an optimizer from a worker process
+        state = self.__dict__.copy()
+        del state["incumbent_lock"]
+        del state["stop_event"]
+        # sinks hold files and queues of the process they were attached in
+        state["telemetry"] = None
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        self.incumbent_lock = threading.Lock()
+        self.stop_event = threading.Event()
+
+    def assign_players(self, players: List[Player]) -> None:
+        """
+        Hand the search results over to another roster of the same size. Schedules
+        are stored by player index, so only the incumbent has to be translated.
+        """
+        assert len(players) == len(
+            self.players
+        ), "Search results can only be reused for a roster of the same size."
+
+        with self.incumbent_lock:
+            best_schedule = (
+                None
+                if self.best_matchup_config is None
+                else self.encode(self.best_matchup_config)
+            )
 
-        for i in range(len(player_uids)):
+            self.players = players
+            self.player_uids = [player.get_unique_identifier() for player in players]
+            for i, player in enumerate(self.players):
+                player.assign_numeric_identifier(i)
+            self.available_players_per_round = self._get_available_players_per_round()
 
-            reference_player_uid = player_uids[i]
+            if best_schedule is not None:
+                self.best_matchup_config = decode_schedule(best_schedule, players)
+
+    def request_stop(self) -> None:
+        """Ask a running search to finish after the current iteration."""
+        self.stop_event.set()
+
+    def is_stop_requested(self) -> bool:
+        return self.stop_event.is_set()
+
+    def attach_telemetry(
+        self,
+        sink: TelemetrySink,
+        source: str = "",
+        heartbeat_interval_seconds: float = DEFAULT_HEARTBEAT_INTERVAL_SECONDS,
+    ) -> None:
+        """
+        Emit start, improvement, heartbeat and end events of the search to the sink,
+        instead of printing the progress.
+        """
+        self.telemetry = TelemetryEmitter(
+            sink, source or type(self).__name__, heartbeat_interval_seconds
+        )
+
+    def show_progress_bar(self) -> bool:
+        # with telemetry attached, the heartbeats report the progress
+        return self.telemetry is None
+
+    def get_telemetry_stats(self) -> dict:
+        """Extra values of the heartbeat events, subclasses may add their own."""
+        return self.score_cache.get_stats()
+
+    def enable_checkpoints(
+        self,
+        path: str,
+        interval_seconds: float = DEFAULT_CHECKPOINT_INTERVAL_SECONDS,
+    ) -> None:
+        """Save a checkpoint to path every interval_seconds while searching, and when the search ends."""
+        self.checkpoint_path = path
+        self.checkpoint_interval_seconds = interval_seconds
 
-            for j in range(len(player_uids)):
-                if i == j:
-                    continue
+    def is_resumed(self) -> bool:
+        """True if a checkpoint was loaded, the search then continues from its incumbent."""
+        return self.best_matchup_config is not None
+
+    def get_checkpoint_state(self) -> Tuple[Dict[str, np.ndarray], dict]:
+        """
+        Arrays and JSON serializable values that continue the search exactly where it
+        is. Subclasses add the state of their search, see set_checkpoint_state.
+        """
+        arrays = {
+            "best_scores": np.array(self.best_scores, dtype=np.float64),
+            "best_scores_iterations": np.array(
+                self.best_scores_iterations, dtype=np.int64
+            ),
+            "best_scores_seconds": np.array(self.best_scores_seconds, dtype=np.float64),
+            "pareto_metrics": self.pareto_archive.metrics,
+            "pool_metrics": self.candidate_pool.metrics,
+            "pool_losses": self.candidate_pool.losses,
+        }
+        if self.best_matchup_config is not None:
+            arrays["best_schedule"] = self.encode(self.best_matchup_config)
+        if self.pareto_archive.schedules is not None:
+            arrays["pareto_schedules"] = self.pareto_archive.schedules
+        if len(self.candidate_pool) > 0:
+            arrays["pool_schedules"] = self.candidate_pool.get_schedules()
+        # schedules with a cached score are not offered to the archive and the pool
+        # again, so the cache is part of the state of the search
+        arrays.update(self.score_cache.get_state(len(self.metric_names)))
+
+        meta = {
+            "format_version": CHECKPOINT_FORMAT_VERSION,
+            "optimizer": type(self).__name__,
+            "player_uids": self.player_uids,
+            "num_rounds": self.num_rounds,
+            "num_fields": self.num_fields,
+            "metric_names": list(self.metric_names),
+            "num_iterations": self.num_iterations,
+            "num_iterations_done": self.num_iterations_done,
+            "min_score": self.min_score,
+            "search_seconds": self.get_search_seconds(),
+            "bit_generator": type(self.rng.bit_generator).__name__,
+            "rng": self.rng.bit_generator.state,
+        }
+        return arrays, meta
+
+    def set_checkpoint_state(self, arrays: Dict[str, np.ndarray], meta: dict) -> None:
+        for key, value in [
+            ("optimizer", type(self).__name__),
+            ("player_uids", self.player_uids),
+            ("num_rounds", self.num_rounds),
+            ("num_fields", self.num_fields),
+            ("metric_names", list(self.metric_names)),
+            ("bit_generator", type(self.rng.bit_generator).__name__),
+        ]:
+            if meta[key] != value:
+                raise ValueError(
+                    f"The checkpoint was saved with {key} {meta[key]}, "
+                    f"this optimizer has {value}."
+                )
+
+        self.rng.bit_generator.state = meta["rng"]
+        self.num_iterations = meta["num_iterations"]
+        self.num_iterations_done = meta["num_iterations_done"]
+        self.resumed_search_seconds = meta["search_seconds"]
+        self.best_scores = arrays["best_scores"].tolist()
+        self.best_scores_iterations = arrays["best_scores_iterations"].tolist()
+        self.best_scores_seconds = arrays["best_scores_seconds"].tolist()
+        self.set_incumbent(
+            (
+                decode_schedule(arrays["best_schedule"], self.players)
+                if "best_schedule" in arrays
+                else None
+            ),
+            meta["min_score"],
+        )
+
+        # re-adding the entries in their order restores both containers exactly,
+        # none of them dominates or duplicates another and none has to be dropped
+        for schedule, metric_vector in zip(
+            arrays.get("pareto_schedules", []), arrays["pareto_metrics"]
+        ):
+            self.pareto_archive.add(schedule, metric_vector)
+        for schedule, metric_vector, loss in zip(
+            arrays.get("pool_schedules", []),
+            arrays["pool_metrics"],
+            arrays["pool_losses"],
+        ):
+            self.candidate_pool.add(schedule, metric_vector, float(loss))
+        self.score_cache.set_state(arrays)
+
+    def save_checkpoint(self, path: Optional[str] = None) -> None:
+        """Write the search state to path (default: the path of enable_checkpoints), replacing it atomically."""
+        arrays, meta = self.get_checkpoint_state()
+        write_checkpoint(path or self.checkpoint_path, arrays, meta)
+        self.last_checkpoint_time = time.perf_counter()
+
+    def load_checkpoint(self, path: str) -> None:
+        """
+        Restore the search state of a checkpoint into a fresh optimizer, constructed with
+        the same arguments. The next search continues bit-exactly where the saved one
+        stopped, up to the number of iterations it was started with. Raise
+        num_iterations afterwards to search on, e.g. after a completed search.
+        """
+        arrays, meta = read_checkpoint(path)
+        self.set_checkpoint_state(arrays, meta)
+
+    def get_search_seconds(self) -> float:
+        """Search time so far, including that of the run a checkpoint was loaded from."""
+        if self.search_start_time is None:
+            return self.resumed_search_seconds
+        return time.perf_counter() - self.search_start_time
+
+    def start_search(self) -> None:
+        self.search_start_time = time.perf_counter() - self.resumed_search_seconds
+        self.last_checkpoint_time = time.perf_counter()
+
+        if self.telemetry is not None:
+            self.telemetry.start(
+                optimizer=type(self).__name__,
+                num_players=len(self.players),
+                num_rounds=self.num_rounds,
+                num_fields=self.num_fields,
+                num_iterations=self.num_iterations,
+                resumed_from_iteration=self.num_iterations_done,
+            )
+
+    def record_best_score(self, score: float, iter: int) -> None:
+        """Append an improvement to the best scores, with its iteration and search time."""
+        self.best_scores.append(score)
+        self.best_scores_iterations.append(iter)
+        self.best_scores_seconds.append(self.get_search_seconds())
+
+        if self.telemetry is not None:
+            # the metrics of the last evaluated schedule, which is the improvement
+            metrics = (
+                {}
+                if self.last_metric_vector is None
+                else dict(zip(self.metric_names, self.last_metric_vector.tolist()))
+            )
+            self.telemetry.improvement(iter, score, metrics)
+
+    def report_progress(self) -> None:
+        """
+        Called after every iteration, emits a heartbeat once per heartbeat interval and
+        saves a checkpoint once per checkpoint interval.
+        """
+        if self.telemetry is not None and self.telemetry.is_heartbeat_due():
+            self.telemetry.heartbeat(
+                self.num_iterations_done,
+                best_score=self.min_score,
+                **self.get_telemetry_stats(),
+            )
+
+        if (
+            self.checkpoint_path is not None
+            and time.perf_counter() - self.last_checkpoint_time
+            >= self.checkpoint_interval_seconds
+        ):
+            self.save_checkpoint()
+
+    def finish_search(self) -> None:
+        if self.checkpoint_path is not None:
+            self.save_checkpoint()
+
+        if self.telemetry is not None:
+            self.telemetry.end(
+                self.num_iterations_done,
+                best_score=self.min_score,
+                num_improvements=len(self.best_scores),
+                stopped=self.is_stop_requested(),
+                **self.get_telemetry_stats(),
+            )
+
+    def set_incumbent(self, matchups: Optional[List[Matchup]], score: float) -> None:
+        with self.incumbent_lock:
+            self.best_matchup_config = matchups
+            self.min_score = score
+
+    def get_incumbent(self) -> Tuple[Optional[List[Matchup]], float]:
+        with self.incumbent_lock:
+            return self.best_matchup_config, self.min_score
+
+    @profiled("encode")
+    def encode(self, matchups: List[Matchup]) -> np.ndarray:
+        """Int schedule of the matchups, indexed by the position of each player in self.players."""
+        schedule, _ = encode_matchups(matchups, self.num_fields, self.player_uids)
+        return schedule
+
+    @profiled("evaluate_schedule")
+    def evaluate_schedule(self, schedule: np.ndarray) -> Tuple[np.ndarray, float]:
+        """
+        Raw metric vector and weighted loss of an int schedule. Every newly evaluated
+        schedule is offered to the Pareto archive and the top-K candidate pool,
+        schedules with a cached score were offered before.
+        """
+        with span("score_cache"):
+            key = self.score_cache.get_key(schedule, len(self.players))
+            cached = self.score_cache.get(key)
+        if cached is not None:
+            self.last_metric_vector = cached[0]
+            return cached
+
+        metric_vector = compute_schedule_metrics(
+            schedule,
+            len(self.players),
+            self.metric_names,
+            availability=self.availability,
+            league_prior=self.league_prior,
+            costs=self.metric_costs,
+        )
+        loss = float(metric_vector @ self.weight_vector)
+        self.last_metric_vector = metric_vector
+
+        with span("store_candidate"):
+            self.pareto_archive.add(schedule, metric_vector)
+            self.candidate_pool.add(schedule, metric_vector, loss)
+        self.score_cache.put(key, metric_vector, loss)
+
+        return metric_vector, loss
+
+    def rerank(
+        self, weights_and_metrics: MetricWeightsConfig
+    ) -> Tuple[List[Matchup], float, dict]:
+        """
+        Best retained schedule under new weights, without a new search. All pooled
+        and Pareto archived schedules are rescored as one matrix-vector product.
+        """
+        missing_metric_names = set(
+            weights_and_metrics.get_weighted_metric_names()
+        ) - set(self.metric_names)
+        if missing_metric_names:
+            raise ValueError(
+                f"Metrics {sorted(missing_metric_names)} were not evaluated during the search, "
+                "pass them as rerank_metrics or start a new optimization."
+            )
+
+        if len(self.candidate_pool) + len(self.pareto_archive) == 0:
+            raise ValueError("No schedules retained yet, run the optimization first.")
+
+        candidate_schedules = [
+            x
+            for x in [
+                self.candidate_pool.get_schedules(),
+                self.pareto_archive.schedules,
+            ]
+            if x is not None and len(x) > 0
+        ]
+        schedules = np.concatenate(candidate_schedules)
+        metrics = np.concatenate(
+            [self.candidate_pool.metrics, self.pareto_archive.metrics]
+        )
+
+        losses = metrics @ weights_and_metrics.get_weight_vector(self.metric_names)
+        best_index = int(np.argmin(losses))
+
+        matchups = decode_schedule(schedules[best_index], self.players)
+        results, _ = self.get_matchup_set_score(matchups, weights_and_metrics)
+
+        return matchups, float(losses[best_index]), results
+
+    @profiled("get_matchup_set_score")
+    def get_matchup_set_score(
+        self,
+        matchups: List[Matchup],
+        weights_and_metrics: Optional[MetricWeightsConfig] = None,
+    ) -> Tuple[dict, float]:
+        """Full results of matchups of this optimizer's roster, see get_total_matchup_set_score."""
+        if weights_and_metrics is None:
+            weights_and_metrics = self.weights_and_metrics
 
-                if reference_player_uid in player_uids[j]:
-                    return False
+        if self.availability is None and self.league_prior is None:
+            return get_total_matchup_set_score(
+                matchups,
+                len(self.players),
+                weights_and_metrics,
+                self.num_fields,
+                costs=self.metric_costs,
+            )
 
-        return True
+        # the availability rows and the league prior follow the roster order
+        return get_total_matchup_set_score(
+            matchups,
+            len(self.players),
+            weights_and_metrics,
+            self.num_fields,
+            self.player_uids,
+            self.availability,
+            self.league_prior,
+            self.metric_costs,
+        )
 
     @abstractmethod
     def get_most_diverse_matchups():
@@ -0,0 +1,103 @@
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from matchmaking.data import Matchup, Player
+from matchmaking.schedule import decode_schedule
+
+
+def compute_crowding_distances(metrics: np.ndarray) -> np.ndarray:
+    """
+    Crowding distance of every entry of a (entries, metrics) matrix: the summed,
+    range-normalized distance to its neighbours along each metric. Boundary
+    entries get an infinite distance so the extremes of the front are kept.
+    """
+    num_entries, num_metrics = metrics.shape
+    distances = np.zeros(num_entries)
+
+    if num_entries < 3:
+        return np.full(num_entries, np.inf)
+
+    order = np.argsort(metrics, axis=0, kind="stable")
+    sorted_metrics = np.take_along_axis(metrics, order, axis=0)
+
+    metric_ranges = sorted_metrics[-1] - sorted_metrics[0]
+    metric_ranges[metric_ranges == 0.0] = 1.0
+
+    gaps = (sorted_metrics[2:] - sorted_metrics[:-2]) / metric_ranges
+
+    for j in range(num_metrics):
+        distances[order[1:-1, j]] += gaps[:, j]
+        distances[order[[0, -1], j]] = np.inf
+
+    return distances
+
+
+class ParetoArchive:
+    """
+    Bounded archive of non-dominated schedules over the raw per-metric vector
+    (lower is better for every metric).
+
+    Schedules are stored as one compact int array of shape (entries, rounds, fields, 4)
+    next to a (entries, metrics) matrix, so dominance checks against the whole
+    archive are single vectorized comparisons. When the archive is full, the entry
+    in the most crowded region of the front is dropped.
+    """
+
+    def __init__(
+        self,
+        metric_names: Tuple[str, ...],
+        max_size: int = 100,
+        schedule_dtype=np.int16,
+    ):
+        self.metric_names = tuple(metric_names)
+        self.max_size = max_size
+        self.schedule_dtype = schedule_dtype
+
+        self.schedules: Optional[np.ndarray] = None
+        self.metrics = np.zeros((0, len(self.metric_names)), dtype=np.float64)
+
+    def __len__(self) -> int:
+        return self.metrics.shape[0]
+
+    def is_dominated(self, metric_vector: np.ndarray) -> bool:
+        """True if an archived entry is at least as good in every metric (equal vectors included)."""
+        return bool(np.any(np.all(self.metrics <= metric_vector, axis=1)))
+
+    def add(self, schedule: np.ndarray, metric_vector: np.ndarray) -> bool:
+        """Add a schedule if no archived schedule dominates it. Returns whether it was added."""
+        metric_vector = np.asarray(metric_vector, dtype=np.float64)
+
+        if self.max_size <= 0 or self.is_dominated(metric_vector):
+            return False
+
+        is_dominated_by_new = np.all(metric_vector <= self.metrics, axis=1)
+        keep = ~is_dominated_by_new
+
+        schedule = schedule.astype(self.schedule_dtype)[None]
+
+        if self.schedules is None:
+            self.schedules = schedule
+        else:
+            self.schedules = np.concatenate([self.schedules[keep], schedule])
+        self.metrics = np.concatenate([self.metrics[keep], metric_vector[None]])
+
+        if len(self) > self.max_size:
+            self._remove(np.argmin(compute_crowding_distances(self.metrics)))
+
+        return True
+
+    def _remove(self, index: int) -> None:
+        keep = np.arange(len(self)) != index
+        self.schedules = self.schedules[keep]
+        self.metrics = self.metrics[keep]
+
+    def get_losses(self, weight_vector: np.ndarray) -> np.ndarray:
+        return self.metrics @ weight_vector
+
+    def get_best_index(self, weight_vector: np.ndarray) -> int:
+        """Index of the archived schedule with the lowest loss under the given weights."""
+        return int(np.argmin(self.get_losses(weight_vector)))
+
+    def get_matchups(self, index: int, players: List[Player]) -> List[Matchup]:
+        return decode_schedule(self.schedules[index], players)
@@ -0,0 +1,270 @@
+from copy import deepcopy
+from typing import Iterable, List, Optional, Tuple
+
+import numpy as np
+from tqdm import tqdm
+
+from matchmaking.data import Player, Matchup
+from matchmaking.config import MetricWeightsConfig
+from matchmaking.simple_optimizer import SimpleMatchupOptimizer
+from matchmaking.constraints import ConstraintSpec
+from matchmaking.feasibility import FeasibilityReport, analyze_feasibility
+from matchmaking.schedule import decode_schedule
+from matchmaking.score_cache import DEFAULT_SCORE_CACHE_SIZE
+from matchmaking.timer import profiled, span
+
+
+class ReplanMatchupOptimizer(SimpleMatchupOptimizer):
+    """
+    Re-plans the remaining rounds of a running session after players joined or left.
+
+    The rounds already played are frozen and still count for all metrics, so the
+    statistics accumulated so far are kept. The search starts from the existing plan,
+    only rounds with players who left are drafted anew, and then improves one
+    remaining round at a time. Every future matchup that differs from the old plan
+    costs change_weight, so untouched rounds are kept unless changing them pays off.
+
+    Players who are behind in played matches get a higher draft probability score.
+    """
+
+    def __init__(
+        self,
+        plan: List[Matchup],
+        num_played_rounds: int,
+        players: List[Player],
+        num_fields: int,
+        num_iterations: int,
+        weights_and_metrics: MetricWeightsConfig,
+        num_remaining_rounds: Optional[int] = None,
+        change_weight: float = 1.0,
+        pareto_archive_size: int = 100,
+        candidate_pool_size: int = 200,
+        rerank_metrics: Iterable[str] = (),
+        constraints: Optional[ConstraintSpec] = None,
+        rng: Optional[np.random.Generator] = None,
+        score_cache_size: int = DEFAULT_SCORE_CACHE_SIZE,
+        initial_schedules: Optional[Iterable[np.ndarray]] = None,
+    ):
+        self.frozen_matchups = plan[: num_played_rounds * num_fields]
+        self.old_future_matchups = plan[num_played_rounds * num_fields :]
+        self.num_played_rounds = num_played_rounds
+        self.change_weight = change_weight
+        self.active_players = players
+
+        if num_remaining_rounds is None:
+            num_remaining_rounds = len(self.old_future_matchups) // num_fields
+        self.num_remaining_rounds = num_remaining_rounds
+
+        # players who left still take part in the played rounds
+        active_uids = {player.get_unique_identifier() for player in players}
+        departed_players = {
+            player.get_unique_identifier(): player
+            for matchup in self.frozen_matchups
+            for player in matchup.players
+            if player.get_unique_identifier() not in active_uids
+        }
+
+        super().__init__(
+            players + list(departed_players.values()),
+            num_played_rounds + num_remaining_rounds,
+            num_fields,
+            num_iterations,
+            weights_and_metrics,
+            pareto_archive_size,
+            candidate_pool_size,
+            rerank_metrics,
+            constraints=constraints,
+            rng=rng,
+            score_cache_size=score_cache_size,
+            initial_schedules=initial_schedules,
+        )
+
+        self._update_draft_probability_scores()
+
+    def get_feasibility_report(self) -> FeasibilityReport:
+        # only the active players are drafted into the remaining rounds, and their
+        # matchups of the played rounds can not be drawn again
+        active_uids = {player.get_unique_identifier() for player in self.active_players}
+        num_used_matchups = sum(
+            set(matchup.get_all_player_uids()) <= active_uids
+            for matchup in self.frozen_matchups
+        )
+
+        return analyze_feasibility(
+            len(self.active_players),
+            self.num_remaining_rounds,
+            self.num_fields,
+            constraints=self.constraints,
+            num_used_matchups=num_used_matchups,
+        )
+
+    def get_schedule_problem(self, schedule: np.ndarray) -> Optional[str]:
+        problem = super().get_schedule_problem(schedule)
+        if problem is not None:
+            return problem
+
+        if not np.array_equal(
+            schedule[: self.num_played_rounds], self.encode(self.frozen_matchups)
+        ):
+            return "the played rounds differ."
+        # players who left come after the active players
+        if np.any(schedule[self.num_played_rounds :] >= len(self.active_players)):
+            return "a player who left plays in a remaining round."
+
+        return None
+
+    def get_draftable_players(self, round_index: Optional[int] = None) -> List[Player]:
+        return self.active_players
+
+    def get_draftable_player_indices(
+        self, round_index: Optional[int] = None
+    ) -> np.ndarray:
+        # players who left come after the active players
+        return np.arange(len(self.active_players))
+
+    def _update_draft_probability_scores(self) -> None:
+        index_per_uid = {uid: i for i, uid in enumerate(self.player_uids)}
+        num_played = np.zeros(len(self.players))
+        for matchup in self.frozen_matchups:
+            for uid in matchup.get_all_player_uids():
+                num_played[index_per_uid[uid]] += 1
+
+        self.draft_probability_scores = 1.0 + num_played.max(initial=0) - num_played
+
+    def _split_rounds(self, matchups: List[Matchup]) -> List[List[Matchup]]:
+        return [
+            matchups[i * self.num_fields : (i + 1) * self.num_fields]
+            for i in range(len(matchups) // self.num_fields)
+        ]
+
+    def _get_history(self, rounds: List[List[Matchup]], skipped_round: int) -> set:
+        return {
+            matchup.get_unique_identifier()
+            for i, matchups in enumerate(rounds)
+            if i != skipped_round
+            for matchup in matchups
+        } | {matchup.get_unique_identifier() for matchup in self.frozen_matchups}
+
+    def get_warm_start_rounds(self) -> List[List[Matchup]]:
+        """The remaining rounds of the old plan, with rounds of players who left drafted anew."""
+        active_uids = {player.get_unique_identifier() for player in self.active_players}
+
+        rounds = self._split_rounds(self.old_future_matchups)[
+            : self.num_remaining_rounds
+        ]
+        rounds += [None] * (self.num_remaining_rounds - len(rounds))
+
+        for i, matchups in enumerate(rounds):
+            if not self._is_round_kept(matchups, active_uids, i):
+                rounds[i] = self.sample_matchups(
+                    self._get_history(rounds, i), self.num_played_rounds + i
+                )
+
+        return rounds
+
+    def _is_round_kept(
+        self, matchups: Optional[List[Matchup]], active_uids: set, round_index: int
+    ) -> bool:
+        if matchups is None:
+            return False
+
+        if not all(
+            set(matchup.get_all_player_uids()) <= active_uids for matchup in matchups
+        ):
+            return False
+
+        return self.constraints is None or self.constraints.is_round_valid(
+            self.num_played_rounds + round_index, matchups
+        )
+
+    def count_changes(self, future_matchups: List[Matchup]) -> int:
+        """Number of future matchups that differ from the old plan at the same position."""
+        num_changes = 0
+        for i, matchup in enumerate(future_matchups):
+            if (
+                i >= len(self.old_future_matchups)
+                or matchup.get_unique_identifier()
+                != self.old_future_matchups[i].get_unique_identifier()
+            ):
+                num_changes += 1
+        return num_changes
+
+    def evaluate_rounds(self, rounds: List[List[Matchup]]) -> float:
+        future_matchups = [matchup for matchups in rounds for matchup in matchups]
+
+        _, loss = self.evaluate_schedule(
+            self.encode(self.frozen_matchups + future_matchups)
+        )
+
+        return loss + self.change_weight * self.count_changes(future_matchups)
+
+    @profiled("search")
+    def get_most_diverse_matchups(
+        self,
+    ) -> Tuple[List[Matchup], float, dict, List[float], List[int]]:
+
+        self.start_search()
+        if self.is_resumed():
+            # the current rounds are always those of the incumbent
+            rounds = self._split_rounds(
+                self.best_matchup_config[len(self.frozen_matchups) :]
+            )
+            score = self.min_score
+        else:
+            rounds = self.get_warm_start_rounds()
+            score = self.evaluate_rounds(rounds)
+        # e.g. an earlier re-plan of the session can be a better start than the old
+        # plan, or than the incumbent of a resumed search
+        for schedule in self.initial_schedules:
+            initial_rounds = self._split_rounds(
+                decode_schedule(schedule[self.num_played_rounds :], self.players)
+            )
+            initial_score = self.evaluate_rounds(initial_rounds)
+            if initial_score < score:
+                rounds, score = initial_rounds, initial_score
+        if score < self.min_score:
+            self._accept(rounds, score, self.num_iterations_done)
+
+        # a resumed search continues after the iterations of its checkpoint
+        for iter in tqdm(
+            range(self.num_iterations_done, self.num_iterations),
+            disable=not self.show_progress_bar(),
+        ):
+            if self.is_stop_requested() or self.num_remaining_rounds == 0:
+                break
+
+            round_index = self.rng.integers(self.num_remaining_rounds)
+            candidate_rounds = list(rounds)
+            try:
+                candidate_rounds[round_index] = self.sample_matchups(
+                    self._get_history(rounds, round_index),
+                    self.num_played_rounds + round_index,
+                )
+            except ValueError:
+                # only this draw is lost, the current rounds are kept
+                self.num_failed_draws += 1
+            else:
+                candidate_score = self.evaluate_rounds(candidate_rounds)
+                if candidate_score < score:
+                    rounds, score = candidate_rounds, candidate_score
+                    self._accept(rounds, score, iter)
+
+            self.num_iterations_done = iter + 1
+            self.report_progress()
+
+        self.finish_search()
+        results, _ = self.get_matchup_set_score(self.best_matchup_config)
+
+        return (
+            self.best_matchup_config,
+            self.min_score,
+            results,
+            self.best_scores,
+            self.best_scores_iterations,
+        )
+
+    def _accept(self, rounds: List[List[Matchup]], score: float, iter: int) -> None:
+        future_matchups = [matchup for matchups in rounds for matchup in matchups]
+        with span("copy_best_matchups"):
+            self.set_incumbent(deepcopy(self.frozen_matchups + future_matchups), score)
+        self.record_best_score(score, iter)
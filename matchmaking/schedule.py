@@ -0,0 +1,114 @@
+# Integer schedule representation used by the vectorized metric computation
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from matchmaking.data import Matchup, Team, Player
+
+# sentinel for rounds in which a player does not play
+RESTING = -1
+
+# for each slot of a matchup (team A: 0, 1, team B: 2, 3) the slots of the teammate and the opponents
+_PARTNER_SLOTS = np.array([1, 0, 3, 2])
+_OPPONENT_SLOTS = np.array([[2, 3], [2, 3], [0, 1], [0, 1]])
+
+
+def encode_matchups(
+    matchups: List[Matchup],
+    num_fields: int,
+    player_uids: Optional[List[str]] = None,
+) -> Tuple[np.ndarray, List[str]]:
+    """
+    Encode a flat list of matchups into an int schedule of shape
+    (num_rounds, num_fields, 4). The last axis holds team A (0, 1) and team B (2, 3).
+
+    If no player uids are given, players are indexed in order of first appearance.
+    """
+    if player_uids is None:
+        player_uids = []
+        for matchup in matchups:
+            for player_uid in matchup.get_all_player_uids():
+                if player_uid not in player_uids:
+                    player_uids.append(player_uid)
+
+    index_per_uid = {player_uid: i for i, player_uid in enumerate(player_uids)}
+
+    schedule = np.array(
+        [
+            [index_per_uid[player_uid] for player_uid in matchup.get_all_player_uids()]
+            for matchup in matchups
+        ],
+        dtype=np.int64,
+    ).reshape(-1, num_fields, 4)
+
+    return schedule, list(player_uids)
+
+
+def decode_schedule(schedule: np.ndarray, players: List[Player]) -> List[Matchup]:
+    """Decode an int schedule into the flat list of matchups (round by round, field by field)."""
+    return [
+        Matchup(
+            Team(players[a], players[b]),
+            Team(players[c], players[d]),
+        )
+        for a, b, c, d in schedule.reshape(-1, 4).tolist()
+    ]
+
+
+def compute_play_mask(schedule: np.ndarray, num_players: int) -> np.ndarray:
+    """Boolean (players, rounds) mask, True where the player plays in that round."""
+    num_rounds = schedule.shape[0]
+
+    play_mask = np.zeros((num_players, num_rounds), dtype=bool)
+
+    rounds = np.broadcast_to(np.arange(num_rounds)[:, None, None], schedule.shape)
+    play_mask[schedule.ravel(), rounds.ravel()] = True
+
+    return play_mask
+
+
+def compute_partner_matrix(schedule: np.ndarray, num_players: int) -> np.ndarray:
+    """Int (players, rounds) matrix of each player's teammate, RESTING where the player rests."""
+    num_rounds = schedule.shape[0]
+
+    partner_matrix = np.full((num_players, num_rounds), RESTING, dtype=np.int64)
+
+    rounds = np.broadcast_to(np.arange(num_rounds)[:, None, None], schedule.shape)
+    partner_matrix[schedule, rounds] = schedule[..., _PARTNER_SLOTS]
+
+    return partner_matrix
+
+
+def compute_opponent_matrix(schedule: np.ndarray, num_players: int) -> np.ndarray:
+    """
+    Int (players, rounds, 2) matrix of each player's two opponents in ascending order,
+    RESTING where the player rests.
+    """
+    num_rounds = schedule.shape[0]
+
+    opponent_matrix = np.full((num_players, num_rounds, 2), RESTING, dtype=np.int64)
+
+    rounds = np.broadcast_to(np.arange(num_rounds)[:, None, None], schedule.shape)
+    opponent_matrix[schedule, rounds] = np.sort(schedule[..., _OPPONENT_SLOTS], axis=-1)
+
+    return opponent_matrix
+
+
+def compute_enemy_team_matrix(
+    opponent_matrix: np.ndarray, num_players: int
+) -> np.ndarray:
+    """Int (players, rounds) matrix of enemy team ids, RESTING where the player rests."""
+    enemy_team_matrix = opponent_matrix[..., 0] * num_players + opponent_matrix[..., 1]
+    enemy_team_matrix[opponent_matrix[..., 0] == RESTING] = RESTING
+    return enemy_team_matrix
+
+
+def get_enemy_team_uid(enemy_team_id: int, player_uids: List[str]) -> str:
+    num_players = len(player_uids)
+    team_player_uids = sorted(
+        [
+            player_uids[enemy_team_id // num_players],
+            player_uids[enemy_team_id % num_players],
+        ]
+    )
+    return team_player_uids[0] + " & " + team_player_uids[1]
@@ -0,0 +1,156 @@
+import hashlib
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+# scores kept by the cache of an optimizer, each entry costs a 16 byte key, the
+# metric vector and the loss
+DEFAULT_SCORE_CACHE_SIZE = 10_000
+
+KEY_SIZE = 16
+
+
+def get_matchup_keys(schedule: np.ndarray, num_players: int) -> np.ndarray:
+    """
+    (rounds, fields) ints that identify each matchup regardless of the order of the
+    teammates and of the teams, sorted within each round. Schedules that only differ
+    in the order of teammates, teams or fields have the same keys, the metrics do
+    not depend on that order. The keys fit into 64 bits for up to 55,000 players.
+    """
+    schedule = schedule.astype(np.int64)
+    team_a = np.minimum(schedule[..., 0], schedule[..., 1]) * num_players + np.maximum(
+        schedule[..., 0], schedule[..., 1]
+    )
+    team_b = np.minimum(schedule[..., 2], schedule[..., 3]) * num_players + np.maximum(
+        schedule[..., 2], schedule[..., 3]
+    )
+    num_teams = num_players * num_players
+    matchups = np.minimum(team_a, team_b) * num_teams + np.maximum(team_a, team_b)
+    return np.sort(matchups, axis=1)
+
+
+def canonicalize_schedule(schedule: np.ndarray, num_players: int) -> np.ndarray:
+    """Int schedule with sorted teammates, teams and matchups, see get_matchup_keys."""
+    num_teams = num_players * num_players
+    team_a, team_b = np.divmod(get_matchup_keys(schedule, num_players), num_teams)
+    return np.stack(
+        np.divmod(team_a, num_players) + np.divmod(team_b, num_players), axis=-1
+    )
+
+
+def relabel_schedule(schedule: np.ndarray, num_players: int) -> np.ndarray:
+    """
+    Canonical schedule with the players renamed by the rounds they play in, players
+    who play in the same rounds in the order of their first match. Renamings of a
+    schedule lead to the same result unless some players play in the same rounds.
+    Equal results are always renamings of each other, so using them as cache key
+    never mixes up schedules.
+    """
+    canonical = canonicalize_schedule(schedule, num_players)
+    num_rounds = canonical.shape[0]
+
+    players, first_indices = np.unique(canonical, return_index=True)
+    play_mask = np.zeros((num_players, num_rounds), dtype=bool)
+    play_mask[canonical.reshape(num_rounds, -1), np.arange(num_rounds)[:, None]] = True
+    # 8 rounds per byte, fewer keys to sort by
+    packed_play_mask = np.packbits(play_mask[players], axis=1)
+
+    # the rounds a player plays in do not depend on the names, the first match does
+    order = np.lexsort((first_indices, *packed_play_mask.T[::-1]))
+    new_ids = np.empty(num_players, dtype=np.int64)
+    new_ids[players[order]] = np.arange(players.size)
+
+    return canonicalize_schedule(new_ids[canonical], num_players)
+
+
+class ScoreCache:
+    """
+    Bounded LRU cache of metric vectors and losses of evaluated schedules, keyed by a
+    hash of their canonical form. Only valid for one set of metrics and weights.
+
+    With relabel_players, schedules that only differ by the names of the players
+    share an entry as well (see relabel_schedule). That only pays off for tiny
+    rosters (e.g. 5 players on one field), as it costs several times the plain key.
+    Only use it if no input depends on the individual players, like an availability
+    mask or a league prior. The metrics of a renamed schedule can then differ in the
+    last bits of precision.
+    """
+
+    def __init__(
+        self, max_size: int = DEFAULT_SCORE_CACHE_SIZE, relabel_players: bool = False
+    ):
+        self.max_size = max_size
+        self.relabel_players = relabel_players
+        self.entries: "OrderedDict[bytes, Tuple[np.ndarray, float]]" = OrderedDict()
+        self.num_hits = 0
+        self.num_misses = 0
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    @property
+    def hit_rate(self) -> float:
+        num_lookups = self.num_hits + self.num_misses
+        return self.num_hits / num_lookups if num_lookups else 0.0
+
+    def get_key(self, schedule: np.ndarray, num_players: int) -> bytes:
+        if self.relabel_players:
+            schedule = relabel_schedule(schedule, num_players)
+        return hashlib.blake2b(
+            get_matchup_keys(schedule, num_players).tobytes(), digest_size=KEY_SIZE
+        ).digest()
+
+    def get(self, key: bytes) -> Optional[Tuple[np.ndarray, float]]:
+        entry = self.entries.get(key)
+        if entry is None:
+            self.num_misses += 1
+            return None
+
+        self.num_hits += 1
+        self.entries.move_to_end(key)
+        return entry
+
+    def put(self, key: bytes, metric_vector: np.ndarray, loss: float) -> None:
+        if self.max_size <= 0:
+            return
+
+        self.entries[key] = (metric_vector, loss)
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def get_stats(self) -> Dict[str, float]:
+        return {
+            "score_cache_hit_rate": self.hit_rate,
+            "score_cache_entries": len(self),
+        }
+
+    def get_state(self, num_metrics: int) -> Dict[str, np.ndarray]:
+        """Entries in LRU order as arrays, e.g. for a checkpoint."""
+        return {
+            "score_cache_keys": np.frombuffer(
+                b"".join(self.entries), dtype=np.uint8
+            ).reshape(-1, KEY_SIZE),
+            "score_cache_metrics": np.array(
+                [metric_vector for metric_vector, _ in self.entries.values()],
+                dtype=np.float64,
+            ).reshape(-1, num_metrics),
+            "score_cache_losses": np.array(
+                [loss for _, loss in self.entries.values()], dtype=np.float64
+            ),
+            "score_cache_counts": np.array(
+                [self.num_hits, self.num_misses], dtype=np.int64
+            ),
+        }
+
+    def set_state(self, arrays: Dict[str, np.ndarray]) -> None:
+        self.entries = OrderedDict(
+            (key.tobytes(), (metric_vector, float(loss)))
+            for key, metric_vector, loss in zip(
+                arrays["score_cache_keys"],
+                arrays["score_cache_metrics"],
+                arrays["score_cache_losses"],
+            )
+        )
+        self.num_hits, self.num_misses = arrays["score_cache_counts"].tolist()
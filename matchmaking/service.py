@@ -0,0 +1,399 @@
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, List, NamedTuple, Optional, Tuple
+from uuid import uuid4
+
+from matchmaking.data import Matchup, Player
+from matchmaking.config import MetricWeightsConfig
+from matchmaking.metric_registry import METRIC_REGISTRY
+from matchmaking.optimization_pool import (
+    OptimizationPool,
+    PooledOptimization,
+    get_optimizer_class,
+)
+from matchmaking.feasibility import analyze_feasibility
+from matchmaking.export import export_results_to_json, export_to_excel
+
+JSON_CONTENT_TYPE = "application/json"
+XLSX_CONTENT_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+REASON_PHRASES = {
+    200: "OK",
+    202: "Accepted",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    409: "Conflict",
+    413: "Payload Too Large",
+    429: "Too Many Requests",
+}
+
+MAX_BODY_SIZE = 1024 * 1024
+
+# the whole plan of a job is kept in memory, so its size is limited
+MAX_NUM_ROUNDS = 10_000
+
+
+class Response(NamedTuple):
+    status: int
+    body: bytes
+    content_type: str = JSON_CONTENT_TYPE
+    headers: Tuple[Tuple[str, str], ...] = ()
+
+
+def json_response(status: int, payload: dict, headers=()) -> Response:
+    return Response(status, json.dumps(payload).encode(), JSON_CONTENT_TYPE, headers)
+
+
+def error_response(status: int, message: str, headers=()) -> Response:
+    return json_response(status, {"error": message}, headers)
+
+
+@dataclass
+class ServiceJob:
+    job_id: str
+    players: List[Player]
+    num_fields: int
+    num_rounds: int
+    optimization: PooledOptimization
+    created_at: float = field(default_factory=time.time)
+    is_cancelled: bool = False
+
+    def get_status(self) -> str:
+        if self.is_cancelled:
+            return "cancelled"
+        if self.optimization.is_queued():
+            return "queued"
+        if self.optimization.is_running():
+            return "running"
+        if self.optimization.error is not None:
+            return "failed"
+        return "done"
+
+
+def _serialize_matchups(matchups: Optional[List[Matchup]], num_fields: int):
+    if matchups is None:
+        return None
+
+    return [
+        {
+            "round": i // num_fields,
+            "field": i % num_fields,
+            "team_a": [str(matchup.team_a.player_1), str(matchup.team_a.player_2)],
+            "team_b": [str(matchup.team_b.player_1), str(matchup.team_b.player_2)],
+        }
+        for i, matchup in enumerate(matchups)
+    ]
+
+
+def parse_job_spec(spec: dict) -> dict:
+    """Validate a submitted job and turn it into the arguments of OptimizationPool.submit."""
+
+    if not isinstance(spec, dict):
+        raise ValueError("The job must be a JSON object.")
+
+    player_names = spec.get("players")
+    if not isinstance(player_names, list) or not all(
+        isinstance(x, str) and x for x in player_names
+    ):
+        raise ValueError("'players' must be a list of non-empty names.")
+
+    if len(set(player_names)) != len(player_names):
+        raise ValueError("Player names must be unique.")
+
+    num_fields = spec.get("num_fields", 1)
+    num_rounds = spec.get("num_rounds", len(player_names))
+    num_iterations = spec.get("num_iterations", 100000)
+    time_budget_seconds = spec.get("time_budget_seconds")
+
+    for name, value in [
+        ("num_fields", num_fields),
+        ("num_rounds", num_rounds),
+        ("num_iterations", num_iterations),
+    ]:
+        if not isinstance(value, int) or isinstance(value, bool) or value < 1:
+            raise ValueError(f"'{name}' must be a positive integer.")
+
+    if num_rounds > MAX_NUM_ROUNDS:
+        raise ValueError(f"'num_rounds' must not exceed {MAX_NUM_ROUNDS}.")
+
+    if time_budget_seconds is not None and (
+        not isinstance(time_budget_seconds, (int, float)) or time_budget_seconds <= 0
+    ):
+        raise ValueError("'time_budget_seconds' must be a positive number.")
+
+    analyze_feasibility(
+        len(player_names),
+        num_rounds,
+        num_fields,
+        unique_matchups=get_optimizer_class(len(player_names)).requires_unique_matchups,
+    ).check()
+
+    weights_and_metrics = MetricWeightsConfig()
+    metric_per_name = {
+        name: metric
+        for name, metric in zip(
+            weights_and_metrics.get_metric_names(),
+            weights_and_metrics.weight_per_metric,
+        )
+    }
+
+    for name, weight in spec.get("weights", {}).items():
+        if name not in METRIC_REGISTRY:
+            raise ValueError(f"Unknown metric '{name}'.")
+        if not isinstance(weight, (int, float)):
+            raise ValueError(f"The weight of '{name}' must be a number.")
+        weights_and_metrics.update_weight(
+            metric_per_name.get(name, name), float(weight)
+        )
+
+    return dict(
+        players=[Player(name) for name in player_names],
+        num_rounds=num_rounds,
+        num_fields=num_fields,
+        num_iterations=num_iterations,
+        weights_and_metrics=weights_and_metrics,
+        time_budget_seconds=time_budget_seconds,
+    )
+
+
+class MatchmakingService:
+    """
+    Local HTTP interface to the optimizers, e.g. for a booking system.
+
+        POST   /jobs                   submit a job, returns its id
+        GET    /jobs/<id>              status, progress and the best schedule so far
+        DELETE /jobs/<id>              cancel, the best schedule so far is kept
+        GET    /jobs/<id>/result.json  player statistics, see export_results_to_json
+        GET    /jobs/<id>/result.xlsx  score sheet, see export_to_excel
+
+    Searches run in an OptimizationPool, never on the event loop. When more than
+    max_queued_jobs wait for a worker, new jobs are rejected with 429 until the
+    queue drains.
+    """
+
+    def __init__(
+        self,
+        pool: OptimizationPool,
+        max_queued_jobs: int = 32,
+        max_kept_jobs: int = 256,
+    ):
+        self.pool = pool
+        self.max_queued_jobs = max_queued_jobs
+        self.max_kept_jobs = max_kept_jobs
+        self.jobs: "OrderedDict[str, ServiceJob]" = OrderedDict()
+
+    async def handle_request(
+        self, method: str, path: str, body: bytes, client_id: str
+    ) -> Response:
+        parts = [x for x in path.split("?")[0].split("/") if x]
+
+        if parts == ["jobs"]:
+            if method != "POST":
+                return error_response(405, "Use POST to submit a job.")
+            return await self._submit(body, client_id)
+
+        if len(parts) < 2 or parts[0] != "jobs" or len(parts) > 3:
+            return error_response(404, f"Unknown path '{path}'.")
+
+        job = self.jobs.get(parts[1])
+        if job is None:
+            return error_response(404, f"Unknown job '{parts[1]}'.")
+
+        if len(parts) == 2 and method == "GET":
+            return json_response(200, await asyncio.to_thread(self._get_status, job))
+        if len(parts) == 2 and method == "DELETE":
+            return json_response(200, await asyncio.to_thread(self._cancel, job))
+        if len(parts) == 3 and method == "GET":
+            return await self._get_result(job, parts[2])
+
+        return error_response(405, f"{method} is not supported for '{path}'.")
+
+    async def _submit(self, body: bytes, client_id: str) -> Response:
+        try:
+            arguments = parse_job_spec(json.loads(body or b"{}"))
+        except (ValueError, AttributeError) as e:
+            return error_response(400, str(e))
+
+        if self.pool.get_num_queued() >= self.max_queued_jobs:
+            return error_response(
+                429, "Too many queued jobs, retry later.", (("Retry-After", "5"),)
+            )
+
+        # the pool starts its worker processes with the first job
+        optimization = await asyncio.to_thread(self.pool.submit, client_id, **arguments)
+
+        job = ServiceJob(
+            uuid4().hex,
+            arguments["players"],
+            arguments["num_fields"],
+            arguments["num_rounds"],
+            optimization,
+        )
+        self.jobs[job.job_id] = job
+        self._forget_old_jobs()
+
+        return json_response(202, {"job_id": job.job_id, "status": job.get_status()})
+
+    def _forget_old_jobs(self) -> None:
+        finished_job_ids = [
+            job_id
+            for job_id, job in self.jobs.items()
+            if not job.optimization.is_running()
+        ]
+        for job_id in finished_job_ids[: max(0, len(self.jobs) - self.max_kept_jobs)]:
+            del self.jobs[job_id]
+
+    def _get_status(self, job: ServiceJob) -> dict:
+        progress = job.optimization.get_progress()
+
+        return {
+            "job_id": job.job_id,
+            "status": job.get_status(),
+            "num_iterations_done": progress.num_iterations_done,
+            "num_iterations": progress.num_iterations,
+            "elapsed_seconds": progress.elapsed_seconds,
+            "best_score": (
+                None if progress.best_matchups is None else progress.best_score
+            ),
+            "best_matchups": _serialize_matchups(
+                progress.best_matchups, job.num_fields
+            ),
+        }
+
+    def _cancel(self, job: ServiceJob) -> dict:
+        if job.optimization.is_running():
+            job.optimization.stop()
+            job.is_cancelled = True
+        return self._get_status(job)
+
+    async def _get_result(self, job: ServiceJob, name: str) -> Response:
+        if name not in ("result.json", "result.xlsx"):
+            return error_response(404, f"Unknown result '{name}'.")
+
+        if job.optimization.is_running():
+            return error_response(409, "The job is not finished yet.")
+
+        if job.optimization.error is not None:
+            return error_response(409, f"The job failed: {job.optimization.error}")
+
+        best_matchups, _, results, _, _ = await asyncio.to_thread(
+            lambda: job.optimization.result
+        )
+        if best_matchups is None:
+            return error_response(409, "The job was cancelled before any result.")
+
+        if name == "result.json":
+            body = await asyncio.to_thread(
+                self._export,
+                lambda out_path: export_results_to_json(results, out_path),
+                name,
+            )
+            return Response(200, body, JSON_CONTENT_TYPE)
+
+        body = await asyncio.to_thread(
+            self._export,
+            lambda out_path: export_to_excel(
+                best_matchups, job.players, job.num_fields, out_path
+            ),
+            name,
+        )
+        return Response(
+            200,
+            body,
+            XLSX_CONTENT_TYPE,
+            (("Content-Disposition", f'attachment; filename="{job.job_id}.xlsx"'),),
+        )
+
+    @staticmethod
+    def _export(export_function, file_name: str) -> bytes:
+        # the exporters write files, so export to a temporary one and return its bytes
+        with tempfile.TemporaryDirectory() as out_dir:
+            out_path = os.path.join(out_dir, file_name)
+            export_function(out_path)
+            with open(out_path, "rb") as f:
+                return f.read()
+
+    async def handle_connection(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        try:
+            response = await self._read_and_handle(reader, writer)
+        except (ValueError, asyncio.IncompleteReadError) as e:
+            response = error_response(400, f"Malformed request: {e}")
+
+        reason = REASON_PHRASES.get(response.status, "")
+        head = [
+            f"HTTP/1.1 {response.status} {reason}",
+            f"Content-Type: {response.content_type}",
+            f"Content-Length: {len(response.body)}",
+            "Connection: close",
+        ] + [f"{name}: {value}" for name, value in response.headers]
+
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + response.body)
+        try:
+            await writer.drain()
+        finally:
+            writer.close()
+
+    async def _read_and_handle(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> Response:
+        method, target, _ = (await reader.readline()).decode("latin-1").split()
+
+        headers: Dict[str, str] = {}
+        while True:
+            line = (await reader.readline()).decode("latin-1")
+            if line in ("\r\n", "\n", ""):
+                break
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        content_length = int(headers.get("content-length", 0))
+        if content_length > MAX_BODY_SIZE:
+            return error_response(413, "The request body is too large.")
+        body = await reader.readexactly(content_length)
+
+        # fairness is per client, the booking system may send its own id
+        client_id = headers.get("x-client-id") or str(
+            writer.get_extra_info("peername", ("unknown",))[0]
+        )
+
+        return await self.handle_request(method.upper(), target, body, client_id)
+
+    async def serve(self, host: str = "127.0.0.1", port: int = 8765) -> None:
+        server = await asyncio.start_server(self.handle_connection, host, port)
+        print(f"Matchmaking service listening on http://{host}:{port}")
+        async with server:
+            await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local matchmaking HTTP service.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument(
+        "--workers", type=int, default=None, help="defaults to the number of cores"
+    )
+    parser.add_argument("--max-queued-jobs", type=int, default=32)
+    args = parser.parse_args()
+
+    pool = OptimizationPool(max_workers=args.workers)
+    service = MatchmakingService(pool, max_queued_jobs=args.max_queued_jobs)
+
+    try:
+        asyncio.run(service.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        pool.shutdown()
+
+
+if __name__ == "__main__":
+    main()
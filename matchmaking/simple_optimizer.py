@@ -1,14 +1,22 @@
 from pprint import pprint
 from copy import deepcopy
-from typing import List, Tuple, Optional
+from typing import Dict, Iterable, List, Tuple, Optional
 
 from tqdm import tqdm
 import numpy as np
 
 from matchmaking.data import Player, Matchup, Team
-from matchmaking.metrics import get_total_matchup_set_score
 from matchmaking.config import MetricWeightsConfig
 from matchmaking.optimizer import MatchupOptimizer
+from matchmaking.constraints import ConstraintSpec
+from matchmaking.league import LeaguePrior
+from matchmaking.schedule import decode_schedule
+from matchmaking.score_cache import DEFAULT_SCORE_CACHE_SIZE
+from matchmaking.timer import profiled, span
+
+# draws of a whole round before giving up, only reached if the matchups that were not
+# played yet hardly form a round of disjoint ones
+MAX_SAMPLING_ATTEMPTS = 10_000
 
 
 class SimpleMatchupOptimizer(MatchupOptimizer):
@@ -20,39 +28,112 @@ class SimpleMatchupOptimizer(MatchupOptimizer):
         num_fields: int,
         num_iterations: int,
         weights_and_metrics: MetricWeightsConfig,
+        pareto_archive_size: int = 100,
+        candidate_pool_size: int = 200,
+        rerank_metrics: Iterable[str] = (),
+        availability: Optional[np.ndarray] = None,
+        constraints: Optional[ConstraintSpec] = None,
+        league_prior: Optional[LeaguePrior] = None,
+        rng: Optional[np.random.Generator] = None,
+        score_cache_size: int = DEFAULT_SCORE_CACHE_SIZE,
+        initial_schedules: Optional[Iterable[np.ndarray]] = None,
     ):
         super().__init__(
-            players, num_rounds, num_fields, num_iterations, weights_and_metrics
+            players,
+            num_rounds,
+            num_fields,
+            num_iterations,
+            weights_and_metrics,
+            pareto_archive_size,
+            candidate_pool_size,
+            rerank_metrics,
+            availability,
+            constraints,
+            league_prior,
+            rng,
+            score_cache_size,
+            initial_schedules,
+        )
+
+        # draft weights indexed like self.players, a copy so that the scores of the
+        # given players stay as they are for later runs
+        self.draft_probability_scores = np.array(
+            [player.get_draft_probability_score() for player in self.players],
+            dtype=float,
         )
+        # players who rested more often in earlier sessions are drafted a bit more often
+        if league_prior is not None:
+            self.draft_probability_scores = 1.0 + league_prior.get_rest_shares()
 
-        self.best_scores: List[float] = []
-        self.best_scores_iterations: List[int] = []
-        self.min_score: float = np.inf
-        self.best_matchup_config: Optional[List[Matchup]] = None
+        # iterations skipped because the sampler found no round of unplayed matchups
+        self.num_failed_draws = 0
 
+    @profiled("search")
     def get_most_diverse_matchups(
         self,
     ) -> Tuple[List[Matchup], float, dict, List[float], List[int]]:
 
-        for iter in tqdm(range(self.num_iterations)):
-            matchup_history = set()
-            matchups: List[Matchup] = []
+        self.start_search()
+        # the plans to beat, e.g. the incumbent of the previous run, the search then
+        # also mutates the best of them. A resumed search offers them to its incumbent
+        for schedule in self.initial_schedules:
+            self.set_incumbent(
+                *self.update_best_score(
+                    decode_schedule(schedule, self.players),
+                    self.min_score,
+                    self.best_matchup_config,
+                    self.num_iterations_done,
+                )
+            )
+
+        # a resumed search continues after the iterations of its checkpoint
+        for iter in tqdm(
+            range(self.num_iterations_done, self.num_iterations),
+            disable=not self.show_progress_bar(),
+        ):
+            if self.is_stop_requested():
+                break
 
-            for _ in range(self.num_rounds):
-                temp_matchups = self.sample_matchups(matchup_history)
-                matchup_history.update(m.get_unique_identifier() for m in temp_matchups)
-                matchups.extend(temp_matchups)
+            try:
+                # a seeded search spends every other iteration refining the incumbent
+                if (
+                    self.initial_schedules
+                    and self.best_matchup_config is not None
+                    and iter % 2 == 1
+                ):
+                    matchups = self.resample_incumbent_round()
+                else:
+                    matchups = self.sample_plan()
+            except ValueError:
+                # only this draw is lost, the incumbent is kept
+                self.num_failed_draws += 1
+            else:
+                self.set_incumbent(
+                    *self.update_best_score(
+                        matchups, self.min_score, self.best_matchup_config, iter
+                    )
+                )
+            self.num_iterations_done = iter + 1
+            self.report_progress()
 
-            self.best_matchup_config, self.min_score = self.update_best_score(
-                matchups, self.min_score, self.best_matchup_config, iter
+        self.finish_search()
+
+        if self.best_matchup_config is None:
+            if self.num_failed_draws > 0:
+                raise ValueError(
+                    f"Found no plan of {self.num_rounds} rounds without repeated "
+                    f"matchups in {self.num_failed_draws} iterations. Plan fewer rounds."
+                )
+            # stopped before the first iteration
+            return (
+                None,
+                self.min_score,
+                {},
+                self.best_scores,
+                self.best_scores_iterations,
             )
 
-        results, _ = get_total_matchup_set_score(
-            self.best_matchup_config,
-            len(self.players),
-            self.weights_and_metrics,
-            self.num_fields,
-        )
+        results, _ = self.get_matchup_set_score(self.best_matchup_config)
 
         return (
             self.best_matchup_config,
@@ -62,21 +143,76 @@ class SimpleMatchupOptimizer(MatchupOptimizer):
             self.best_scores_iterations,
         )
 
-    def sample_matchups(self, matchup_history: set) -> List[Matchup]:
+    def get_telemetry_stats(self) -> dict:
+        return {
+            **super().get_telemetry_stats(),
+            "num_failed_draws": self.num_failed_draws,
+        }
+
+    def get_checkpoint_state(self) -> Tuple[Dict[str, np.ndarray], dict]:
+        arrays, meta = super().get_checkpoint_state()
+        meta["num_failed_draws"] = self.num_failed_draws
+        return arrays, meta
+
+    def set_checkpoint_state(self, arrays: Dict[str, np.ndarray], meta: dict) -> None:
+        super().set_checkpoint_state(arrays, meta)
+        # checkpoints of earlier versions did not count them
+        self.num_failed_draws = meta.get("num_failed_draws", 0)
+
+    def sample_plan(self) -> List[Matchup]:
+        """A whole new plan, drawn round by round."""
+        matchup_history = set()
+        matchups: List[Matchup] = []
+
+        for round_index in range(self.num_rounds):
+            temp_matchups = self.sample_matchups(matchup_history, round_index)
+            matchup_history.update(m.get_unique_identifier() for m in temp_matchups)
+            matchups.extend(temp_matchups)
+
+        return matchups
+
+    def resample_incumbent_round(self) -> List[Matchup]:
+        """The incumbent with one random round drawn anew against all its other rounds."""
+        round_index = int(self.rng.integers(self.num_rounds))
+        start = round_index * self.num_fields
+        end = start + self.num_fields
+        others = self.best_matchup_config[:start] + self.best_matchup_config[end:]
+
+        new_round = self.sample_matchups(
+            {m.get_unique_identifier() for m in others}, round_index
+        )
+
+        return others[:start] + new_round + others[start:]
+
+    @profiled("sample_matchups")
+    def sample_matchups(
+        self, matchup_history: set, round_index: Optional[int] = None
+    ) -> List[Matchup]:
         """
         Sample matchups ensuring no player is repeated in the current round,
-        and that no matchup has appeared in previous rounds.
+        and that no matchup has appeared in previous rounds. With a round index,
+        only players available in that round are drawn. Raises a ValueError if no
+        such round is found in MAX_SAMPLING_ATTEMPTS draws.
         """
-        player_names = [player.name for player in self.players]
+        if self.constraints is not None:
+            return self.sample_constrained_matchups(matchup_history, round_index)
 
-        while True:
-            selected_players = np.random.choice(
-                player_names, replace=False, size=4 * self.num_fields
-            ).tolist()
+        players = self.get_draftable_players(round_index)
+        draft_probabilities = self.get_draft_probabilities(round_index)
+        num_selected = 4 * self.num_fields
+
+        for _ in range(MAX_SAMPLING_ATTEMPTS):
+            # draw player indices, much cheaper than drawing from the names
+            if draft_probabilities is None:
+                selected = self.rng.permutation(len(players))[:num_selected]
+            else:
+                selected = self.rng.choice(
+                    len(players), num_selected, replace=False, p=draft_probabilities
+                )
 
             temp_matchups = [
-                Matchup.from_names(*selected_players[j * 4 : j * 4 + 4])
-                for j in range(self.num_fields)
+                Matchup(Team(players[a], players[b]), Team(players[c], players[d]))
+                for a, b, c, d in selected.reshape(-1, 4).tolist()
             ]
 
             ids = [m.get_unique_identifier() for m in temp_matchups]
@@ -85,6 +221,71 @@ class SimpleMatchupOptimizer(MatchupOptimizer):
             if len(ids) == len(set(ids)) and not any(i in matchup_history for i in ids):
                 return temp_matchups
 
+        raise ValueError(
+            f"Found no round of {self.num_fields} matchups that were not played yet in "
+            f"{MAX_SAMPLING_ATTEMPTS} draws. Plan fewer rounds."
+        )
+
+    def sample_constrained_matchups(
+        self, matchup_history: set, round_index: Optional[int] = None
+    ) -> List[Matchup]:
+        """
+        Draw the round from the feasible matchups of the compiled constraints,
+        weighted by the draft probability scores unless they are all equal.
+        """
+        draftable_players = np.zeros(len(self.players), dtype=bool)
+        draftable_players[
+            [
+                self.constraints.index_per_uid[player.get_unique_identifier()]
+                for player in self.get_draftable_players(round_index)
+            ]
+        ] = True
+
+        player_weights = (
+            None
+            if self.get_draft_probabilities(round_index) is None
+            else self.draft_probability_scores
+        )
+
+        return self.constraints.sample_round(
+            round_index,
+            draftable_players,
+            matchup_history,
+            rng=self.rng,
+            player_weights=player_weights,
+        )
+
+    def get_draftable_players(self, round_index: Optional[int] = None) -> List[Player]:
+        if round_index is None or self.availability is None:
+            return self.players
+
+        return self.available_players_per_round[round_index]
+
+    def get_draftable_player_indices(
+        self, round_index: Optional[int] = None
+    ) -> np.ndarray:
+        """Positions of the draftable players in self.players."""
+        if round_index is None or self.availability is None:
+            return np.arange(len(self.players))
+
+        return np.flatnonzero(self.availability[:, round_index])
+
+    def get_draft_probabilities(
+        self, round_index: Optional[int] = None
+    ) -> Optional[np.ndarray]:
+        """
+        Sampling probabilities from the draft probability scores of the draftable
+        players, None while all scores are equal, so that sampling stays uniform.
+        """
+        scores = self.draft_probability_scores[
+            self.get_draftable_player_indices(round_index)
+        ]
+
+        if np.all(scores == scores[0]):
+            return None
+
+        return scores / scores.sum()
+
     def has_duplicate_matchups(self, matchups: List[Matchup]) -> bool:
         """
         Check if any matchup list contains duplicates.
@@ -106,15 +307,12 @@ class SimpleMatchupOptimizer(MatchupOptimizer):
         """
         Update the best score and configuration if the current score is lower than the minimum score.
         """
-        results, score = get_total_matchup_set_score(
-            matchups, len(self.players), self.weights_and_metrics, self.num_fields
-        )
+        _, score = self.evaluate_schedule(self.encode(matchups))
 
         if score < min_score:
-            best_matchup_set = deepcopy(matchups)
+            with span("copy_best_matchups"):
+                best_matchup_set = deepcopy(matchups)
             min_score = score
-            self.best_scores.append(min_score)
-            self.best_scores_iterations.append(iter)
-            print("Got new minimal score:", min_score)
+            self.record_best_score(min_score, iter)
 
         return best_matchup_set, min_score
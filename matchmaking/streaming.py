@@ -0,0 +1,354 @@
+import argparse
+from typing import Dict, Iterator, List, Optional
+
+import numpy as np
+
+from matchmaking.data import Matchup, Player
+from matchmaking.config import MetricWeightsConfig
+from matchmaking.metric_type import MetricType
+from matchmaking.schedule import RESTING, decode_schedule
+from matchmaking.league import LeagueStore
+from matchmaking.feasibility import analyze_feasibility
+from matchmaking.large_scale import LargeScaleMatchupOptimizer
+from matchmaking.export import StreamingExporter
+from matchmaking.metric_compute_functions import (
+    compute_nonzero_stdev_per_row,
+    compute_unique_people_not_met_per_row,
+)
+
+# default of the second session length of players who never had a second session,
+# as in the batch metric
+NO_SECOND_SESSION_LENGTH = 10.0
+
+# global metrics the streaming scorer keeps up to date, the enemy team variety index
+# needs counts per enemy team, which grow with the event, so it is left out
+STREAMING_METRICS = tuple(
+    metric.value
+    for metric in MetricType
+    if metric
+    not in (
+        MetricType.GLOBAL_ENEMY_TEAM_VARIETY_INDEX,
+        MetricType.GLOBAL_BREAK_OCCURRENCE_INDEX,
+    )
+)
+
+
+class StreamingMatchupOptimizer:
+    """
+    Plans an event of any number of rounds window by window and yields the rounds as
+    soon as they are final.
+
+    Each window is planned by the large-scale engine against the pairing history of
+    all earlier windows, which is kept as count matrices in a LeagueStore. The last
+    round of a window stays in the next window as frozen round, so rests and
+    consecutive pairings are judged across the window boundary. Memory is bounded by
+    the window size and the roster, not by the length of the event.
+    """
+
+    def __init__(
+        self,
+        players: List[Player],
+        num_rounds: int,
+        num_fields: int,
+        weights_and_metrics: MetricWeightsConfig,
+        window_size: int = 10,
+        num_iterations_per_window: int = 300,
+        patience: Optional[int] = 100,
+        rng: Optional[np.random.Generator] = None,
+    ):
+        analyze_feasibility(
+            len(players), num_rounds, num_fields, unique_matchups=False
+        ).check()
+
+        self.players = players
+        self.num_rounds = num_rounds
+        self.num_fields = num_fields
+        self.weights_and_metrics = weights_and_metrics
+        self.window_size = window_size
+        self.num_iterations_per_window = num_iterations_per_window
+        self.patience = patience
+        # shared by the windows, so a seeded event is planned reproducibly
+        self.rng = np.random.default_rng() if rng is None else rng
+
+        self.history = LeagueStore()
+        self.num_rounds_done = 0
+
+    def iter_rounds(self) -> Iterator[List[Matchup]]:
+        frozen_rounds = None
+
+        while self.num_rounds_done < self.num_rounds:
+            num_new_rounds = min(
+                self.window_size, self.num_rounds - self.num_rounds_done
+            )
+            num_frozen_rounds = 0 if frozen_rounds is None else len(frozen_rounds)
+
+            optimizer = LargeScaleMatchupOptimizer(
+                self.players,
+                num_frozen_rounds + num_new_rounds,
+                self.num_fields,
+                self.num_iterations_per_window,
+                self.weights_and_metrics,
+                league_prior=self.history.get_prior(self.players),
+                patience=self.patience,
+                frozen_rounds=frozen_rounds,
+                rng=self.rng,
+            )
+            schedule = optimizer.search()
+
+            # the last round is counted by the next window, where it is frozen
+            self.history.add_session(
+                decode_schedule(schedule[:-1], self.players),
+                self.players,
+                self.num_fields,
+            )
+            frozen_rounds = schedule[-1:]
+
+            for round_schedule in schedule[num_frozen_rounds:]:
+                self.num_rounds_done += 1
+                yield decode_schedule(round_schedule, self.players)
+
+
+class StreamingScorer:
+    """
+    Global metrics of a schedule that is added round by round. Only running
+    aggregates per player and player pair are kept, the values equal the batch
+    metrics of the whole schedule for all STREAMING_METRICS.
+    """
+
+    def __init__(self, players: List[Player]):
+        self.num_players = len(players)
+        self.index_per_uid = {
+            player.get_unique_identifier(): i for i, player in enumerate(players)
+        }
+        self.num_rounds = 0
+
+        num_players = self.num_players
+        self.num_played = np.zeros(num_players, dtype=np.int64)
+        self.partner_counts = np.zeros((num_players, num_players), dtype=np.int64)
+        self.opponent_counts = np.zeros((num_players, num_players), dtype=np.int64)
+
+        # breaks and sessions (runs of played rounds)
+        self.rest_streak = np.zeros(num_players, dtype=np.int64)
+        self.play_streak = np.zeros(num_players, dtype=np.int64)
+        self.num_sessions = np.zeros(num_players, dtype=np.int64)
+        self.second_session_length = np.full(num_players, NO_SECOND_SESSION_LENGTH)
+        self.break_shortness = 0
+
+        # pairings of the previous round (RESTING if the player rested in it) and of
+        # the previous played match of every player
+        self.last_partner = np.full(num_players, RESTING, dtype=np.int64)
+        self.last_opponents = np.full((num_players, 2), RESTING, dtype=np.int64)
+        self.last_played_partner = np.full(num_players, RESTING, dtype=np.int64)
+        self.last_played_opponents = np.full((num_players, 2), RESTING, np.int64)
+
+        self.succession_counts = {
+            metric: 0
+            for metric in [
+                MetricType.GLOBAL_TEAMMATE_SUCCESSION_INDEX,
+                MetricType.GLOBAL_ENEMY_TEAM_SUCCESSION_INDEX,
+                MetricType.GLOBAL_ENEMY_PLAYER_SUCCESSION_INDEX,
+                MetricType.GLOBAL_TEAMMATE_ROUND_SUCCESSION_INDEX,
+                MetricType.GLOBAL_ENEMY_TEAM_ROUND_SUCCESSION_INDEX,
+                MetricType.GLOBAL_ENEMY_PLAYER_ROUND_SUCCESSION_INDEX,
+            ]
+        }
+
+    def add_round(self, matchups: List[Matchup]) -> None:
+        round_ids = np.array(
+            [
+                [self.index_per_uid[uid] for uid in matchup.get_all_player_uids()]
+                for matchup in matchups
+            ],
+            dtype=np.int64,
+        )
+        playing = round_ids.ravel()
+        partners = round_ids[:, [1, 0, 3, 2]].ravel()
+        opponents = np.sort(
+            round_ids[:, [2, 3, 2, 3, 0, 1, 0, 1]].reshape(-1, 2), axis=1
+        )
+
+        is_resting = np.ones(self.num_players, dtype=bool)
+        is_resting[playing] = False
+
+        self._update_runs(playing, is_resting)
+        self._update_successions(playing, partners, opponents, is_resting)
+
+        self.num_played[playing] += 1
+        np.add.at(self.partner_counts, (playing, partners), 1)
+        np.add.at(self.opponent_counts, (playing, opponents[:, 0]), 1)
+        np.add.at(self.opponent_counts, (playing, opponents[:, 1]), 1)
+
+        self.num_rounds += 1
+
+    def _update_runs(self, playing: np.ndarray, is_resting: np.ndarray) -> None:
+        # a break ends when the player plays again
+        ended_breaks = self.rest_streak[playing]
+        self.break_shortness += int(np.sum(ended_breaks[ended_breaks > 1] ** 2))
+        self.rest_streak[playing] = 0
+        self.rest_streak[is_resting] += 1
+
+        # a session ends when the player rests
+        is_second_session_ended = (
+            is_resting & (self.play_streak > 0) & (self.num_sessions == 2)
+        )
+        self.second_session_length[is_second_session_ended] = self.play_streak[
+            is_second_session_ended
+        ]
+        self.play_streak[is_resting] = 0
+
+        self.num_sessions[playing[self.play_streak[playing] == 0]] += 1
+        self.play_streak[playing] += 1
+
+    def _update_successions(
+        self,
+        playing: np.ndarray,
+        partners: np.ndarray,
+        opponents: np.ndarray,
+        is_resting: np.ndarray,
+    ) -> None:
+        def count_repeats(last_partner, last_opponents) -> tuple:
+            teammates = np.sum(last_partner[playing] == partners)
+            enemy_teams = np.sum(np.all(last_opponents[playing] == opponents, axis=1))
+            enemy_players = np.sum(
+                opponents[:, :, None] == last_opponents[playing][:, None, :]
+            )
+            return teammates, enemy_teams, enemy_players
+
+        self.last_partner[is_resting] = RESTING
+        self.last_opponents[is_resting] = RESTING
+
+        for metrics, (last_partner, last_opponents) in [
+            (
+                (
+                    MetricType.GLOBAL_TEAMMATE_SUCCESSION_INDEX,
+                    MetricType.GLOBAL_ENEMY_TEAM_SUCCESSION_INDEX,
+                    MetricType.GLOBAL_ENEMY_PLAYER_SUCCESSION_INDEX,
+                ),
+                (self.last_played_partner, self.last_played_opponents),
+            ),
+            (
+                (
+                    MetricType.GLOBAL_TEAMMATE_ROUND_SUCCESSION_INDEX,
+                    MetricType.GLOBAL_ENEMY_TEAM_ROUND_SUCCESSION_INDEX,
+                    MetricType.GLOBAL_ENEMY_PLAYER_ROUND_SUCCESSION_INDEX,
+                ),
+                (self.last_partner, self.last_opponents),
+            ),
+        ]:
+            for metric, count in zip(
+                metrics, count_repeats(last_partner, last_opponents)
+            ):
+                self.succession_counts[metric] += int(count)
+
+            last_partner[playing] = partners
+            last_opponents[playing] = opponents
+
+    def get_global_results(self) -> Dict[str, float]:
+        """Values of the STREAMING_METRICS for all rounds added so far."""
+        active_players = self.num_played > 0
+
+        # close the runs that are still open
+        open_breaks = self.rest_streak
+        break_shortness = self.break_shortness + np.sum(
+            open_breaks[open_breaks > 1] ** 2
+        )
+        second_session_length = np.where(
+            (self.play_streak > 0) & (self.num_sessions == 2),
+            self.play_streak,
+            self.second_session_length,
+        )
+
+        not_met = {
+            name: compute_unique_people_not_met_per_row(self.num_players, counts)[
+                active_players
+            ]
+            for name, counts in [
+                ("with", self.partner_counts),
+                ("against", self.opponent_counts),
+                ("with_or_against", self.partner_counts + self.opponent_counts),
+            ]
+        }
+
+        results = {
+            MetricType.GLOBAL_NOT_PLAYING_PLAYERS_INDEX: self.num_players
+            - np.sum(active_players),
+            MetricType.GLOBAL_PLAYED_MATCHES_INDEX: np.std(
+                self.num_played[active_players]
+            ),
+            MetricType.GLOBAL_MATCHUP_SESSION_LENGTH_BETWEEN_BREAKS_INDEX: np.std(
+                second_session_length[active_players]
+            ),
+            MetricType.GLOBAL_BREAK_SHORTNESS_INDEX: break_shortness,
+            MetricType.GLOBAL_TEAMMATE_VARIETY_INDEX: np.sum(
+                compute_nonzero_stdev_per_row(self.partner_counts)[active_players]
+            ),
+            MetricType.GLOBAL_PLAYER_ENGAGEMENT_FAIRNESS_INDEX: np.std(
+                not_met["with_or_against"]
+            ),
+            MetricType.GLOBAL_NOT_PLAYED_WITH_OR_AGAINST_PLAYERS_INDEX: np.sum(
+                not_met["with_or_against"]
+            ),
+            MetricType.GLOBAL_NOT_PLAYED_WITH_PLAYERS_INDEX: np.sum(not_met["with"]),
+            MetricType.GLOBAL_NOT_PLAYED_AGAINST_PLAYERS_INDEX: np.sum(
+                not_met["against"]
+            ),
+            **self.succession_counts,
+        }
+
+        return {metric.value: value for metric, value in results.items()}
+
+
+def stream_schedule(
+    optimizer: StreamingMatchupOptimizer, out_path: Optional[str] = None
+) -> Dict[str, float]:
+    """
+    Generate, score and export an event round by round. Returns the global results
+    of the whole event.
+    """
+    scorer = StreamingScorer(optimizer.players)
+    exporter = (
+        None
+        if out_path is None
+        else StreamingExporter(out_path, optimizer.players, optimizer.num_fields)
+    )
+
+    try:
+        for matchups in optimizer.iter_rounds():
+            scorer.add_round(matchups)
+            if exporter is not None:
+                exporter.write_round(matchups)
+    finally:
+        if exporter is not None:
+            exporter.close()
+
+    return scorer.get_global_results()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Plan a long event window by window and export it while planning."
+    )
+    parser.add_argument("players", help="comma separated player names")
+    parser.add_argument("--rounds", type=int, required=True)
+    parser.add_argument("--fields", type=int, default=1)
+    parser.add_argument("--window-size", type=int, default=10)
+    parser.add_argument("--iterations-per-window", type=int, default=300)
+    parser.add_argument("--out", default="output/streamed_matchups.xlsx")
+    args = parser.parse_args()
+
+    players = [Player(name.strip()) for name in args.players.split(",")]
+    optimizer = StreamingMatchupOptimizer(
+        players,
+        args.rounds,
+        args.fields,
+        MetricWeightsConfig(),
+        window_size=args.window_size,
+        num_iterations_per_window=args.iterations_per_window,
+    )
+
+    for name, value in stream_schedule(optimizer, args.out).items():
+        print(f"{name}: {value}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,219 @@
+import json
+import os
+import queue
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, Iterable, List, Optional
+
+START = "start"
+IMPROVEMENT = "improvement"
+HEARTBEAT = "heartbeat"
+END = "end"
+
+# events buffered by the file and queue sinks before they are written in one go, a
+# batch is written early with the first event after the maximum delay
+DEFAULT_BATCH_SIZE = 64
+DEFAULT_MAX_BATCH_DELAY_SECONDS = 1.0
+
+DEFAULT_HEARTBEAT_INTERVAL_SECONDS = 1.0
+
+
+@dataclass
+class TelemetryEvent:
+    kind: str
+    # wall clock, comparable across processes to merge their streams into one timeline
+    time: float
+    source: str
+    iteration: int
+    data: Dict[str, Any] = field(default_factory=dict)
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "TelemetryEvent":
+        return cls(**data)
+
+
+class TelemetrySink:
+    """Receives the events of one or more optimizers."""
+
+    def emit(self, event: TelemetryEvent) -> None:
+        raise NotImplementedError
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.flush()
+
+
+class InMemorySink(TelemetrySink):
+    def __init__(self):
+        self.events: List[TelemetryEvent] = []
+
+    def emit(self, event: TelemetryEvent) -> None:
+        self.events.append(event)
+
+
+class _BatchingSink(TelemetrySink):
+    def __init__(
+        self,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        max_batch_delay_seconds: float = DEFAULT_MAX_BATCH_DELAY_SECONDS,
+    ):
+        self.batch_size = batch_size
+        self.max_batch_delay_seconds = max_batch_delay_seconds
+        self.batch: List[TelemetryEvent] = []
+        self.batch_start_time = 0.0
+
+    def emit(self, event: TelemetryEvent) -> None:
+        now = time.perf_counter()
+        if not self.batch:
+            self.batch_start_time = now
+        self.batch.append(event)
+
+        # the end of a search is written right away, the driver waits for it
+        if (
+            len(self.batch) >= self.batch_size
+            or now - self.batch_start_time >= self.max_batch_delay_seconds
+            or event.kind == END
+        ):
+            self.flush()
+
+    def flush(self) -> None:
+        if self.batch:
+            self.write_batch(self.batch)
+            self.batch = []
+
+    def write_batch(self, events: List[TelemetryEvent]) -> None:
+        raise NotImplementedError
+
+
+class JsonlSink(_BatchingSink):
+    """Appends one JSON object per event and line to a file."""
+
+    def __init__(
+        self,
+        out_path: str,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        max_batch_delay_seconds: float = DEFAULT_MAX_BATCH_DELAY_SECONDS,
+    ):
+        super().__init__(batch_size, max_batch_delay_seconds)
+        out_dir = os.path.dirname(out_path)
+        if out_dir:
+            os.makedirs(out_dir, exist_ok=True)
+        self.file = open(out_path, "a")
+
+    def write_batch(self, events: List[TelemetryEvent]) -> None:
+        self.file.write("".join(json.dumps(event.to_dict()) + "\n" for event in events))
+        self.file.flush()
+
+    def close(self) -> None:
+        super().close()
+        self.file.close()
+
+
+class QueueSink(_BatchingSink):
+    """Puts batches of events on a multiprocessing queue, e.g. from worker processes to the driver."""
+
+    def __init__(
+        self,
+        event_queue,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        max_batch_delay_seconds: float = DEFAULT_MAX_BATCH_DELAY_SECONDS,
+    ):
+        super().__init__(batch_size, max_batch_delay_seconds)
+        self.event_queue = event_queue
+
+    def write_batch(self, events: List[TelemetryEvent]) -> None:
+        self.event_queue.put([event.to_dict() for event in events])
+
+
+def drain_queue(event_queue, timeout: Optional[float] = None) -> List[TelemetryEvent]:
+    """
+    Events of all batches on the queue. With a timeout, waits that long for the
+    first batch, otherwise only takes what is already there.
+    """
+    events = []
+    try:
+        batch = (
+            event_queue.get(timeout=timeout)
+            if timeout is not None
+            else event_queue.get_nowait()
+        )
+        while True:
+            events.extend(TelemetryEvent.from_dict(data) for data in batch)
+            batch = event_queue.get_nowait()
+    except queue.Empty:
+        pass
+
+    return events
+
+
+def merge_streams(*streams: Iterable[TelemetryEvent]) -> List[TelemetryEvent]:
+    """One timeline of the events of several sources, ordered by time."""
+    return sorted(
+        (event for stream in streams for event in stream), key=lambda e: e.time
+    )
+
+
+def read_jsonl(path: str) -> List[TelemetryEvent]:
+    with open(path) as f:
+        return [
+            TelemetryEvent.from_dict(json.loads(line)) for line in f if line.strip()
+        ]
+
+
+class TelemetryEmitter:
+    """
+    Turns the progress of one search into events. Heartbeats are rate limited,
+    checking is_heartbeat_due every iteration only costs a clock read.
+    """
+
+    def __init__(
+        self,
+        sink: TelemetrySink,
+        source: str = "",
+        heartbeat_interval_seconds: float = DEFAULT_HEARTBEAT_INTERVAL_SECONDS,
+    ):
+        self.sink = sink
+        self.source = source
+        self.heartbeat_interval_seconds = heartbeat_interval_seconds
+        self.start_time = time.perf_counter()
+        self.last_heartbeat_time = self.start_time
+        self.last_heartbeat_iteration = 0
+
+    def emit(self, kind: str, iteration: int, **data) -> None:
+        data["elapsed_seconds"] = time.perf_counter() - self.start_time
+        self.sink.emit(TelemetryEvent(kind, time.time(), self.source, iteration, data))
+
+    def start(self, **data) -> None:
+        self.start_time = time.perf_counter()
+        self.last_heartbeat_time = self.start_time
+        self.last_heartbeat_iteration = 0
+        self.emit(START, 0, **data)
+
+    def improvement(
+        self, iteration: int, score: float, metrics: Dict[str, float]
+    ) -> None:
+        self.emit(IMPROVEMENT, iteration, score=score, metrics=metrics)
+
+    def is_heartbeat_due(self) -> bool:
+        return (
+            time.perf_counter() - self.last_heartbeat_time
+            >= self.heartbeat_interval_seconds
+        )
+
+    def heartbeat(self, iteration: int, **data) -> None:
+        now = time.perf_counter()
+        data["iterations_per_second"] = (
+            iteration - self.last_heartbeat_iteration
+        ) / max(now - self.last_heartbeat_time, 1e-9)
+        self.last_heartbeat_time = now
+        self.last_heartbeat_iteration = iteration
+        self.emit(HEARTBEAT, iteration, **data)
+
+    def end(self, iteration: int, **data) -> None:
+        self.emit(END, iteration, **data)
+        self.sink.flush()
@@ -1,27 +1,233 @@
+import functools
+import json
+import os
+import threading
 import time
-from typing import Optional
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional
 
+# set to 1 to record spans, e.g. MATCHMAKING_PROFILE=1 python generate_matchups_excel_sheet.py
+PROFILING_ENV_VAR = "MATCHMAKING_PROFILE"
 
-class Timer:
-    def __init__(self):
-        self.start_time = None
+# trace events kept per process, the aggregated statistics are always complete
+MAX_TRACE_EVENTS = 200_000
 
-    def start(self, name: str = ""):
-        """Starts the timer for a specific metric."""
+SPAN_PATH_SEPARATOR = "/"
+
+
+@dataclass
+class SpanStats:
+    count: int = 0
+    total_ns: int = 0
+    max_ns: int = 0
+
+    @property
+    def mean_ns(self) -> float:
+        return self.total_ns / self.count if self.count else 0.0
+
+    def add(self, duration_ns: int) -> None:
+        self.count += 1
+        self.total_ns += duration_ns
+        self.max_ns = max(self.max_ns, duration_ns)
+
+    def merge(self, other: "SpanStats") -> None:
+        self.count += other.count
+        self.total_ns += other.total_ns
+        self.max_ns = max(self.max_ns, other.max_ns)
+
+
+class Profiler:
+    """
+    Aggregates nested spans per path (e.g. "search/evaluate_schedule/teammate_counts")
+    and keeps the individual spans as trace events for a browser trace viewer.
+    Spans of other processes can be merged in from their snapshots.
+    """
+
+    def __init__(self, max_trace_events: int = MAX_TRACE_EVENTS):
+        self.max_trace_events = max_trace_events
+        self.stats: Dict[str, SpanStats] = {}
+        self.trace_events: List[dict] = []
+        self.num_dropped_trace_events = 0
+        self.lock = threading.Lock()
+        self.local = threading.local()
+
+    def get_open_spans(self) -> List[str]:
+        if not hasattr(self.local, "open_spans"):
+            self.local.open_spans = []
+        return self.local.open_spans
+
+    def record(self, path: str, start_ns: int, duration_ns: int) -> None:
+        with self.lock:
+            self.stats.setdefault(path, SpanStats()).add(duration_ns)
+
+            if len(self.trace_events) >= self.max_trace_events:
+                self.num_dropped_trace_events += 1
+                return
+            self.trace_events.append(
+                {
+                    "name": path.rsplit(SPAN_PATH_SEPARATOR, 1)[-1],
+                    "cat": path,
+                    "ph": "X",
+                    "ts": start_ns / 1000,
+                    "dur": duration_ns / 1000,
+                    "pid": os.getpid(),
+                    "tid": threading.get_ident(),
+                }
+            )
+
+    def reset(self) -> None:
+        with self.lock:
+            self.stats = {}
+            self.trace_events = []
+            self.num_dropped_trace_events = 0
+
+    def get_snapshot(self) -> dict:
+        """Picklable copy of the recorded spans, e.g. to return them from a worker process."""
+        with self.lock:
+            return {
+                "stats": {
+                    path: (stats.count, stats.total_ns, stats.max_ns)
+                    for path, stats in self.stats.items()
+                },
+                "trace_events": list(self.trace_events),
+                "num_dropped_trace_events": self.num_dropped_trace_events,
+            }
+
+    def merge(self, snapshot: dict) -> None:
+        with self.lock:
+            for path, (count, total_ns, max_ns) in snapshot["stats"].items():
+                self.stats.setdefault(path, SpanStats()).merge(
+                    SpanStats(count, total_ns, max_ns)
+                )
+
+            num_free_events = max(self.max_trace_events - len(self.trace_events), 0)
+            self.trace_events.extend(snapshot["trace_events"][:num_free_events])
+            self.num_dropped_trace_events += snapshot["num_dropped_trace_events"] + max(
+                len(snapshot["trace_events"]) - num_free_events, 0
+            )
+
+    def get_summary_table(self) -> str:
+        """Spans in tree order with count, total, mean and max time, children indented."""
+        with self.lock:
+            stats = dict(self.stats)
+
+        name_width = max(
+            [
+                len(path.rsplit(SPAN_PATH_SEPARATOR, 1)[-1])
+                + 2 * path.count(SPAN_PATH_SEPARATOR)
+                for path in stats
+            ]
+            + [4]
+        )
+        lines = [
+            f"{'Span':<{name_width}} {'Count':>9} {'Total ms':>11} "
+            f"{'Mean us':>11} {'Max us':>11} {'% parent':>9}"
+        ]
+        for path in sorted(stats, key=lambda path: path.split(SPAN_PATH_SEPARATOR)):
+            span_stats = stats[path]
+            depth = path.count(SPAN_PATH_SEPARATOR)
+            name = "  " * depth + path.rsplit(SPAN_PATH_SEPARATOR, 1)[-1]
+
+            # share of the time of the enclosing span, shows which child dominates
+            parent_stats = stats.get(path.rsplit(SPAN_PATH_SEPARATOR, 1)[0])
+            share = (
+                f"{span_stats.total_ns / parent_stats.total_ns:.1%}"
+                if depth > 0 and parent_stats is not None and parent_stats.total_ns
+                else ""
+            )
+            lines.append(
+                f"{name:<{name_width}} {span_stats.count:>9} "
+                f"{span_stats.total_ns / 1e6:>11.2f} {span_stats.mean_ns / 1e3:>11.2f} "
+                f"{span_stats.max_ns / 1e3:>11.2f} {share:>9}"
+            )
+
+        return "\n".join(lines)
+
+    def write_trace(self, out_path: str) -> None:
+        """Chrome trace event JSON, open it in chrome://tracing or ui.perfetto.dev."""
+        with self.lock:
+            data = {
+                "traceEvents": list(self.trace_events),
+                "displayTimeUnit": "ms",
+                "otherData": {
+                    "num_dropped_trace_events": self.num_dropped_trace_events
+                },
+            }
+        with open(out_path, "w") as f:
+            json.dump(data, f)
+
+
+PROFILER = Profiler()
+
+_profiling_enabled = os.environ.get(PROFILING_ENV_VAR, "") not in ("", "0")
+
+
+def is_profiling_enabled() -> bool:
+    return _profiling_enabled
+
+
+def set_profiling_enabled(enabled: bool) -> None:
+    global _profiling_enabled
+    _profiling_enabled = enabled
+
+
+class _Span:
+    __slots__ = ("name", "path", "start_ns")
+
+    def __init__(self, name: str):
         self.name = name
-        self.start_time = time.time()
-
-    def stop(self, iterations: int = 0) -> Optional[float]:
-        """Stops the timer and prints the elapsed time."""
-        if self.start_time is not None:
-            elapsed_time = time.time() - self.start_time
-            print(f"{self.name} took {elapsed_time:.4f} seconds.")
-
-            if iterations > 0:
-                print(f"Throughput: {iterations / elapsed_time:.4f} it/s.")
-
-            self.start_time = None
-            return elapsed_time
-        else:
-            print("Timer was not started.")
-            return None
+
+    def __enter__(self) -> "_Span":
+        open_spans = PROFILER.get_open_spans()
+        open_spans.append(self.name)
+        self.path = SPAN_PATH_SEPARATOR.join(open_spans)
+        self.start_ns = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        duration_ns = time.perf_counter_ns() - self.start_ns
+        PROFILER.get_open_spans().pop()
+        PROFILER.record(self.path, self.start_ns, duration_ns)
+
+
+class _NoSpan:
+    __slots__ = ()
+
+    def __enter__(self) -> "_NoSpan":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        pass
+
+
+_NO_SPAN = _NoSpan()
+
+
+def span(name: str):
+    """
+    Time the enclosed block as a span, nested in the spans that are open in this
+    thread. Costs a function call and a flag check while profiling is disabled.
+    """
+    if not _profiling_enabled:
+        return _NO_SPAN
+
+    return _Span(name)
+
+
+def profiled(name: Optional[str] = None) -> Callable:
+    """Decorator that records every call of the function as a span, named after the function by default."""
+
+    def decorator(func: Callable) -> Callable:
+        span_name = name or func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _profiling_enabled:
+                return func(*args, **kwargs)
+
+            with _Span(span_name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
@@ -10,6 +10,7 @@ import cv2
 from matchmaking.data import Matchup, Player
 from matchmaking.metric_type import MetricType
 from matchmaking.metrics import PlayerStatistics
+from matchmaking.anytime_profile import PerformanceProfile
 
 
 class Visualizer:
@@ -51,6 +52,68 @@ class Visualizer:
         plt.savefig(out_path / f"{file_name}.png", dpi=150)
         plt.close()
 
+    @staticmethod
+    def plot_performance_profiles(
+        profiles: List[PerformanceProfile],
+        out_dir: str,
+        file_name: str,
+        title: str = "",
+    ) -> None:
+        """
+        Plot the median best loss with its quantile band and the success rate of
+        each optimizer over time, and save directly to file.
+
+        Args:
+            profiles: Performance profiles of the optimizers on one roster shape
+            out_dir: Directory to save plot
+            file_name: File name without extension
+            title: Title of the figure, e.g. the roster shape
+        """
+        out_path = Path(out_dir)
+        out_path.mkdir(parents=True, exist_ok=True)
+
+        fig, (loss_ax, success_ax) = plt.subplots(1, 2, figsize=(14, 6))
+        for profile in profiles:
+            # quantiles are inf while too few runs found a plan, they are left out
+            lower, median, upper = (
+                np.where(np.isinf(losses), np.nan, losses)
+                for losses in profile.loss_quantiles.values()
+            )
+            (line,) = loss_ax.plot(
+                profile.times, median, linewidth=2, label=profile.optimizer_name
+            )
+            loss_ax.fill_between(
+                profile.times, lower, upper, color=line.get_color(), alpha=0.2
+            )
+            success_ax.plot(
+                profile.times,
+                profile.success_rates,
+                color=line.get_color(),
+                linewidth=2,
+                label=profile.optimizer_name,
+            )
+
+        loss_ax.set_title("Best Score Over Time", fontsize=14, fontweight="bold")
+        loss_ax.set_ylabel("Score (lower is better)", fontsize=12)
+        loss_ax.set_yscale("symlog")
+        success_ax.set_title(
+            "Share Of Runs Within Target", fontsize=14, fontweight="bold"
+        )
+        success_ax.set_ylabel("Success rate", fontsize=12)
+        success_ax.set_ylim(-0.05, 1.05)
+        for ax in (loss_ax, success_ax):
+            ax.set_xscale("log")
+            ax.set_xlabel("Seconds", fontsize=12)
+            ax.grid(True, alpha=0.3)
+            ax.legend()
+
+        if title:
+            fig.suptitle(title, fontsize=14)
+        fig.tight_layout()
+
+        fig.savefig(out_path / f"{file_name}.png", dpi=150)
+        plt.close(fig)
+
     @staticmethod
     def print_results_to_console(
         best_matchup_set: List[Matchup],
@@ -128,6 +191,26 @@ class Visualizer:
                 f"Player {player_uid} - Unique people not played against: {player_stats.num_unique_people_not_played_against}"
             )
 
+        if "costs" in results:
+            print()
+            print("====== COSTS ======")
+            print()
+
+            costs = results["costs"]
+            total_ns = sum(cost.total_ns for cost in costs.values())
+            print(
+                f"{'Metric or intermediate':<50} {'Kind':<12} {'Count':>8} "
+                f"{'Total ms':>10} {'Mean us':>10} {'Share':>7}"
+            )
+            for name, cost in sorted(
+                costs.items(), key=lambda item: item[1].total_ns, reverse=True
+            ):
+                print(
+                    f"{name:<50} {cost.kind:<12} {cost.count:>8} "
+                    f"{cost.total_ns / 1e6:>10.2f} {cost.mean_ns / 1e3:>10.2f} "
+                    f"{cost.total_ns / max(total_ns, 1):>7.1%}"
+                )
+
         print()
         print("====== OVERALL ======")
         print()
@@ -0,0 +1,78 @@
+import json
+
+import numpy as np
+import pytest
+
+from matchmaking.anytime_profile import (
+    PerformanceProfile,
+    RosterShape,
+    Trajectory,
+    compute_performance_profiles,
+    get_fastest_optimizer,
+    record_trajectory,
+    save_anytime_results,
+)
+
+
+def test_best_losses_at_times():
+    trajectory = Trajectory("simple", 0, [0.1, 0.5, 2.0], [30.0, 20.0, 10.0])
+
+    np.testing.assert_array_equal(
+        trajectory.get_best_losses_at(np.array([0.05, 0.1, 0.3, 1.0, 5.0])),
+        [np.inf, 30.0, 30.0, 20.0, 10.0],
+    )
+
+
+def test_performance_profiles():
+    trajectories = [
+        Trajectory("fast", 0, [0.005], [10.0]),
+        Trajectory("fast", 1, [0.02, 0.5], [15.0, 10.0]),
+        Trajectory("slow", 0, [0.5], [20.0]),
+        Trajectory("slow", 1, [0.2, 0.9], [30.0, 10.0]),
+    ]
+
+    profiles = compute_performance_profiles(trajectories, 1.0, num_times=4)
+    fast, slow = profiles
+
+    np.testing.assert_allclose(fast.times, [0.001, 0.01, 0.1, 1.0])
+    assert fast.target_loss == pytest.approx(10.1)
+    assert fast.loss_quantiles[0.25] == [np.inf, 10.0, 10.0, 10.0]
+    assert fast.loss_quantiles[0.5] == [np.inf, 10.0, 10.0, 10.0]
+    assert fast.loss_quantiles[0.75] == [np.inf, np.inf, 15.0, 10.0]
+    assert fast.success_rates == [0.0, 0.5, 0.5, 1.0]
+    assert slow.success_rates == [0.0, 0.0, 0.0, 0.5]
+
+    assert fast.get_time_to_success_rate(0.5) == pytest.approx(0.01)
+    assert slow.get_time_to_success_rate(1.0) == np.inf
+    assert get_fastest_optimizer(profiles) == "fast"
+
+
+@pytest.mark.parametrize("optimizer_name", ["simple", "large_scale"])
+def test_record_trajectory_stops_at_time_budget(optimizer_name):
+    trajectory = record_trajectory(optimizer_name, RosterShape(9, 2, 6), 0.3, seed=0)
+
+    assert trajectory.losses
+    assert np.all(np.diff(trajectory.losses) < 0)
+    assert np.all(np.diff(trajectory.seconds) >= 0)
+    assert trajectory.seconds[-1] < 1.0
+
+
+def test_save_anytime_results(tmp_path):
+    shape = RosterShape(9, 2, 6)
+    trajectories = [
+        Trajectory("simple", 0, [0.5], [10.0]),
+        Trajectory("large_scale", 0, [0.001], [10.0]),
+    ]
+    profiles = compute_performance_profiles(trajectories, 1.0, num_times=5)
+
+    save_anytime_results(
+        {shape: trajectories}, {shape: profiles}, str(tmp_path / "profiles.json")
+    )
+    with open(tmp_path / "profiles.json") as f:
+        data = json.load(f)[shape.name]
+
+    assert data["fastest_optimizer"] == "large_scale"
+    assert data["trajectories"][0]["losses"] == [10.0]
+    # no Infinity in the JSON file
+    assert data["profiles"][0]["loss_quantiles"]["0.5"][0] is None
+    assert isinstance(profiles[0], PerformanceProfile)
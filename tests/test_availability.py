@@ -0,0 +1,103 @@
+import numpy as np
+import pytest
+
+from matchmaking.data import Player
+from matchmaking.config import MetricWeightsConfig
+from matchmaking.metric_type import MetricType
+from matchmaking.metrics import compute_schedule_metrics
+from matchmaking.simple_optimizer import SimpleMatchupOptimizer
+from matchmaking.availability import create_availability_mask
+from matchmaking.feasibility import analyze_feasibility
+from matchmaking.schedule import compute_play_mask, encode_matchups
+
+
+def _players(num_players: int):
+    return [Player(f"P{i:02d}") for i in range(num_players)]
+
+
+def test_create_availability_mask():
+    players = _players(3)
+    availability = create_availability_mask(
+        players, 4, {"P00": range(0, 2), "P02": [3, 7]}
+    )
+
+    np.testing.assert_array_equal(
+        availability,
+        [
+            [True, True, False, False],
+            [True, True, True, True],
+            [False, False, False, True],
+        ],
+    )
+
+
+def test_rounds_without_enough_available_players_are_rejected():
+    availability = np.ones((6, 3), dtype=bool)
+    availability[:2, 1] = False
+
+    analyze_feasibility(6, 3, 1, availability, unique_matchups=False).check()
+    availability[2, 1] = False
+    with pytest.raises(ValueError, match=r"rounds \[1\]"):
+        analyze_feasibility(6, 3, 1, availability, unique_matchups=False).check()
+
+
+def test_players_only_play_in_available_rounds():
+    players = _players(7)
+    availability = create_availability_mask(
+        players, 8, {"P00": range(0, 4), "P01": range(3, 8), "P02": range(2, 6)}
+    )
+
+    optimizer = SimpleMatchupOptimizer(
+        players,
+        8,
+        1,
+        50,
+        MetricWeightsConfig(),
+        availability=availability,
+        rng=np.random.default_rng(0),
+    )
+    matchups, _, results, _, _ = optimizer.get_most_diverse_matchups()
+
+    schedule, _ = encode_matchups(matchups, 1, optimizer.player_uids)
+    play_mask = compute_play_mask(schedule, len(players))
+    assert not np.any(play_mask & ~availability)
+    assert "P00" in results
+
+
+def test_played_matches_index_is_normalized_by_availability():
+    players = _players(5)
+    # P00 plays both available rounds, all others play 3 of 4 rounds
+    schedule = np.array(
+        [[[0, 1, 2, 3]], [[0, 1, 2, 4]], [[1, 2, 3, 4]], [[1, 3, 4, 2]]]
+    )
+    metric_names = (MetricType.GLOBAL_PLAYED_MATCHES_INDEX.value,)
+
+    unnormalized = compute_schedule_metrics(schedule, len(players), metric_names)
+    assert unnormalized[0] > 0.0
+
+    availability = create_availability_mask(players, 4, {"P00": range(0, 2)})
+    availability[1:] = True
+    normalized = compute_schedule_metrics(
+        schedule, len(players), metric_names, availability=availability
+    )
+
+    num_played = np.array([2, 4, 4, 3, 3])
+    expected = np.std(num_played * 4 / np.array([2, 4, 4, 4, 4]))
+    assert normalized[0] == pytest.approx(expected)
+
+
+def test_full_availability_keeps_metric_values():
+    players = _players(6)
+    optimizer = SimpleMatchupOptimizer(
+        players, 6, 1, 20, MetricWeightsConfig(), rng=np.random.default_rng(1)
+    )
+    matchups, _, _, _, _ = optimizer.get_most_diverse_matchups()
+
+    schedule = optimizer.encode(matchups)
+    metric_names = MetricWeightsConfig().get_metric_names()
+    np.testing.assert_allclose(
+        compute_schedule_metrics(schedule, 6, metric_names),
+        compute_schedule_metrics(
+            schedule, 6, metric_names, availability=np.ones((6, 6), dtype=bool)
+        ),
+    )
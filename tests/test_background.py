@@ -0,0 +1,56 @@
+import unittest
+
+from matchmaking.data import Player
+from matchmaking.config import MetricWeightsConfig
+from matchmaking.simple_optimizer import SimpleMatchupOptimizer
+from matchmaking.background import BackgroundOptimization
+
+
+class TestBackgroundOptimization(unittest.TestCase):
+    def setUp(self):
+        self.players = [
+            Player(name) for name in ["Jannik", "Timo", "Dascha", "Marc", "Ben"]
+        ]
+
+    def _create_optimizer(self, num_iterations: int) -> SimpleMatchupOptimizer:
+        return SimpleMatchupOptimizer(
+            players=self.players,
+            num_rounds=5,
+            num_fields=1,
+            num_iterations=num_iterations,
+            weights_and_metrics=MetricWeightsConfig(),
+        )
+
+    def test_runs_to_completion(self):
+        optimization = BackgroundOptimization(self._create_optimizer(20)).start()
+        optimization.join()
+
+        progress = optimization.get_progress()
+        self.assertFalse(progress.is_running)
+        self.assertEqual(progress.num_iterations_done, 20)
+        self.assertIsNone(optimization.error)
+
+        best_matchups, best_score, results, _, _ = optimization.result
+        self.assertEqual(len(best_matchups), 5)
+        self.assertEqual(best_score, progress.best_score)
+        self.assertIn("global", results)
+
+    def test_stop_returns_incumbent(self):
+        optimizer = self._create_optimizer(1_000_000)
+        optimization = BackgroundOptimization(optimizer).start()
+
+        while optimizer.num_iterations_done == 0:
+            optimization.join(0.01)
+
+        best_matchups, best_score = optimization.stop()
+        optimization.join()
+
+        self.assertFalse(optimization.is_running())
+        self.assertEqual(len(best_matchups), 5)
+        self.assertLess(optimizer.num_iterations_done, 1_000_000)
+        self.assertEqual(optimization.result[1], optimizer.min_score)
+        self.assertLessEqual(optimizer.min_score, best_score)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,60 @@
+from dataclasses import replace
+
+import pytest
+
+from matchmaking.benchmark import (
+    BENCHMARK_TARGETS,
+    BenchmarkCase,
+    BenchmarkGrid,
+    compare_results,
+    load_results,
+    run_case,
+    save_results,
+)
+
+
+def test_grid_skips_infeasible_roster_shapes():
+    cases = BenchmarkGrid((5, 8, 40), (1, 2, 6), (5, 30), ("score",)).get_cases()
+    shapes = {(case.num_players, case.num_fields, case.num_rounds) for case in cases}
+
+    # 5 players only have 15 unique matchups
+    assert (5, 1, 5) in shapes and (5, 1, 30) not in shapes
+    assert (8, 2, 30) in shapes and (8, 6, 5) not in shapes
+    assert (40, 6, 30) in shapes
+    assert len(BenchmarkGrid().get_cases()) == 28 * len(BENCHMARK_TARGETS)
+
+
+@pytest.mark.parametrize("target", BENCHMARK_TARGETS)
+def test_run_case(target):
+    case = BenchmarkCase(target, 9, 2, 4)
+    result = run_case(case, num_iterations=3, num_repeats=2, num_warmup_runs=1)
+
+    assert result.num_evaluations == 3
+    assert len(result.durations_ns) == 2
+    assert result.evaluations_per_second > 0
+    assert result.ns_per_matchup == pytest.approx(min(result.durations_ns) / (3 * 8))
+    assert result.peak_alloc_bytes > 0
+    assert result.peak_rss_bytes > 0
+
+
+def test_compare_flags_regressions(tmp_path):
+    baseline = [
+        run_case(BenchmarkCase("score", 8, 1, 3), 2, 1, 0),
+        run_case(BenchmarkCase("sample", 8, 1, 3), 2, 1, 0),
+    ]
+    save_results(baseline, str(tmp_path / "baseline.json"), {"iterations": 2})
+    loaded = load_results(str(tmp_path / "baseline.json"))
+    assert loaded == baseline
+    assert compare_results(baseline, loaded) == []
+
+    current = [
+        replace(baseline[0], ns_per_matchup=baseline[0].ns_per_matchup * 1.05),
+        replace(baseline[1], ns_per_matchup=baseline[1].ns_per_matchup * 1.5),
+        run_case(BenchmarkCase("score", 12, 1, 3), 2, 1, 0),
+    ]
+    regressions = compare_results(baseline, current, threshold=0.1)
+
+    assert [(r.name, r.quantity) for r in regressions] == [
+        ("sample/players=8/fields=1/rounds=3", "ns_per_matchup")
+    ]
+    assert regressions[0].relative_change == pytest.approx(0.5)
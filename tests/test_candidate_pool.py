@@ -0,0 +1,27 @@
+import unittest
+
+import numpy as np
+
+from matchmaking.candidate_pool import CandidatePool
+
+
+class TestCandidatePool(unittest.TestCase):
+    def setUp(self):
+        self.pool = CandidatePool(num_metrics=2, max_size=2)
+
+    def test_keeps_lowest_losses(self):
+        for i, loss in enumerate([3.0, 1.0, 2.0, 5.0]):
+            self.pool.add(np.full((1, 1, 4), i), np.array([loss, 0.0]), loss)
+
+        self.assertEqual(sorted(self.pool.losses.tolist()), [1.0, 2.0])
+        self.assertEqual(sorted(self.pool.get_schedules()[:, 0, 0, 0].tolist()), [1, 2])
+
+    def test_rejects_duplicate_schedules(self):
+        schedule = np.arange(4).reshape(1, 1, 4)
+        self.assertTrue(self.pool.add(schedule, np.zeros(2), 1.0))
+        self.assertFalse(self.pool.add(schedule.copy(), np.zeros(2), 1.0))
+        self.assertEqual(len(self.pool), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
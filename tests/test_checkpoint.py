@@ -0,0 +1,143 @@
+import numpy as np
+import pytest
+
+from matchmaking.data import Player
+from matchmaking.config import MetricWeightsConfig
+from matchmaking.checkpoint import (
+    CHECKPOINT_FORMAT_VERSION,
+    read_checkpoint,
+    write_checkpoint,
+)
+from matchmaking.simple_optimizer import SimpleMatchupOptimizer
+from matchmaking.large_scale import LargeScaleMatchupOptimizer
+from matchmaking.replan_optimizer import ReplanMatchupOptimizer
+
+
+def _players(num_players: int):
+    return [Player(f"P{i}") for i in range(num_players)]
+
+
+def _create_simple(num_iterations, seed=2):
+    return SimpleMatchupOptimizer(
+        _players(10),
+        6,
+        2,
+        num_iterations,
+        MetricWeightsConfig(),
+        rng=np.random.default_rng(seed),
+    )
+
+
+def _create_large_scale(num_iterations, seed=2):
+    return LargeScaleMatchupOptimizer(
+        _players(18),
+        12,
+        3,
+        num_iterations,
+        MetricWeightsConfig(),
+        patience=None,
+        rng=np.random.default_rng(seed),
+    )
+
+
+def _create_replan(num_iterations, seed=2):
+    plan, _, _, _, _ = SimpleMatchupOptimizer(
+        _players(10), 8, 2, 5, MetricWeightsConfig(), rng=np.random.default_rng(1)
+    ).get_most_diverse_matchups()
+    return ReplanMatchupOptimizer(
+        plan,
+        3,
+        _players(10),
+        2,
+        num_iterations,
+        MetricWeightsConfig(),
+        rng=np.random.default_rng(seed),
+    )
+
+
+def _get_search_state(optimizer):
+    return (
+        optimizer.best_scores,
+        optimizer.best_scores_iterations,
+        optimizer.min_score,
+        optimizer.encode(optimizer.best_matchup_config).tolist(),
+        optimizer.pareto_archive.metrics.tolist(),
+        optimizer.candidate_pool.losses.tolist(),
+        optimizer.candidate_pool.get_schedules().tolist(),
+    )
+
+
+@pytest.mark.parametrize(
+    "create_optimizer", [_create_simple, _create_large_scale, _create_replan]
+)
+def test_resumed_search_is_bit_exact(create_optimizer, tmp_path):
+    optimizer = create_optimizer(60)
+    optimizer.get_most_diverse_matchups()
+    # the search still improves after the interruption
+    assert optimizer.best_scores_iterations[-1] > 20
+    expected = _get_search_state(optimizer)
+
+    interrupted = create_optimizer(20)
+    interrupted.enable_checkpoints(str(tmp_path / "search.npz"))
+    interrupted.get_most_diverse_matchups()
+
+    # e.g. a restarted process with another seed
+    resumed = create_optimizer(60, seed=123)
+    resumed.load_checkpoint(str(tmp_path / "search.npz"))
+    assert resumed.num_iterations_done == resumed.num_iterations == 20
+    resumed.num_iterations = 60
+    resumed.get_most_diverse_matchups()
+
+    assert resumed.num_iterations_done == 60
+    assert _get_search_state(resumed) == expected
+    assert resumed.rng.bit_generator.state == optimizer.rng.bit_generator.state
+
+
+def test_checkpoints_are_saved_while_searching(tmp_path):
+    optimizer = _create_simple(20)
+    optimizer.enable_checkpoints(str(tmp_path / "search.npz"), interval_seconds=0.0)
+    saved_iterations = []
+    save_checkpoint = optimizer.save_checkpoint
+
+    def record_saved_iteration(path=None):
+        save_checkpoint(path)
+        saved_iterations.append(read_checkpoint(path or optimizer.checkpoint_path))
+
+    optimizer.save_checkpoint = record_saved_iteration
+    optimizer.get_most_diverse_matchups()
+
+    # one per iteration and one at the end
+    assert [meta["num_iterations_done"] for _, meta in saved_iterations] == list(
+        range(1, 21)
+    ) + [20]
+    assert list(tmp_path.iterdir()) == [tmp_path / "search.npz"]
+
+
+def test_checkpoint_of_another_roster_is_rejected(tmp_path):
+    optimizer = _create_simple(3)
+    optimizer.get_most_diverse_matchups()
+    optimizer.save_checkpoint(str(tmp_path / "search.npz"))
+
+    other = SimpleMatchupOptimizer(_players(11), 6, 2, 3, MetricWeightsConfig())
+    with pytest.raises(ValueError, match="player_uids"):
+        other.load_checkpoint(str(tmp_path / "search.npz"))
+
+    with pytest.raises(ValueError, match="optimizer"):
+        LargeScaleMatchupOptimizer(
+            _players(10), 6, 2, 3, MetricWeightsConfig()
+        ).load_checkpoint(str(tmp_path / "search.npz"))
+
+
+def test_failed_write_keeps_the_previous_checkpoint(tmp_path):
+    path = tmp_path / "search.npz"
+    meta = {"format_version": CHECKPOINT_FORMAT_VERSION}
+    write_checkpoint(path, {"a": np.arange(3)}, {**meta, "step": 1})
+
+    with pytest.raises(TypeError):
+        # sets are not JSON serializable
+        write_checkpoint(path, {"a": np.arange(4)}, {**meta, "step": {2}})
+
+    arrays, meta = read_checkpoint(path)
+    np.testing.assert_array_equal(arrays["a"], np.arange(3))
+    assert meta["step"] == 1
+    assert list(tmp_path.iterdir()) == [path]
@@ -0,0 +1,174 @@
+import numpy as np
+import pytest
+
+from matchmaking.data import Matchup, Player
+from matchmaking.config import MetricWeightsConfig
+from matchmaking.simple_optimizer import SimpleMatchupOptimizer
+from matchmaking.replan_optimizer import ReplanMatchupOptimizer
+from matchmaking.constraints import (
+    CompiledConstraints,
+    MAX_CATALOG_PLAYERS,
+    ConstraintSpec,
+    build_matchup_catalog,
+)
+
+
+def _players(num_players: int):
+    return [Player(f"P{i:02d}") for i in range(num_players)]
+
+
+def _teams(matchup: Matchup):
+    return [set(team.get_all_player_uids()) for team in matchup.get_teams()]
+
+
+def test_catalog_contains_every_matchup_once():
+    catalog = build_matchup_catalog(6)
+
+    assert catalog.shape == (45, 4)
+    keys = {
+        tuple(sorted([tuple(sorted(row[:2])), tuple(sorted(row[2:]))]))
+        for row in catalog.tolist()
+    }
+    assert len(keys) == 45
+    assert build_matchup_catalog(3).shape == (0, 4)
+
+
+def test_large_rosters_are_refused_before_building_the_catalog():
+    with pytest.raises(ValueError, match=f"at most {MAX_CATALOG_PLAYERS} players"):
+        CompiledConstraints(ConstraintSpec(), _players(120), 10, 30)
+
+
+def test_forbidden_pairs_are_masked():
+    players = _players(5)
+    constraints = CompiledConstraints(
+        ConstraintSpec(
+            forbidden_teammates=[("P00", "P01")], forbidden_opponents=[("P02", "P03")]
+        ),
+        players,
+        num_rounds=3,
+        num_fields=1,
+    )
+
+    for i in np.flatnonzero(constraints.feasible):
+        team_a, team_b = _teams(constraints.get_matchup(i))
+        assert {"P00", "P01"} not in (team_a, team_b)
+        assert not (
+            {"P02", "P03"} <= (team_a | team_b)
+            and {"P02", "P03"} not in (team_a, team_b)
+        )
+
+    assert np.sum(~constraints.feasible) > 0
+
+
+def test_optimizer_respects_constraints():
+    players = _players(9)
+    pinned = Matchup.from_names("P05", "P06", "P07", "P08")
+    spec = ConstraintSpec(
+        forbidden_teammates=[("P00", "P01"), ("P02", "P03")],
+        forbidden_opponents=[("P00", "P02")],
+        pinned_matchups={4: [pinned]},
+    )
+
+    optimizer = SimpleMatchupOptimizer(
+        players,
+        6,
+        2,
+        30,
+        MetricWeightsConfig(),
+        constraints=spec,
+        rng=np.random.default_rng(0),
+    )
+    matchups, _, _, _, _ = optimizer.get_most_diverse_matchups()
+
+    assert matchups[8].get_unique_identifier() == pinned.get_unique_identifier()
+    ids = [m.get_unique_identifier() for m in matchups]
+    assert len(ids) == len(set(ids))
+
+    for matchup in matchups:
+        team_a, team_b = _teams(matchup)
+        assert {"P00", "P01"} not in (team_a, team_b)
+        assert {"P02", "P03"} not in (team_a, team_b)
+        assert not ("P00" in team_a and "P02" in team_b)
+        assert not ("P02" in team_a and "P00" in team_b)
+
+    for round_index in range(6):
+        uids = [
+            uid
+            for m in matchups[round_index * 2 : round_index * 2 + 2]
+            for uid in m.get_all_player_uids()
+        ]
+        assert len(uids) == len(set(uids))
+
+
+def test_constrained_sampling_follows_the_draft_probabilities():
+    players = _players(8)
+    players[0].set_draft_probability_score(1e6)
+    optimizer = SimpleMatchupOptimizer(
+        players,
+        5,
+        1,
+        5,
+        MetricWeightsConfig(),
+        constraints=ConstraintSpec(forbidden_teammates=[("P01", "P02")]),
+        rng=np.random.default_rng(0),
+    )
+
+    for _ in range(20):
+        matchups = optimizer.sample_matchups(set(), 0)
+        assert "P00" in matchups[0].get_all_player_uids()
+
+
+def test_replan_keeps_pinned_matchups():
+    rng = np.random.default_rng(1)
+    players = _players(6)
+    plan, _, _, _, _ = SimpleMatchupOptimizer(
+        players, 6, 1, 20, MetricWeightsConfig(), rng=rng
+    ).get_most_diverse_matchups()
+
+    pinned = Matchup.from_names("P00", "P01", "P02", "P03")
+    spec = ConstraintSpec(pinned_matchups={5: [pinned]})
+    optimizer = ReplanMatchupOptimizer(
+        plan, 2, players, 1, 20, MetricWeightsConfig(), constraints=spec, rng=rng
+    )
+    matchups, _, _, _, _ = optimizer.get_most_diverse_matchups()
+
+    assert matchups[5].get_unique_identifier() == pinned.get_unique_identifier()
+
+
+@pytest.mark.parametrize(
+    "spec, num_rounds, num_fields",
+    [
+        # a pinned matchup with a forbidden team
+        (
+            ConstraintSpec(
+                forbidden_teammates=[("P00", "P01")],
+                pinned_matchups={0: [Matchup.from_names("P00", "P01", "P02", "P03")]},
+            ),
+            3,
+            1,
+        ),
+        # P00 can not team up with anyone, so two fields can not be filled
+        (
+            ConstraintSpec(
+                forbidden_teammates=[("P00", f"P{i:02d}") for i in range(1, 8)],
+                forbidden_opponents=[("P01", f"P{i:02d}") for i in range(2, 8)],
+            ),
+            1,
+            2,
+        ),
+        # more rounds than feasible unique matchups
+        (ConstraintSpec(forbidden_teammates=[("P00", "P01")]), 20, 1),
+        # pinned round outside of the plan
+        (
+            ConstraintSpec(
+                pinned_matchups={5: [Matchup.from_names("P00", "P01", "P02", "P03")]}
+            ),
+            3,
+            1,
+        ),
+    ],
+)
+def test_infeasible_constraints_are_detected_up_front(spec, num_rounds, num_fields):
+    num_players = 8 if num_fields == 2 else 5
+    with pytest.raises(ValueError):
+        CompiledConstraints(spec, _players(num_players), num_rounds, num_fields)
@@ -0,0 +1,184 @@
+from itertools import combinations
+
+import numpy as np
+import pytest
+
+from matchmaking.data import Player
+from matchmaking.config import MetricWeightsConfig
+from matchmaking.feasibility import (
+    analyze_feasibility,
+    get_num_unique_matchups,
+    get_num_valid_rounds,
+)
+from matchmaking.simple_optimizer import SimpleMatchupOptimizer
+from matchmaking.large_scale import LargeScaleMatchupOptimizer
+from matchmaking.replan_optimizer import ReplanMatchupOptimizer
+from matchmaking.service import parse_job_spec
+from matchmaking.telemetry import END, InMemorySink
+
+
+def _players(num_players: int):
+    return [Player(f"P{i}") for i in range(num_players)]
+
+
+def _count_valid_rounds(num_players: int, num_fields: int) -> int:
+    # brute force: sets of matchups without a shared player
+    matchups = [
+        frozenset([frozenset(team), frozenset(set(group) - set(team))])
+        for group in combinations(range(num_players), 4)
+        for team in combinations(group, 2)
+    ]
+    matchups = set(matchups)
+    return sum(
+        len(set().union(*(team for matchup in rounds for team in matchup)))
+        == num_fields * 4
+        for rounds in combinations(matchups, num_fields)
+    )
+
+
+@pytest.mark.parametrize(
+    "num_players, num_fields", [(4, 1), (6, 1), (8, 1), (8, 2), (9, 2)]
+)
+def test_counts_match_brute_force(num_players, num_fields):
+    assert get_num_unique_matchups(num_players) == _count_valid_rounds(num_players, 1)
+    assert get_num_valid_rounds(num_players, num_fields) == _count_valid_rounds(
+        num_players, num_fields
+    )
+
+
+def test_too_many_rounds_are_rejected():
+    report = analyze_feasibility(4, 5, 1)
+
+    assert report.num_unique_matchups == 3
+    assert report.max_num_rounds == 3
+    assert not report.is_feasible
+    assert report.max_num_sampled_rounds == 3
+    assert report.get_adjusted_num_rounds() == 3
+    with pytest.raises(ValueError, match=r"At most 3 round\(s\)"):
+        report.check()
+
+    # repeated matchups are fine for the large-scale engine
+    assert analyze_feasibility(4, 5, 1, unique_matchups=False).is_feasible
+
+    # nothing is allocated per round without an availability mask
+    assert analyze_feasibility(8, 10**12, 1, unique_matchups=False).is_feasible
+
+
+def test_plans_above_the_sampled_bound_are_rejected():
+    report = analyze_feasibility(9, 1, 2)
+    assert report.max_num_rounds == 189
+    assert report.max_num_sampled_rounds == 141
+
+    # below the counting bound, but the sampler rarely finds the last rounds
+    report = analyze_feasibility(9, 185, 2)
+    assert not report.is_feasible
+    assert report.get_adjusted_num_rounds() == 141
+    with pytest.raises(ValueError, match=r"At most 141 round\(s\)"):
+        SimpleMatchupOptimizer(_players(9), 185, 2, 1, MetricWeightsConfig())
+    with pytest.raises(ValueError, match=r"At most 141 round\(s\)"):
+        parse_job_spec(
+            {"players": [f"P{i}" for i in range(9)], "num_rounds": 142, "num_fields": 2}
+        )
+
+    # the adjusted number of rounds is reached
+    optimizer = SimpleMatchupOptimizer(
+        _players(9),
+        report.get_adjusted_num_rounds(),
+        2,
+        1,
+        MetricWeightsConfig(),
+        rng=np.random.default_rng(0),
+    )
+    matchups, _, _, _, _ = optimizer.get_most_diverse_matchups()
+    assert len(matchups) == 141 * 2
+
+
+def _fail_after(num_plans: int, sample_plan):
+    num_calls = []
+
+    def sample_or_fail():
+        num_calls.append(1)
+        if len(num_calls) > num_plans:
+            raise ValueError("Found no round.")
+        return sample_plan()
+
+    return sample_or_fail
+
+
+def test_failed_draws_keep_the_incumbent():
+    optimizer = SimpleMatchupOptimizer(
+        _players(9), 20, 2, 10, MetricWeightsConfig(), rng=np.random.default_rng(0)
+    )
+    optimizer.sample_plan = _fail_after(1, optimizer.sample_plan)
+    sink = InMemorySink()
+    optimizer.attach_telemetry(sink)
+
+    matchups, _, _, _, _ = optimizer.get_most_diverse_matchups()
+
+    # the plan of the first iteration survives the failed draws of the others
+    assert len(matchups) == 20 * 2
+    assert optimizer.num_failed_draws == 9
+    assert optimizer.num_iterations_done == 10
+    assert sink.events[-1].kind == END
+    assert sink.events[-1].data["num_failed_draws"] == 9
+
+    # without any complete plan the search still raises
+    optimizer = SimpleMatchupOptimizer(
+        _players(9), 20, 2, 3, MetricWeightsConfig(), rng=np.random.default_rng(0)
+    )
+    optimizer.sample_plan = _fail_after(0, optimizer.sample_plan)
+    with pytest.raises(ValueError, match="in 3 iterations. Plan fewer rounds"):
+        optimizer.get_most_diverse_matchups()
+
+
+def test_even_play_and_rest():
+    report = analyze_feasibility(13, 13, 3)
+    assert report.num_resting_per_round == 1
+    assert report.is_even_play_possible and report.is_even_rest_possible
+
+    assert not analyze_feasibility(13, 10, 3).is_even_rest_possible
+
+    # more than twice the players of the fields rest
+    report = analyze_feasibility(20, 5, 2)
+    assert report.num_resting_per_round == 12
+    assert report.num_matches_per_player == 2.0
+    assert report.is_even_play_possible
+
+    # the even share of 2 matches does not fit into the one round P0 attends
+    availability = np.ones((20, 5), dtype=bool)
+    availability[0, 1:] = False
+    report = analyze_feasibility(20, 5, 2, availability)
+    assert report.is_feasible
+    assert not report.is_even_play_possible
+
+
+def test_optimizers_reject_impossible_plans():
+    # the sampler would keep drawing for a fourth unique matchup forever
+    with pytest.raises(ValueError, match=r"At most 3 round\(s\)"):
+        SimpleMatchupOptimizer(_players(4), 4, 1, 10, MetricWeightsConfig())
+
+    with pytest.raises(ValueError, match="Not enough players"):
+        LargeScaleMatchupOptimizer(_players(7), 4, 2, 10, MetricWeightsConfig())
+
+    optimizer = LargeScaleMatchupOptimizer(
+        _players(4), 6, 1, 10, MetricWeightsConfig(), rng=np.random.default_rng(0)
+    )
+    assert optimizer.feasibility_report.max_num_rounds is None
+
+    with pytest.raises(ValueError, match=r"At most 3 round\(s\)"):
+        parse_job_spec({"players": ["A", "B", "C", "D"], "num_rounds": 4})
+
+
+def test_replan_counts_the_played_matchups():
+    players = _players(4)
+    plan, _, _, _, _ = SimpleMatchupOptimizer(
+        players, 3, 1, 5, MetricWeightsConfig(), rng=np.random.default_rng(0)
+    ).get_most_diverse_matchups()
+
+    optimizer = ReplanMatchupOptimizer(plan, 2, players, 1, 5, MetricWeightsConfig())
+    assert optimizer.feasibility_report.max_num_rounds == 1
+
+    with pytest.raises(ValueError, match=r"At most 1 round\(s\)"):
+        ReplanMatchupOptimizer(
+            plan, 2, players, 1, 5, MetricWeightsConfig(), num_remaining_rounds=2
+        )
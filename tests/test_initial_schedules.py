@@ -0,0 +1,156 @@
+import numpy as np
+import pytest
+
+from matchmaking.data import Player
+from matchmaking.config import MetricWeightsConfig
+from matchmaking.simple_optimizer import SimpleMatchupOptimizer
+from matchmaking.large_scale import LargeScaleMatchupOptimizer
+from matchmaking.replan_optimizer import ReplanMatchupOptimizer
+
+
+def _players(num_players: int):
+    return [Player(f"P{i}") for i in range(num_players)]
+
+
+def _search_simple(num_iterations, seed, initial_schedules=None):
+    optimizer = SimpleMatchupOptimizer(
+        _players(9),
+        6,
+        2,
+        num_iterations,
+        MetricWeightsConfig(),
+        rng=np.random.default_rng(seed),
+        initial_schedules=initial_schedules,
+    )
+    optimizer.get_most_diverse_matchups()
+    return optimizer
+
+
+def _get_best_schedule(optimizer):
+    return optimizer.encode(optimizer.best_matchup_config)
+
+
+def test_simple_search_starts_from_the_initial_schedules():
+    previous = _search_simple(100, 0)
+    best_schedule = _get_best_schedule(previous)
+    worse_schedule = _get_best_schedule(_search_simple(1, 1))
+
+    # one schedule or many
+    for initial_schedules in [best_schedule, [worse_schedule, best_schedule]]:
+        optimizer = _search_simple(0, 2, initial_schedules)
+
+        assert optimizer.min_score == previous.min_score
+        assert set(optimizer.best_scores_iterations) == {0}
+        np.testing.assert_array_equal(_get_best_schedule(optimizer), best_schedule)
+
+    # the search goes on from there
+    optimizer = _search_simple(100, 2, best_schedule)
+    assert optimizer.min_score <= previous.min_score
+
+
+def test_simple_search_mutates_the_incumbent():
+    best_schedule = _get_best_schedule(_search_simple(100, 0))
+    optimizer = _search_simple(0, 4, best_schedule)
+
+    for _ in range(20):
+        schedule = optimizer.encode(optimizer.resample_incumbent_round())
+
+        # all rounds but one are kept, and no matchup repeats
+        changed_rounds = np.any(schedule != best_schedule, axis=(1, 2))
+        assert changed_rounds.sum() <= 1
+        assert optimizer.get_schedule_problem(schedule) is None
+
+
+def test_retry_of_checkpointed_workers_starts_from_the_best_plan(tmp_path):
+    # as the retry loop of the script: each worker checkpoints a completed search
+    workers = []
+    for seed in range(2):
+        worker = _search_simple(0, seed)
+        worker.num_iterations = 30
+        worker.enable_checkpoints(str(tmp_path / f"worker-{seed}.npz"))
+        worker.get_most_diverse_matchups()
+        workers.append(worker)
+    worse, better = sorted(workers, key=lambda worker: -worker.min_score)
+    assert worse.min_score > better.min_score
+
+    # the retry resumes the checkpoint of the worse worker with the plans of both
+    optimizer = _search_simple(0, 0, [_get_best_schedule(worker) for worker in workers])
+    optimizer.load_checkpoint(worse.checkpoint_path)
+    optimizer.num_iterations += 10
+    optimizer.get_most_diverse_matchups()
+
+    assert optimizer.best_scores[: len(worse.best_scores)] == worse.best_scores
+    assert optimizer.best_scores[len(worse.best_scores)] == better.min_score
+    assert optimizer.best_scores_iterations[len(worse.best_scores)] == 30
+    assert optimizer.min_score <= better.min_score
+    assert optimizer.num_iterations_done == 40
+
+
+@pytest.mark.parametrize(
+    "change, problem",
+    [
+        (lambda s: s[:-1], "shape"),
+        (lambda s: np.where(s == 8, 9, s), "unknown player"),
+        (lambda s: np.concatenate([s[:1], s[:1, :, [1, 0, 3, 2]], s[2:]]), "twice"),
+    ],
+)
+def test_schedules_that_do_not_fit_are_rejected(change, problem):
+    schedule = _get_best_schedule(_search_simple(1, 0))
+
+    with pytest.raises(ValueError, match=problem):
+        _search_simple(1, 0, change(schedule.copy()))
+
+
+def test_large_scale_search_refines_the_initial_schedule():
+    def search(num_iterations, initial_schedules=None):
+        optimizer = LargeScaleMatchupOptimizer(
+            _players(18),
+            10,
+            3,
+            num_iterations,
+            MetricWeightsConfig(),
+            patience=None,
+            rng=np.random.default_rng(3),
+            initial_schedules=initial_schedules,
+        )
+        return optimizer, optimizer.search()
+
+    previous, previous_schedule = search(200)
+    fresh, _ = search(20)
+    refined, _ = search(20, previous_schedule)
+
+    assert fresh.min_score > previous.min_score
+    assert refined.best_scores[0] == previous.min_score
+    assert refined.min_score <= previous.min_score
+
+
+def test_replan_starts_from_an_earlier_replan():
+    players = _players(8)
+    plan, _, _, _, _ = SimpleMatchupOptimizer(
+        players, 8, 1, 50, MetricWeightsConfig(), rng=np.random.default_rng(0)
+    ).get_most_diverse_matchups()
+
+    def replan(num_iterations, initial_schedules=None):
+        return ReplanMatchupOptimizer(
+            plan,
+            3,
+            players[:-1] + [Player("P8")],
+            1,
+            num_iterations,
+            MetricWeightsConfig(),
+            rng=np.random.default_rng(4),
+            initial_schedules=initial_schedules,
+        )
+
+    previous = replan(300)
+    previous.get_most_diverse_matchups()
+    previous_schedule = previous.encode(previous.best_matchup_config)
+
+    optimizer = replan(0, previous_schedule)
+    _, score, _, _, _ = optimizer.get_most_diverse_matchups()
+    assert score == previous.min_score
+
+    other_played_rounds = previous_schedule.copy()
+    other_played_rounds[[0, 1]] = other_played_rounds[[1, 0]]
+    with pytest.raises(ValueError, match="played rounds"):
+        replan(1, other_played_rounds)
@@ -0,0 +1,129 @@
+import threading
+
+import numpy as np
+import pytest
+
+from matchmaking.data import Player
+from matchmaking.config import MetricWeightsConfig
+from matchmaking.constraints import ConstraintSpec
+from matchmaking.metric_type import MetricType
+from matchmaking.schedule import (
+    RESTING,
+    compute_partner_matrix,
+    compute_play_mask,
+)
+from matchmaking.metric_compute_functions import compute_pair_counts
+from matchmaking.simple_optimizer import SimpleMatchupOptimizer
+from matchmaking.optimization_pool import OptimizationRequest, run_optimization_request
+from matchmaking.large_scale import LargeScaleMatchupOptimizer, SparsePairCounts
+
+
+def _players(num_players: int):
+    return [Player(f"P{i}") for i in range(num_players)]
+
+
+def test_sparse_pair_counts():
+    counts = SparsePairCounts(5)
+    counts.add(3, 1)
+    counts.add(1, 3)
+    counts.add(0, 4, 2)
+
+    assert counts.get(1, 3) == counts.get(3, 1) == 2
+    np.testing.assert_array_equal(counts.get_many(4, [0, 1, 2]), [2, 0, 0])
+
+    counts.add(0, 4, -2)
+    assert len(counts) == 1
+    assert counts.to_dense()[1, 3] == counts.to_dense()[3, 1] == 2
+
+
+def test_large_scale_plan_is_balanced():
+    players = _players(64)
+    optimizer = LargeScaleMatchupOptimizer(
+        players, 8, 12, 30, MetricWeightsConfig(), rng=np.random.default_rng(0)
+    )
+
+    matchups, score, results, best_scores, _ = optimizer.get_most_diverse_matchups()
+    schedule = optimizer.encode(matchups)
+
+    assert schedule.shape == (8, 12, 4)
+    for round_schedule in schedule:
+        assert np.unique(round_schedule).size == 48
+
+    # 48 of 64 players play each round, so everyone plays 6 of 8 rounds
+    np.testing.assert_array_equal(np.sum(compute_play_mask(schedule, 64), axis=1), 6)
+    assert results["global"][MetricType.GLOBAL_PLAYED_MATCHES_INDEX.value] == 0
+    assert results["global"][MetricType.GLOBAL_TEAMMATE_SUCCESSION_INDEX.value] == 0
+
+    ids = [matchup.get_unique_identifier() for matchup in matchups]
+    assert len(ids) == len(set(ids))
+    assert score == min(best_scores)
+
+    # the sparse counts follow the accepted plan
+    teammate_counts = compute_pair_counts(
+        compute_partner_matrix(schedule, 64), 64, RESTING
+    )
+    np.testing.assert_array_equal(optimizer.partner_counts.to_dense(), teammate_counts)
+    assert teammate_counts.max() == 1
+
+
+def test_large_scale_respects_availability():
+    players = _players(50)
+    availability = np.ones((50, 6), dtype=bool)
+    availability[:10, :3] = False
+
+    optimizer = LargeScaleMatchupOptimizer(
+        players,
+        6,
+        10,
+        10,
+        MetricWeightsConfig(),
+        availability=availability,
+        rng=np.random.default_rng(1),
+    )
+    matchups, _, _, _, _ = optimizer.get_most_diverse_matchups()
+
+    play_mask = compute_play_mask(optimizer.encode(matchups), 50)
+    assert not np.any(play_mask[:10, :3])
+
+
+def test_large_scale_refuses_constraints():
+    with pytest.raises(ValueError, match="does not support constraints"):
+        LargeScaleMatchupOptimizer(
+            _players(50),
+            6,
+            10,
+            10,
+            MetricWeightsConfig(),
+            constraints=ConstraintSpec(forbidden_teammates=[("P0", "P1")]),
+        )
+
+
+def test_regional_open_size():
+    optimizer = LargeScaleMatchupOptimizer(
+        _players(120), 12, 25, 20, MetricWeightsConfig(), rng=np.random.default_rng(2)
+    )
+    matchups, _, results, _, _ = optimizer.get_most_diverse_matchups()
+
+    assert len(matchups) == 12 * 25
+    assert results["global"][MetricType.GLOBAL_NOT_PLAYING_PLAYERS_INDEX.value] == 0
+    assert results["global"][MetricType.GLOBAL_PLAYED_MATCHES_INDEX.value] == 0
+
+
+def test_names_may_be_part_of_other_names():
+    # "P1" is part of "P10", uids are compared as a whole
+    optimizer = SimpleMatchupOptimizer(_players(11), 3, 1, 5, MetricWeightsConfig())
+    matchups, _, results, _, _ = optimizer.get_most_diverse_matchups()
+
+    assert len(matchups) == 3
+    with pytest.raises(AssertionError):
+        SimpleMatchupOptimizer(
+            [Player("P1"), Player("P1")] + _players(4), 3, 1, 5, MetricWeightsConfig()
+        )
+
+
+def test_pool_worker_uses_large_scale_engine():
+    request = OptimizationRequest.create(48, 3, 2, 5, MetricWeightsConfig())
+    optimizer = run_optimization_request(request, {}, threading.Event(), 0.05)
+
+    assert isinstance(optimizer, LargeScaleMatchupOptimizer)
+    assert optimizer.best_matchup_config is not None
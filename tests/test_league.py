@@ -0,0 +1,150 @@
+import numpy as np
+import pytest
+
+from matchmaking.data import Player
+from matchmaking.config import MetricWeightsConfig
+from matchmaking.metric_type import MetricType
+from matchmaking.metrics import compute_schedule_metrics
+from matchmaking.simple_optimizer import SimpleMatchupOptimizer
+from matchmaking.schedule import encode_matchups
+from matchmaking.league import LeagueStore
+
+PAIRING_METRICS = (
+    MetricType.GLOBAL_NOT_PLAYED_WITH_PLAYERS_INDEX.value,
+    MetricType.GLOBAL_NOT_PLAYED_AGAINST_PLAYERS_INDEX.value,
+    MetricType.GLOBAL_NOT_PLAYED_WITH_OR_AGAINST_PLAYERS_INDEX.value,
+    MetricType.GLOBAL_TEAMMATE_VARIETY_INDEX.value,
+)
+
+
+def _players(num_players: int):
+    return [Player(f"P{i:02d}") for i in range(num_players)]
+
+
+def _session(players, num_rounds, seed):
+    optimizer = SimpleMatchupOptimizer(
+        players,
+        num_rounds,
+        1,
+        5,
+        MetricWeightsConfig(),
+        rng=np.random.default_rng(seed),
+    )
+    matchups, _, results, _, _ = optimizer.get_most_diverse_matchups()
+    return matchups, results
+
+
+def test_add_session_accumulates_counts():
+    players = _players(6)
+    first, first_results = _session(players, 6, seed=0)
+    second, _ = _session(players, 6, seed=1)
+
+    store = LeagueStore()
+    store.add_session(first, players, 1)
+
+    assert store.num_sessions == 1
+    assert store.teammate_counts[0, 1] == first_results["P00"].teammate_hist["P01"]
+    np.testing.assert_array_equal(store.num_played + store.num_rested, [6] * 6)
+    assert np.sum(store.num_played) == 6 * 4
+
+    store.add_session(second, players, 1)
+
+    assert store.num_sessions == 2
+    assert np.sum(store.teammate_counts) == 12 * 4
+    assert np.sum(store.opponent_counts) == 12 * 8
+    np.testing.assert_array_equal(store.teammate_counts, store.teammate_counts.T)
+
+
+def test_save_and_load(tmp_path):
+    players = _players(5)
+    matchups, _ = _session(players, 5, seed=2)
+    path = tmp_path / "league" / "weekly.npz"
+
+    assert LeagueStore.load(path).num_sessions == 0
+
+    store = LeagueStore()
+    store.add_session(matchups, players, 1)
+    store.save(path)
+    loaded = LeagueStore.load(path)
+
+    assert loaded.player_uids == store.player_uids
+    assert loaded.num_sessions == 1
+    np.testing.assert_array_equal(loaded.teammate_counts, store.teammate_counts)
+    np.testing.assert_array_equal(loaded.opponent_counts, store.opponent_counts)
+    np.testing.assert_array_equal(loaded.num_rested, store.num_rested)
+    assert list(tmp_path.joinpath("league").iterdir()) == [path]
+
+
+def test_prior_follows_the_next_roster():
+    players = _players(5)
+    matchups, _ = _session(players, 5, seed=3)
+    store = LeagueStore()
+    store.add_session(matchups, players, 1)
+
+    # one player left, a new one joined and the order changed
+    next_players = [Player("P09")] + players[::-1][:4]
+    prior = store.get_prior(next_players)
+
+    assert prior.teammate_counts.shape == (5, 5)
+    assert not np.any(prior.teammate_counts[0]) and prior.num_rested[0] == 0
+    assert prior.teammate_counts[1, 2] == store.teammate_counts[4, 3]
+    assert prior.num_played[4] == store.num_played[1]
+
+    # adding the next session grows the store
+    store.add_session(_session(next_players, 5, seed=4)[0], next_players, 1)
+    assert store.num_players == 6
+    assert store.num_sessions == 2
+
+
+def test_pairing_metrics_are_league_to_date():
+    players = _players(7)
+    uids = [player.get_unique_identifier() for player in players]
+    first, _ = _session(players, 4, seed=5)
+    second, _ = _session(players, 4, seed=6)
+
+    store = LeagueStore()
+    store.add_session(first, players, 1)
+
+    with_prior = compute_schedule_metrics(
+        encode_matchups(second, 1, uids)[0],
+        len(players),
+        PAIRING_METRICS,
+        league_prior=store.get_prior(players),
+    )
+    # the same as scoring both sessions as one long session
+    combined = compute_schedule_metrics(
+        encode_matchups(first + second, 1, uids)[0], len(players), PAIRING_METRICS
+    )
+    without_prior = compute_schedule_metrics(
+        encode_matchups(second, 1, uids)[0], len(players), PAIRING_METRICS
+    )
+
+    np.testing.assert_allclose(with_prior, combined)
+    assert with_prior[0] < without_prior[0]
+
+
+def test_optimizer_uses_prior():
+    players = _players(6)
+    store = LeagueStore()
+    store.add_session(_session(players, 6, seed=7)[0], players, 1)
+    prior = store.get_prior(players)
+
+    optimizer = SimpleMatchupOptimizer(
+        players, 3, 1, 20, MetricWeightsConfig(), league_prior=prior
+    )
+    np.testing.assert_allclose(
+        optimizer.draft_probability_scores, 1.0 + prior.get_rest_shares()
+    )
+    # the weights live on the optimizer, later runs start from the same players
+    assert all(player.get_draft_probability_score() == 1.0 for player in players)
+
+    matchups, _, results, _, _ = optimizer.get_most_diverse_matchups()
+    teammates = results["P00"].teammate_hist
+    assert sum(teammates.values()) == prior.num_played[0] + sum(
+        "P00" in m.get_all_player_uids() for m in matchups
+    )
+
+    with pytest.raises(AssertionError):
+        SimpleMatchupOptimizer(
+            players[:5], 3, 1, 20, MetricWeightsConfig(), league_prior=prior
+        )
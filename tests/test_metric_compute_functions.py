@@ -29,6 +29,16 @@ from matchmaking.metric_compute_functions import (
     compute_unique_people_not_played_with_or_against,
     compute_unique_people_not_played_with,
     compute_unique_people_not_played_against,
+    compute_run_lengths_avg_per_row,
+    compute_run_lengths_stdev_per_row,
+    compute_nth_run_length_per_row,
+    compute_break_shortness,
+    run_length_encode_2d,
+    select_runs,
+    split_run_lengths_per_row,
+    compact_played_rounds,
+    find_consecutive_repeats,
+    count_consecutive_repeats_per_row,
     _find_consecutive_numbers,
 )
 
@@ -392,6 +402,116 @@ class TestComputeFunctions:
         assert result == 11  # 15 - 1 (self) - 3 (unique enemies)
 
 
+class TestRunLengthEncoding:
+    """Test suite for the vectorized 2D run-length encoder and its reducers."""
+
+    play_mask = np.array(
+        [
+            [1, 1, 0, 1, 1, 1, 0, 1],
+            [0, 0, 1, 1, 0, 0, 0, 1],
+            [1, 1, 1, 1, 1, 1, 1, 1],
+        ],
+        dtype=bool,
+    )
+
+    def test_run_length_encode_2d(self):
+        """Test run_length_encode_2d returns runs ordered by row and start."""
+        result = run_length_encode_2d(self.play_mask)
+        assert result.rows.tolist() == [0, 0, 0, 0, 0, 1, 1, 1, 1, 2]
+        assert result.starts.tolist() == [0, 2, 3, 6, 7, 0, 2, 4, 7, 0]
+        assert result.lengths.tolist() == [2, 1, 3, 1, 1, 2, 2, 3, 1, 8]
+        assert result.values.tolist() == [1, 0, 1, 0, 1, 0, 1, 0, 1, 1]
+
+    def test_run_length_encode_2d_empty_columns(self):
+        """Test run_length_encode_2d with zero rounds."""
+        result = run_length_encode_2d(np.zeros((3, 0), dtype=bool))
+        assert len(result.rows) == 0
+        assert len(result.lengths) == 0
+
+    def test_run_length_encode_2d_matches_find_consecutive_numbers(self):
+        """Test run_length_encode_2d agrees with the per-row run lengths."""
+        rng = np.random.RandomState(0)
+        play_mask = rng.randint(0, 2, size=(7, 13)).astype(bool)
+
+        breaks = split_run_lengths_per_row(
+            select_runs(run_length_encode_2d(play_mask), False), 7
+        )
+
+        for row, row_breaks in zip(play_mask, breaks):
+            assert row_breaks.tolist() == compute_break_lengths(row)
+
+    def test_compute_run_lengths_avg_and_stdev_per_row(self):
+        """Test per-row break average and stdev, rows without breaks are 0."""
+        breaks = select_runs(run_length_encode_2d(self.play_mask), False)
+
+        avg = compute_run_lengths_avg_per_row(breaks, 3)
+        stdev = compute_run_lengths_stdev_per_row(breaks, 3)
+
+        assert np.allclose(avg, [1.0, 2.5, 0.0])
+        assert np.allclose(stdev, [0.0, np.std([2, 3]), 0.0])
+
+    def test_compute_nth_run_length_per_row(self):
+        """Test the second session length per row with default for short rows."""
+        sessions = select_runs(run_length_encode_2d(self.play_mask), True)
+
+        result = compute_nth_run_length_per_row(sessions, 3, n=1, default=10.0)
+
+        assert result.tolist() == [3.0, 1.0, 10.0]
+
+    def test_compute_break_shortness(self):
+        """Test only breaks longer than 1 are squared and summed."""
+        breaks = select_runs(run_length_encode_2d(self.play_mask), False)
+
+        assert compute_break_shortness(breaks) == 2**2 + 3**2
+
+
+class TestConsecutiveRepeats:
+    """Test suite for the vectorized consecutive teammate and opponent detection."""
+
+    # partner ids per round, -1 means resting
+    partner_matrix = np.array(
+        [
+            [1, 1, -1, 1, 2],
+            [0, 0, 2, 0, -1],
+        ]
+    )
+    play_mask = partner_matrix != -1
+
+    def test_compact_played_rounds(self):
+        """Test played rounds are shifted left and rests are moved to the end."""
+        result = compact_played_rounds(self.partner_matrix, self.play_mask, -1)
+        assert result.tolist() == [[1, 1, 1, 2, -1], [0, 0, 2, 0, -1]]
+
+    def test_find_consecutive_repeats_rounds(self):
+        """Test repeats over consecutive rounds are interrupted by breaks."""
+        repeats = find_consecutive_repeats(self.partner_matrix, -1)
+        assert count_consecutive_repeats_per_row(repeats).tolist() == [1, 1]
+
+    def test_find_consecutive_repeats_played_matches(self):
+        """Test repeats over the sequence of played matches skip breaks."""
+        compacted = compact_played_rounds(self.partner_matrix, self.play_mask, -1)
+        repeats = find_consecutive_repeats(compacted, -1)
+        assert count_consecutive_repeats_per_row(repeats).tolist() == [2, 1]
+
+    def test_find_consecutive_repeats_individual_opponents(self):
+        """Test each opponent is matched against both opponents of the previous round."""
+        opponent_matrix = np.array([[[2, 3], [3, 4], [-1, -1], [3, 4]]])
+        repeats = find_consecutive_repeats(opponent_matrix, -1)
+        assert repeats.shape == (1, 3, 2)
+        assert count_consecutive_repeats_per_row(repeats).tolist() == [1]
+
+    def test_find_consecutive_repeats_matches_count_consecutive_occurences(self):
+        """Test agreement with the list-based consecutive occurence counter."""
+        rng = np.random.RandomState(0)
+        ids = rng.randint(0, 3, size=(5, 12))
+
+        repeats = find_consecutive_repeats(ids, -1)
+
+        for row, row_repeats in zip(ids, repeats):
+            expected = _count_consecutive_occurences(row.tolist())
+            assert row_repeats.sum() == sum(expected.values())
+
+
 class TestEdgeCases:
     """Test suite for edge cases and boundary conditions."""
 
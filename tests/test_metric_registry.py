@@ -0,0 +1,120 @@
+import numpy as np
+import pytest
+
+from matchmaking.data import Matchup
+from matchmaking.config import MetricWeightsConfig
+from matchmaking.metric_type import MetricType
+from matchmaking.metrics import (
+    PLAYER_STATISTICS_COST,
+    get_total_matchup_set_score,
+    get_matchup_set_loss,
+)
+from matchmaking.metric_registry import (
+    INTERMEDIATE_REGISTRY,
+    METRIC_REGISTRY,
+    MetricCost,
+    MetricEvaluationContext,
+    get_evaluation_plan,
+    register_intermediate,
+    register_metric,
+)
+from matchmaking.schedule import encode_matchups
+
+
+def _matchups():
+    rng = np.random.RandomState(3)
+    names = [f"P{i}" for i in range(9)]
+    matchups = []
+    for _ in range(6):
+        selected = rng.choice(names, 8, replace=False).tolist()
+        matchups += [
+            Matchup.from_names(*selected[:4]),
+            Matchup.from_names(*selected[4:]),
+        ]
+    return matchups
+
+
+@pytest.fixture
+def house_rule():
+    calls = []
+
+    @register_intermediate("test_rest_counts", requires=("play_mask",))
+    def _rest_counts(context):
+        calls.append(1)
+        return np.sum(~context["play_mask"], axis=1)
+
+    @register_metric("test_max_rests", requires=("test_rest_counts",))
+    def _max_rests(context):
+        return np.max(context["test_rest_counts"])
+
+    yield calls
+
+    del METRIC_REGISTRY["test_max_rests"]
+    del INTERMEDIATE_REGISTRY["test_rest_counts"]
+    get_evaluation_plan.cache_clear()
+
+
+def test_plan_orders_intermediates_by_dependency():
+    plan = get_evaluation_plan((MetricType.GLOBAL_TEAMMATE_SUCCESSION_INDEX.value,))
+    names = [x.name for x in plan.intermediates]
+
+    assert names.index("play_mask") < names.index("played_partner_matrix")
+    assert names.index("partner_matrix") < names.index("played_partner_matrix")
+    assert names[-1] == "consecutive_teammates"
+
+
+def test_plan_skips_unused_intermediates():
+    plan = get_evaluation_plan((MetricType.GLOBAL_BREAK_SHORTNESS_INDEX.value,))
+    names = {x.name for x in plan.intermediates}
+
+    assert names == {"play_mask", "run_lengths", "break_runs"}
+
+
+def test_loss_only_path_matches_full_score():
+    matchups = _matchups()
+    weights = MetricWeightsConfig()
+
+    _, full_loss = get_total_matchup_set_score(matchups, 9, weights, 2)
+    loss = get_matchup_set_loss(matchups, 9, weights, 2)
+
+    assert np.isclose(full_loss, loss)
+
+
+def test_house_rule_metric_is_weighted_and_computed_once(house_rule):
+    matchups = _matchups()
+    schedule, player_uids = encode_matchups(matchups, 2)
+
+    weights = MetricWeightsConfig()
+    base_loss = get_matchup_set_loss(matchups, 9, weights, 2)
+    weights.update_weight("test_max_rests", 2.0)
+
+    loss = get_matchup_set_loss(matchups, 9, weights, 2)
+
+    context = MetricEvaluationContext(schedule, 9, len(player_uids))
+    max_rests = get_evaluation_plan(("test_max_rests",)).evaluate(context)
+    assert np.isclose(loss, base_loss + 2.0 * max_rests["test_max_rests"])
+    assert len(house_rule) == 2
+
+
+def test_costs_are_recorded_per_metric_and_intermediate():
+    matchups = _matchups()
+    results, loss = get_total_matchup_set_score(matchups, 9, MetricWeightsConfig(), 2)
+    assert "costs" not in results
+
+    costs = {}
+    for _ in range(2):
+        results_with_costs, loss_with_costs = get_total_matchup_set_score(
+            matchups, 9, MetricWeightsConfig(), 2, costs=costs
+        )
+
+    assert loss_with_costs == loss
+    assert results_with_costs["global"] == results["global"]
+    assert results_with_costs["costs"] is costs
+    assert set(costs) >= set(METRIC_REGISTRY) | {"play_mask", PLAYER_STATISTICS_COST}
+    assert costs["play_mask"].kind == "intermediate"
+    assert costs[MetricType.GLOBAL_PLAYED_MATCHES_INDEX.value].kind == "metric"
+    # intermediates are shared, so they are computed once per evaluation as well
+    assert all(cost.count == 2 for cost in costs.values())
+    assert all(cost.total_ns > 0 for cost in costs.values())
+    assert costs["play_mask"].jsonify()["count"] == 2
+    assert isinstance(costs["play_mask"], MetricCost)
@@ -0,0 +1,72 @@
+import numpy as np
+import pytest
+
+from matchmaking.data import Matchup, Player
+from matchmaking.online import SessionHistory, next_round
+
+
+def _players(num_players: int):
+    return [Player(f"P{i:02d}") for i in range(num_players)]
+
+
+def test_counters_are_updated_per_round():
+    players = _players(5)
+    history = SessionHistory(num_fields=1)
+
+    history.add_round([Matchup.from_names("P00", "P01", "P02", "P03")], players)
+    history.add_round([Matchup.from_names("P00", "P01", "P02", "P04")], players)
+
+    np.testing.assert_array_equal(history.num_played, [2, 2, 2, 1, 1])
+    np.testing.assert_array_equal(history.num_rested, [0, 0, 0, 1, 1])
+    np.testing.assert_array_equal(history.rest_streak, [0, 0, 0, 1, 0])
+    assert history.partner_counts[0, 1] == 2
+    assert history.opponent_counts[0, 2] == 2
+    assert history.opponent_counts[2, 1] == 2
+    assert history.last_partner[2] == 4
+    np.testing.assert_array_equal(history.last_opponents[4], [0, 1])
+    assert history.last_partner[3] == -1
+
+
+def test_rest_is_distributed_evenly():
+    players = _players(6)
+    history = SessionHistory(num_fields=1)
+    rng = np.random.default_rng(0)
+
+    for _ in range(6):
+        matchups = next_round(history, players, rng=rng)
+        history.add_round(matchups, players)
+
+    np.testing.assert_array_equal(history.num_played, [4] * 6)
+
+
+def test_avoids_consecutive_teammates():
+    players = _players(8)
+    history = SessionHistory(num_fields=2)
+    rng = np.random.default_rng(1)
+
+    previous = None
+    for _ in range(5):
+        matchups = next_round(history, players, rng=rng)
+        teams = {
+            team.get_unique_identifier() for m in matchups for team in m.get_teams()
+        }
+        if previous is not None:
+            assert not teams & previous
+        previous = teams
+        history.add_round(matchups, players)
+
+
+def test_late_player_and_absent_players():
+    players = _players(5)
+    history = SessionHistory(num_fields=1)
+    rng = np.random.default_rng(2)
+
+    for _ in range(3):
+        history.add_round(next_round(history, players[:4], rng=rng), players[:4])
+
+    # nobody rested yet, the late player is the one with the shortest playing streak
+    matchups = next_round(history, players, rng=rng)
+    assert "P04" in matchups[0].get_all_player_uids()
+
+    with pytest.raises(ValueError):
+        next_round(history, players[:3])
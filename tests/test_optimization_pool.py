@@ -0,0 +1,146 @@
+import unittest
+from collections import deque
+
+from matchmaking.data import Player
+from matchmaking.config import MetricWeightsConfig
+from matchmaking.metric_type import MetricType
+from matchmaking.optimization_pool import (
+    OptimizationPool,
+    OptimizationRequest,
+    PoolJob,
+)
+
+
+class TestOptimizationRequest(unittest.TestCase):
+    def test_identical_for_same_roster_size_and_weights(self):
+        a = OptimizationRequest.create(5, 5, 1, 100, MetricWeightsConfig())
+        b = OptimizationRequest.create(5, 5, 1, 100, MetricWeightsConfig())
+        self.assertEqual(a, b)
+        self.assertEqual(hash(a), hash(b))
+
+        weights = MetricWeightsConfig()
+        weights.update_weight(MetricType.GLOBAL_BREAK_SHORTNESS_INDEX, 1.0)
+        c = OptimizationRequest.create(5, 5, 1, 100, weights)
+        self.assertNotEqual(a, c)
+
+    def test_weights_roundtrip(self):
+        weights = MetricWeightsConfig()
+        weights.update_weight(MetricType.GLOBAL_BREAK_SHORTNESS_INDEX, 1.0)
+        request = OptimizationRequest.create(5, 5, 1, 100, weights)
+
+        self.assertEqual(
+            request.create_weights_and_metrics().weight_per_metric,
+            weights.weight_per_metric,
+        )
+
+
+class TestOptimizationPoolScheduling(unittest.TestCase):
+    def _queue(self, pool: OptimizationPool, session_id: str, num_iterations: int):
+        request = OptimizationRequest.create(
+            5, 5, 1, num_iterations, MetricWeightsConfig()
+        )
+        job = PoolJob(request, session_id, {}, None)
+        pool._queued_jobs.setdefault(session_id, deque()).append(job)
+        return job
+
+    def test_round_robin_over_sessions(self):
+        pool = OptimizationPool(max_workers=1)
+
+        a1 = self._queue(pool, "a", 1)
+        a2 = self._queue(pool, "a", 2)
+        b1 = self._queue(pool, "b", 3)
+
+        self.assertIs(pool._pop_next_job(), a1)
+        self.assertIs(pool._pop_next_job(), b1)
+        self.assertIs(pool._pop_next_job(), a2)
+        self.assertIsNone(pool._pop_next_job())
+
+    def test_running_cap_per_session(self):
+        pool = OptimizationPool(max_workers=4, max_running_per_session=1)
+        self._queue(pool, "a", 1)
+
+        pool._num_running_per_session["a"] = 1
+        self.assertIsNone(pool._pop_next_job())
+
+        pool._num_running_per_session["a"] = 0
+        self.assertIsNotNone(pool._pop_next_job())
+
+
+class TestOptimizationPool(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.pool = OptimizationPool(max_workers=2, report_interval=0.05)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.pool.shutdown()
+
+    def test_identical_requests_share_a_job(self):
+        players_a = [
+            Player(name) for name in ["Jannik", "Timo", "Dascha", "Marc", "Ben"]
+        ]
+        players_b = [Player(name) for name in ["Anna", "Bert", "Carl", "Dora", "Emil"]]
+
+        optimization_a = self.pool.submit(
+            "a", players_a, 5, 1, 50, MetricWeightsConfig()
+        )
+        optimization_b = self.pool.submit(
+            "b", players_b, 5, 1, 50, MetricWeightsConfig()
+        )
+        self.assertIs(optimization_a.job, optimization_b.job)
+
+        optimization_a.join()
+        optimization_b.join()
+        self.assertIsNone(optimization_a.error)
+
+        matchups_a, score_a, results_a, _, _ = optimization_a.result
+        matchups_b, score_b, results_b, _, _ = optimization_b.result
+
+        self.assertEqual(score_a, score_b)
+        self.assertEqual(len(matchups_a), 5)
+        self.assertIn("Jannik", results_a)
+        self.assertIn("Anna", results_b)
+        self.assertEqual(
+            {p.name for m in matchups_b for p in m.players}
+            - {p.name for p in players_b},
+            set(),
+        )
+        self.assertIsNot(optimization_a.optimizer, optimization_b.optimizer)
+        self.assertEqual(optimization_b.optimizer.players, players_b)
+
+    def test_stop_returns_reported_incumbent(self):
+        players = [Player(name) for name in ["Jannik", "Timo", "Dascha", "Marc", "Ben"]]
+
+        optimization = self.pool.submit(
+            "c", players, 5, 1, 1_000_000, MetricWeightsConfig()
+        )
+        while optimization.get_progress().best_matchups is None:
+            optimization.join(0.05)
+
+        best_matchups, _ = optimization.stop()
+        self.assertEqual(len(best_matchups), 5)
+        self.assertFalse(optimization.is_running())
+
+        optimization.job.done_event.wait(30)
+        self.assertTrue(optimization.job.done_event.is_set())
+
+    def test_next_job_starts_from_the_last_best_schedule(self):
+        players = [Player(f"P{i}") for i in range(6)]
+
+        first = self.pool.submit("d", players, 4, 1, 30, MetricWeightsConfig())
+        first.join()
+        self.assertEqual(first.job.initial_schedules, [])
+        _, first_score, _, _, _ = first.result
+
+        second = self.pool.submit("d", players, 4, 1, 1, MetricWeightsConfig())
+        self.assertEqual(len(second.job.initial_schedules), 1)
+        second.join()
+        self.assertIsNone(second.error)
+
+        # one more sample can not be worse than the plan it starts from
+        _, second_score, _, _, _ = second.result
+        self.assertLessEqual(second_score, first_score)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,80 @@
+import unittest
+
+import numpy as np
+
+from matchmaking.data import Player
+from matchmaking.config import MetricWeightsConfig
+from matchmaking.pareto import ParetoArchive, compute_crowding_distances
+from matchmaking.simple_optimizer import SimpleMatchupOptimizer
+
+
+def _schedule(value: int) -> np.ndarray:
+    return np.full((2, 1, 4), value)
+
+
+class TestParetoArchive(unittest.TestCase):
+    def setUp(self):
+        self.archive = ParetoArchive(("a", "b"), max_size=3)
+
+    def test_dominated_schedule_is_rejected(self):
+        self.assertTrue(self.archive.add(_schedule(0), [1.0, 1.0]))
+        self.assertFalse(self.archive.add(_schedule(1), [2.0, 1.0]))
+        self.assertFalse(self.archive.add(_schedule(2), [1.0, 1.0]))
+        self.assertEqual(len(self.archive), 1)
+
+    def test_dominating_schedule_replaces_archived(self):
+        self.archive.add(_schedule(0), [2.0, 1.0])
+        self.archive.add(_schedule(1), [1.0, 2.0])
+        self.archive.add(_schedule(2), [1.0, 1.0])
+
+        self.assertEqual(len(self.archive), 1)
+        self.assertEqual(self.archive.schedules[0, 0, 0, 0], 2)
+
+    def test_archive_is_bounded_and_keeps_extremes(self):
+        for i, metrics in enumerate([[0, 10], [10, 0], [5, 5], [4, 6], [1, 9]]):
+            self.archive.add(_schedule(i), metrics)
+
+        self.assertEqual(len(self.archive), 3)
+        self.assertEqual(self.archive.schedules.shape, (3, 2, 1, 4))
+        self.assertIn([0.0, 10.0], self.archive.metrics.tolist())
+        self.assertIn([10.0, 0.0], self.archive.metrics.tolist())
+
+    def test_get_best_index(self):
+        self.archive.add(_schedule(0), [0.0, 10.0])
+        self.archive.add(_schedule(1), [10.0, 0.0])
+
+        self.assertEqual(self.archive.get_best_index(np.array([1.0, 0.1])), 0)
+        self.assertEqual(self.archive.get_best_index(np.array([0.1, 1.0])), 1)
+
+    def test_crowding_distances_boundaries_are_infinite(self):
+        distances = compute_crowding_distances(
+            np.array([[0.0, 4.0], [1.0, 3.0], [3.0, 1.0], [4.0, 0.0]])
+        )
+        self.assertTrue(np.isinf(distances[0]) and np.isinf(distances[-1]))
+        self.assertTrue(np.all(np.isfinite(distances[1:-1])))
+
+
+class TestOptimizerParetoArchive(unittest.TestCase):
+    def test_optimizer_fills_archive_with_non_dominated_schedules(self):
+        players = [Player(name) for name in ["Jannik", "Timo", "Dascha", "Marc", "Ben"]]
+        optimizer = SimpleMatchupOptimizer(players, 5, 1, 30, MetricWeightsConfig())
+
+        _, best_score, _, _, _ = optimizer.get_most_diverse_matchups()
+
+        archive = optimizer.pareto_archive
+        self.assertGreater(len(archive), 0)
+        for metrics in archive.metrics:
+            self.assertFalse(
+                np.any(
+                    np.all(archive.metrics <= metrics, axis=1)
+                    & np.any(archive.metrics < metrics, axis=1)
+                )
+            )
+        best_index = archive.get_best_index(optimizer.weight_vector)
+        self.assertAlmostEqual(
+            archive.get_losses(optimizer.weight_vector)[best_index], best_score
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
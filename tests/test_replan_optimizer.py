@@ -0,0 +1,76 @@
+import unittest
+
+import numpy as np
+
+from matchmaking.data import Player
+from matchmaking.config import MetricWeightsConfig
+from matchmaking.simple_optimizer import SimpleMatchupOptimizer
+from matchmaking.replan_optimizer import ReplanMatchupOptimizer
+
+
+class TestReplanMatchupOptimizer(unittest.TestCase):
+    def setUp(self):
+        self.players = [Player(f"P{i:02d}") for i in range(6)]
+        optimizer = SimpleMatchupOptimizer(
+            self.players, 6, 1, 200, MetricWeightsConfig(), rng=np.random.default_rng(0)
+        )
+        self.plan, _, _, _, _ = optimizer.get_most_diverse_matchups()
+
+    def test_played_rounds_are_frozen(self):
+        players = [p for p in self.players if p.name != "P05"] + [Player("P06")]
+        optimizer = ReplanMatchupOptimizer(
+            self.plan, 2, players, 1, 100, MetricWeightsConfig()
+        )
+        matchups, _, results, _, _ = optimizer.get_most_diverse_matchups()
+
+        self.assertEqual(len(matchups), 6)
+        self.assertEqual(
+            [m.get_unique_identifier() for m in matchups[:2]],
+            [m.get_unique_identifier() for m in self.plan[:2]],
+        )
+        for matchup in matchups[2:]:
+            self.assertNotIn("P05", matchup.get_all_player_uids())
+
+        # the played rounds still count for the statistics
+        self.assertIn("P06", results)
+        if "P05" in [uid for m in self.plan[:2] for uid in m.get_all_player_uids()]:
+            self.assertIn("P05", results)
+
+        ids = [m.get_unique_identifier() for m in matchups]
+        self.assertEqual(len(ids), len(set(ids)))
+
+    def test_draft_probability_favours_players_behind(self):
+        late_player = Player("P06")
+        optimizer = ReplanMatchupOptimizer(
+            self.plan, 3, self.players + [late_player], 1, 10, MetricWeightsConfig()
+        )
+
+        scores = optimizer.draft_probability_scores
+        late_index = optimizer.player_uids.index("P06")
+        self.assertEqual(scores[late_index], scores.max())
+        self.assertGreater(scores[late_index], 1.0)
+        self.assertIsNotNone(optimizer.get_draft_probabilities())
+        # the scores of the given players are left untouched
+        self.assertEqual(late_player.get_draft_probability_score(), 1.0)
+
+    def test_unchanged_roster_keeps_plan_without_iterations(self):
+        optimizer = ReplanMatchupOptimizer(
+            self.plan, 2, self.players, 1, 0, MetricWeightsConfig()
+        )
+        matchups, _, _, _, _ = optimizer.get_most_diverse_matchups()
+
+        self.assertEqual(
+            [m.get_unique_identifier() for m in matchups],
+            [m.get_unique_identifier() for m in self.plan],
+        )
+        self.assertEqual(optimizer.count_changes(matchups[2:]), 0)
+
+    def test_not_enough_players(self):
+        with self.assertRaises(ValueError):
+            ReplanMatchupOptimizer(
+                self.plan, 2, self.players[:3], 1, 10, MetricWeightsConfig()
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()
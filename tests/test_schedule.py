@@ -0,0 +1,59 @@
+import numpy as np
+
+from matchmaking.data import Matchup
+from matchmaking.schedule import (
+    RESTING,
+    encode_matchups,
+    compute_play_mask,
+    compute_partner_matrix,
+    compute_opponent_matrix,
+    compute_enemy_team_matrix,
+    get_enemy_team_uid,
+)
+
+
+def _matchups():
+    return [
+        Matchup.from_names("A", "B", "C", "D"),
+        Matchup.from_names("A", "C", "B", "E"),
+    ]
+
+
+def test_encode_matchups_indexes_players_by_first_appearance():
+    schedule, player_uids = encode_matchups(_matchups(), num_fields=1)
+
+    assert player_uids == ["A", "B", "C", "D", "E"]
+    assert schedule.shape == (2, 1, 4)
+    assert schedule[1, 0].tolist() == [0, 2, 1, 4]
+
+
+def test_compute_play_mask():
+    schedule, player_uids = encode_matchups(_matchups(), 1, ["A", "B", "C", "D", "E"])
+
+    play_mask = compute_play_mask(schedule, len(player_uids))
+
+    assert play_mask[3].tolist() == [True, False]
+    assert play_mask[4].tolist() == [False, True]
+
+
+def test_compute_partner_and_opponent_matrix():
+    schedule, player_uids = encode_matchups(_matchups(), 1)
+
+    partner_matrix = compute_partner_matrix(schedule, len(player_uids))
+    opponent_matrix = compute_opponent_matrix(schedule, len(player_uids))
+
+    assert partner_matrix[0].tolist() == [1, 2]
+    assert partner_matrix[3].tolist() == [2, RESTING]
+    assert opponent_matrix[0].tolist() == [[2, 3], [1, 4]]
+    assert opponent_matrix[4].tolist() == [[RESTING, RESTING], [0, 2]]
+
+
+def test_compute_enemy_team_matrix():
+    schedule, player_uids = encode_matchups(_matchups(), 1)
+    opponent_matrix = compute_opponent_matrix(schedule, len(player_uids))
+
+    enemy_team_matrix = compute_enemy_team_matrix(opponent_matrix, len(player_uids))
+
+    assert enemy_team_matrix[4, 0] == RESTING
+    assert get_enemy_team_uid(enemy_team_matrix[0, 0], player_uids) == "C & D"
+    assert get_enemy_team_uid(enemy_team_matrix[4, 1], player_uids) == "A & C"
@@ -0,0 +1,149 @@
+import numpy as np
+import pytest
+
+from matchmaking.data import Player
+from matchmaking.config import MetricWeightsConfig
+from matchmaking.metrics import compute_schedule_metrics
+from matchmaking.large_scale import LargeScaleMatchupOptimizer
+from matchmaking.simple_optimizer import SimpleMatchupOptimizer
+from matchmaking.score_cache import (
+    KEY_SIZE,
+    ScoreCache,
+    canonicalize_schedule,
+    get_matchup_keys,
+    relabel_schedule,
+)
+from matchmaking.telemetry import END, InMemorySink
+
+METRIC_NAMES = MetricWeightsConfig().get_metric_names()
+
+
+def _players(num_players: int):
+    return [Player(f"P{i}") for i in range(num_players)]
+
+
+def _random_schedule(rng, num_players, num_rounds, num_fields):
+    return np.stack(
+        [
+            rng.permutation(num_players)[: num_fields * 4].reshape(num_fields, 4)
+            for _ in range(num_rounds)
+        ]
+    )
+
+
+def test_keys_ignore_the_order_of_teammates_teams_and_fields():
+    rng = np.random.default_rng(0)
+    schedule = _random_schedule(rng, 13, 8, 3)
+
+    reordered = schedule[:, :, [3, 2, 0, 1]]
+    for round_schedule in reordered:
+        round_schedule[:] = round_schedule[rng.permutation(3)]
+
+    np.testing.assert_array_equal(
+        get_matchup_keys(reordered, 13), get_matchup_keys(schedule, 13)
+    )
+    assert not np.array_equal(
+        get_matchup_keys(schedule[::-1], 13), get_matchup_keys(schedule, 13)
+    )
+
+    canonical = canonicalize_schedule(reordered, 13)
+    np.testing.assert_array_equal(canonical, canonicalize_schedule(schedule, 13))
+    np.testing.assert_array_equal(
+        compute_schedule_metrics(canonical, 13, METRIC_NAMES),
+        compute_schedule_metrics(schedule, 13, METRIC_NAMES),
+    )
+
+
+def test_relabelled_schedules_share_a_key():
+    # each player rests in another round, so the rounds played identify the players
+    schedule = np.array([[[1, 2, 3, 4]], [[0, 2, 4, 3]], [[4, 0, 1, 3]]])
+    schedule = np.concatenate([schedule, [[[0, 1, 2, 4]], [[3, 1, 0, 2]]]])
+    renamed = np.array([3, 0, 4, 1, 2])[schedule]
+
+    np.testing.assert_array_equal(
+        relabel_schedule(renamed, 5), relabel_schedule(schedule, 5)
+    )
+    cache = ScoreCache(relabel_players=True)
+    assert cache.get_key(renamed, 5) == cache.get_key(schedule, 5)
+    assert ScoreCache().get_key(renamed, 5) != ScoreCache().get_key(schedule, 5)
+
+    np.testing.assert_allclose(
+        compute_schedule_metrics(relabel_schedule(schedule, 5), 5, METRIC_NAMES),
+        compute_schedule_metrics(schedule, 5, METRIC_NAMES),
+    )
+
+
+def test_relabelled_keys_only_match_renamings():
+    rng = np.random.default_rng(1)
+    cache = ScoreCache(relabel_players=True)
+    metrics_per_key = {}
+
+    for _ in range(300):
+        schedule = _random_schedule(rng, 6, 3, 1)
+        metrics = compute_schedule_metrics(schedule, 6, METRIC_NAMES)
+        key = cache.get_key(schedule, 6)
+        np.testing.assert_allclose(metrics_per_key.setdefault(key, metrics), metrics)
+
+    # small enough for many renamings to meet
+    assert len(metrics_per_key) < 300
+
+
+def _key(name: str) -> bytes:
+    return name.encode().ljust(KEY_SIZE, b"\0")
+
+
+def test_least_recently_used_entries_are_dropped():
+    cache = ScoreCache(max_size=2)
+    cache.put(_key("a"), np.zeros(1), 1.0)
+    cache.put(_key("b"), np.zeros(1), 2.0)
+
+    assert cache.get(_key("a"))[1] == 1.0
+    cache.put(_key("c"), np.zeros(1), 3.0)
+
+    assert cache.get(_key("b")) is None
+    assert cache.get(_key("c"))[1] == 3.0
+    assert len(cache) == 2
+    assert cache.hit_rate == pytest.approx(2 / 3)
+
+    restored = ScoreCache(max_size=2)
+    restored.set_state(cache.get_state(1))
+    assert list(restored.entries) == [_key("a"), _key("c")]
+    assert restored.hit_rate == cache.hit_rate
+
+
+def test_cached_evaluations_skip_the_metrics():
+    optimizer = SimpleMatchupOptimizer(
+        _players(9), 4, 2, 1, MetricWeightsConfig(), rng=np.random.default_rng(0)
+    )
+    schedule = _random_schedule(np.random.default_rng(2), 9, 4, 2)
+
+    metric_vector, loss = optimizer.evaluate_schedule(schedule)
+    optimizer.pareto_archive.metrics = np.zeros((0, len(optimizer.metric_names)))
+    cached_vector, cached_loss = optimizer.evaluate_schedule(schedule[:, ::-1])
+
+    np.testing.assert_array_equal(cached_vector, metric_vector)
+    assert cached_loss == loss
+    assert len(optimizer.pareto_archive) == 0
+    assert len(optimizer.candidate_pool) == 1
+    assert optimizer.score_cache.hit_rate == 0.5
+
+
+def test_hit_rate_is_reported():
+    optimizer = LargeScaleMatchupOptimizer(
+        _players(13),
+        13,
+        3,
+        50,
+        MetricWeightsConfig(),
+        patience=None,
+        rng=np.random.default_rng(0),
+    )
+    sink = InMemorySink()
+    optimizer.attach_telemetry(sink)
+    optimizer.get_most_diverse_matchups()
+
+    # re-matching a round of a small plan often leads back to the same plan
+    end = sink.events[-1]
+    assert end.kind == END
+    assert end.data["score_cache_hit_rate"] == optimizer.score_cache.hit_rate > 0.5
+    assert end.data["score_cache_entries"] == len(optimizer.score_cache)
@@ -0,0 +1,176 @@
+import asyncio
+import json
+import unittest
+
+from matchmaking.optimization_pool import OptimizationPool
+from matchmaking.service import MatchmakingService, parse_job_spec
+
+PLAYERS = ["Jannik", "Timo", "Dascha", "Marc", "Ben"]
+
+
+async def _request(port: int, method: str, path: str, payload=None):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    body = b"" if payload is None else json.dumps(payload).encode()
+    writer.write(
+        f"{method} {path} HTTP/1.1\r\nHost: localhost\r\nContent-Length: {len(body)}\r\n\r\n".encode()
+        + body
+    )
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+
+    head, _, body = response.partition(b"\r\n\r\n")
+    status = int(head.split()[1])
+    return status, body
+
+
+class TestParseJobSpec(unittest.TestCase):
+    def test_defaults(self):
+        arguments = parse_job_spec({"players": PLAYERS})
+        self.assertEqual(len(arguments["players"]), 5)
+        self.assertEqual(arguments["num_rounds"], 5)
+        self.assertEqual(arguments["num_fields"], 1)
+
+    def test_weights(self):
+        arguments = parse_job_spec(
+            {"players": PLAYERS, "weights": {"global_break_shortness_index": 1.5}}
+        )
+        self.assertIn(
+            ("global_break_shortness_index", 1.5),
+            zip(
+                arguments["weights_and_metrics"].get_metric_names(),
+                arguments["weights_and_metrics"].weight_per_metric.values(),
+            ),
+        )
+
+    def test_names_may_be_part_of_other_names(self):
+        # uids are compared as a whole
+        arguments = parse_job_spec({"players": ["Al", "Alex", "Ben", "Benny", "Marc"]})
+        self.assertEqual(
+            [player.get_unique_identifier() for player in arguments["players"]],
+            ["Al", "Alex", "Ben", "Benny", "Marc"],
+        )
+
+    def test_invalid_specs(self):
+        for spec in [
+            [],
+            {"players": PLAYERS[:3]},
+            {"players": PLAYERS, "num_rounds": 0},
+            {"players": PLAYERS, "num_rounds": 10**9},
+            {"players": PLAYERS, "weights": {"unknown_metric": 1.0}},
+            {"players": PLAYERS, "time_budget_seconds": -1},
+        ]:
+            with self.assertRaises(ValueError, msg=spec):
+                parse_job_spec(spec)
+
+
+class TestMatchmakingService(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.pool = OptimizationPool(max_workers=1, report_interval=0.05)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.pool.shutdown()
+
+    def _run(self, scenario, max_queued_jobs: int = 8):
+        async def run():
+            service = MatchmakingService(self.pool, max_queued_jobs=max_queued_jobs)
+            server = await asyncio.start_server(
+                service.handle_connection, "127.0.0.1", 0
+            )
+            port = server.sockets[0].getsockname()[1]
+            async with server:
+                return await scenario(port)
+
+        return asyncio.run(run())
+
+    def test_submit_poll_and_fetch(self):
+        async def scenario(port):
+            status, body = await _request(
+                port, "POST", "/jobs", {"players": PLAYERS, "num_iterations": 30}
+            )
+            self.assertEqual(status, 202)
+            job_id = json.loads(body)["job_id"]
+
+            status, body = await _request(port, "GET", f"/jobs/{job_id}")
+            while json.loads(body)["status"] != "done":
+                await asyncio.sleep(0.05)
+                status, body = await _request(port, "GET", f"/jobs/{job_id}")
+                self.assertEqual(status, 200)
+
+            self.assertEqual(len(json.loads(body)["best_matchups"]), 5)
+
+            status, body = await _request(port, "GET", f"/jobs/{job_id}/result.json")
+            self.assertEqual(status, 200)
+            self.assertIn("Jannik", json.loads(body))
+
+            status, body = await _request(port, "GET", f"/jobs/{job_id}/result.xlsx")
+            self.assertEqual(status, 200)
+            self.assertTrue(body.startswith(b"PK"))
+
+        self._run(scenario)
+
+    def test_cancel_keeps_best_so_far(self):
+        async def scenario(port):
+            _, body = await _request(
+                port,
+                "POST",
+                "/jobs",
+                {"players": PLAYERS, "num_iterations": 1_000_000, "num_rounds": 4},
+            )
+            job_id = json.loads(body)["job_id"]
+
+            status = {}
+            while status.get("best_matchups") is None:
+                await asyncio.sleep(0.05)
+                _, body = await _request(port, "GET", f"/jobs/{job_id}")
+                status = json.loads(body)
+
+            _, body = await _request(port, "DELETE", f"/jobs/{job_id}")
+            self.assertEqual(json.loads(body)["status"], "cancelled")
+
+            status, body = await _request(port, "GET", f"/jobs/{job_id}/result.json")
+            self.assertEqual(status, 200)
+
+        self._run(scenario)
+
+    def test_backpressure_and_errors(self):
+        async def scenario(port):
+            status, _ = await _request(port, "POST", "/jobs", {"players": ["A"]})
+            self.assertEqual(status, 400)
+
+            status, _ = await _request(port, "GET", "/jobs/unknown")
+            self.assertEqual(status, 404)
+
+            job_ids = []
+            statuses = []
+            for num_rounds in [3, 4, 5]:
+                status, body = await _request(
+                    port,
+                    "POST",
+                    "/jobs",
+                    {
+                        "players": PLAYERS,
+                        "num_rounds": num_rounds,
+                        "num_iterations": 1_000_000,
+                    },
+                )
+                statuses.append(status)
+                if status == 202:
+                    job_ids.append(json.loads(body)["job_id"])
+
+            # one job runs on the single worker, one waits, the third is rejected
+            self.assertEqual(statuses, [202, 202, 429])
+
+            status, _ = await _request(port, "GET", f"/jobs/{job_ids[0]}/result.json")
+            self.assertEqual(status, 409)
+
+            for job_id in job_ids:
+                await _request(port, "DELETE", f"/jobs/{job_id}")
+
+        self._run(scenario, max_queued_jobs=1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,8 +1,12 @@
 import unittest
 
+import numpy as np
+
 from matchmaking.data import Player, Matchup, Team
 from matchmaking.config import MetricWeightsConfig
+from matchmaking.metric_type import MetricType
 from matchmaking.simple_optimizer import SimpleMatchupOptimizer
+from matchmaking.metrics import get_total_matchup_set_score
 
 
 class TestSimpleMatchupOptimizer(unittest.TestCase):
@@ -46,6 +50,74 @@ class TestSimpleMatchupOptimizer(unittest.TestCase):
         self.assertIn("Marc", enemy_team.get_all_player_uids())
         self.assertIn("Ben", enemy_team.get_all_player_uids())
 
+    def test_rerank_rescores_retained_schedules(self):
+        optimizer = SimpleMatchupOptimizer(
+            players=self.players,
+            num_rounds=5,
+            num_fields=1,
+            num_iterations=50,
+            weights_and_metrics=MetricWeightsConfig(),
+            rerank_metrics=MetricWeightsConfig().get_metric_names(),
+        )
+        _, best_score, _, _, _ = optimizer.get_most_diverse_matchups()
+
+        _, same_score, _ = optimizer.rerank(MetricWeightsConfig())
+        self.assertAlmostEqual(same_score, best_score)
+
+        new_weights = MetricWeightsConfig()
+        new_weights.update_weight(MetricType.GLOBAL_BREAK_SHORTNESS_INDEX, 1000.0)
+        matchups, score, results = optimizer.rerank(new_weights)
+
+        self.assertEqual(len(matchups), 5)
+        _, expected_score = get_total_matchup_set_score(matchups, 5, new_weights, 1)
+        self.assertAlmostEqual(score, expected_score)
+
+    def test_rerank_requires_evaluated_metrics(self):
+        self.optimizer.get_most_diverse_matchups()
+
+        new_weights = MetricWeightsConfig()
+        new_weights.update_weight(MetricType.GLOBAL_ENEMY_PLAYER_SUCCESSION_INDEX, 1.0)
+        with self.assertRaises(ValueError):
+            self.optimizer.rerank(new_weights)
+
+    def _get_plan_ids(self, seed_sequence):
+        optimizer = SimpleMatchupOptimizer(
+            [Player(f"P{i}") for i in range(13)],
+            6,
+            3,
+            5,
+            self.weights,
+            rng=np.random.default_rng(seed_sequence),
+        )
+        matchups, _, _, _, _ = optimizer.get_most_diverse_matchups()
+        return [m.get_unique_identifier() for m in matchups]
+
+    def test_seeded_searches_are_reproducible(self):
+        self.assertEqual(
+            self._get_plan_ids(np.random.SeedSequence(7)),
+            self._get_plan_ids(np.random.SeedSequence(7)),
+        )
+
+    def test_spawned_worker_streams_differ(self):
+        worker_seed_sequences = np.random.SeedSequence(7).spawn(4)
+        plans = [self._get_plan_ids(s) for s in worker_seed_sequences]
+
+        self.assertEqual(len({tuple(plan) for plan in plans}), 4)
+        # spawning again from the same master seed reproduces the workers
+        self.assertEqual(
+            plans[2], self._get_plan_ids(np.random.SeedSequence(7).spawn(4)[2])
+        )
+
+    def test_draft_probabilities_weight_the_sampling(self):
+        self.players[0].set_draft_probability_score(1e6)
+        optimizer = SimpleMatchupOptimizer(
+            self.players, 5, 1, 5, self.weights, rng=np.random.default_rng(0)
+        )
+
+        for _ in range(20):
+            matchups = optimizer.sample_matchups(set())
+            self.assertIn("Jannik", matchups[0].get_all_player_uids())
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,132 @@
+import csv
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from matchmaking.data import Player
+from matchmaking.config import MetricWeightsConfig
+from matchmaking.metric_type import MetricType
+from matchmaking.metrics import compute_schedule_metrics
+from matchmaking.schedule import decode_schedule, encode_matchups
+from matchmaking.export import StreamingExporter, export_to_excel
+from matchmaking.streaming import (
+    STREAMING_METRICS,
+    StreamingMatchupOptimizer,
+    StreamingScorer,
+    stream_schedule,
+)
+
+
+def _players(num_players: int):
+    return [Player(f"P{i}") for i in range(num_players)]
+
+
+def _random_schedule(rng, num_players, num_fields, num_rounds):
+    return np.stack(
+        [
+            rng.permutation(num_players)[: num_fields * 4].reshape(num_fields, 4)
+            for _ in range(num_rounds)
+        ]
+    )
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_scorer_matches_batch_metrics(seed):
+    rng = np.random.default_rng(seed)
+    num_players = int(rng.integers(8, 14))
+    num_fields = int(rng.integers(1, num_players // 4 + 1))
+    schedule = _random_schedule(rng, num_players, num_fields, int(rng.integers(1, 15)))
+    players = _players(num_players)
+
+    scorer = StreamingScorer(players)
+    for round_schedule in schedule:
+        scorer.add_round(decode_schedule(round_schedule, players))
+
+    results = scorer.get_global_results()
+    np.testing.assert_allclose(
+        [results[name] for name in STREAMING_METRICS],
+        compute_schedule_metrics(schedule, num_players, STREAMING_METRICS),
+    )
+
+
+def test_streaming_optimizer_yields_all_rounds():
+    players = _players(10)
+    optimizer = StreamingMatchupOptimizer(
+        players,
+        23,
+        2,
+        MetricWeightsConfig(),
+        window_size=5,
+        num_iterations_per_window=20,
+        rng=np.random.default_rng(0),
+    )
+
+    rounds = list(optimizer.iter_rounds())
+
+    assert len(rounds) == 23
+    assert all(len(matchups) == 2 for matchups in rounds)
+    for matchups in rounds:
+        uids = [uid for matchup in matchups for uid in matchup.get_all_player_uids()]
+        assert len(uids) == len(set(uids))
+
+    # rests rotate across window boundaries as well: 8 of 10 play each round
+    schedule, _ = encode_matchups(
+        [matchup for matchups in rounds for matchup in matchups],
+        2,
+        [player.get_unique_identifier() for player in players],
+    )
+    num_played = np.bincount(schedule.ravel(), minlength=10)
+    assert num_played.max() - num_played.min() <= 1
+
+    # only the rounds before the last one are kept in the history, as counts
+    assert np.sum(optimizer.history.num_played) == 22 * 8
+
+
+def test_stream_schedule_scores_and_exports(tmp_path):
+    players = _players(9)
+    optimizer = StreamingMatchupOptimizer(
+        players,
+        12,
+        2,
+        MetricWeightsConfig(),
+        window_size=4,
+        num_iterations_per_window=10,
+        rng=np.random.default_rng(1),
+    )
+
+    results = stream_schedule(optimizer, str(tmp_path / "event.csv"))
+
+    with open(tmp_path / "event.csv", newline="") as f:
+        rows = list(csv.reader(f))
+    assert len(rows) == 1 + 12 * 2 + 1
+    assert rows[0][-9:] == [str(player) for player in players]
+
+    # the exported plan scores the same in batch
+    index_per_uid = {
+        player.get_unique_identifier(): i for i, player in enumerate(players)
+    }
+    schedule = np.array(
+        [[index_per_uid[uid] for uid in row[2:7] if uid != "vs."] for row in rows[1:-1]]
+    ).reshape(12, 2, 4)
+    np.testing.assert_allclose(
+        [results[name] for name in STREAMING_METRICS],
+        compute_schedule_metrics(schedule, 9, STREAMING_METRICS),
+    )
+    assert results[MetricType.GLOBAL_NOT_PLAYING_PLAYERS_INDEX.value] == 0
+
+
+def test_streaming_exporter_matches_batch_export(tmp_path):
+    rng = np.random.default_rng(2)
+    players = _players(9)
+    matchups = decode_schedule(_random_schedule(rng, 9, 2, 5), players)
+
+    export_to_excel(matchups, players, 2, str(tmp_path / "batch.xlsx"))
+    with StreamingExporter(str(tmp_path / "streamed.xlsx"), players, 2) as exporter:
+        for i in range(5):
+            exporter.write_round(matchups[i * 2 : i * 2 + 2])
+
+    pd.testing.assert_frame_equal(
+        pd.read_excel(tmp_path / "batch.xlsx"),
+        pd.read_excel(tmp_path / "streamed.xlsx"),
+    )
@@ -0,0 +1,157 @@
+import multiprocessing
+
+import numpy as np
+import pytest
+
+from matchmaking.data import Player
+from matchmaking.config import MetricWeightsConfig
+from matchmaking.simple_optimizer import SimpleMatchupOptimizer
+from matchmaking.large_scale import LargeScaleMatchupOptimizer
+from matchmaking.replan_optimizer import ReplanMatchupOptimizer
+from matchmaking.telemetry import (
+    END,
+    HEARTBEAT,
+    IMPROVEMENT,
+    START,
+    InMemorySink,
+    JsonlSink,
+    QueueSink,
+    TelemetryEvent,
+    drain_queue,
+    merge_streams,
+    read_jsonl,
+)
+
+
+def _players(num_players: int):
+    return [Player(f"P{i}") for i in range(num_players)]
+
+
+def _event(kind, time, source="a"):
+    return TelemetryEvent(kind, time, source, 0, {"score": 1.0})
+
+
+@pytest.mark.parametrize(
+    "optimizer_class", [SimpleMatchupOptimizer, LargeScaleMatchupOptimizer]
+)
+def test_optimizer_emits_events(optimizer_class):
+    optimizer = optimizer_class(
+        _players(9), 5, 2, 30, MetricWeightsConfig(), rng=np.random.default_rng(0)
+    )
+    sink = InMemorySink()
+    optimizer.attach_telemetry(sink, "worker-3", heartbeat_interval_seconds=0.0)
+
+    optimizer.get_most_diverse_matchups()
+
+    kinds = [event.kind for event in sink.events]
+    assert kinds[0] == START and kinds[-1] == END
+    assert {event.source for event in sink.events} == {"worker-3"}
+
+    improvements = [event for event in sink.events if event.kind == IMPROVEMENT]
+    assert [event.data["score"] for event in improvements] == optimizer.best_scores
+    assert set(improvements[0].data["metrics"]) == set(optimizer.metric_names)
+    last_metrics = improvements[-1].data["metrics"]
+    assert sum(
+        last_metrics[name] * weight
+        for name, weight in zip(optimizer.metric_names, optimizer.weight_vector)
+    ) == pytest.approx(optimizer.min_score)
+
+    heartbeats = [event for event in sink.events if event.kind == HEARTBEAT]
+    assert len(heartbeats) == optimizer.num_iterations_done
+    assert all(event.data["iterations_per_second"] > 0 for event in heartbeats)
+    assert sink.events[-1].data["best_score"] == optimizer.min_score
+
+
+def test_replan_optimizer_emits_events():
+    players = _players(9)
+    plan, _, _, _, _ = SimpleMatchupOptimizer(
+        players, 6, 2, 5, MetricWeightsConfig(), rng=np.random.default_rng(1)
+    ).get_most_diverse_matchups()
+    optimizer = ReplanMatchupOptimizer(plan, 3, players, 2, 10, MetricWeightsConfig())
+    sink = InMemorySink()
+    optimizer.attach_telemetry(sink)
+
+    optimizer.get_most_diverse_matchups()
+
+    assert sink.events[0].source == "ReplanMatchupOptimizer"
+    assert [event.kind for event in sink.events].count(IMPROVEMENT) == len(
+        optimizer.best_scores
+    )
+
+
+def test_no_output_without_telemetry(capsys):
+    optimizer = SimpleMatchupOptimizer(_players(9), 3, 2, 5, MetricWeightsConfig())
+    optimizer.attach_telemetry(InMemorySink())
+    optimizer.get_most_diverse_matchups()
+
+    captured = capsys.readouterr()
+    assert captured.out == ""
+    assert captured.err == ""
+
+
+def test_jsonl_sink_writes_batches(tmp_path):
+    sink = JsonlSink(str(tmp_path / "events.jsonl"), batch_size=3)
+
+    sink.emit(_event(START, 1.0))
+    sink.emit(_event(IMPROVEMENT, 2.0))
+    assert read_jsonl(str(tmp_path / "events.jsonl")) == []
+
+    sink.emit(_event(HEARTBEAT, 3.0))
+    assert len(read_jsonl(str(tmp_path / "events.jsonl"))) == 3
+
+    # the end of a search is written right away
+    sink.emit(_event(END, 4.0))
+    assert read_jsonl(str(tmp_path / "events.jsonl"))[-1] == _event(END, 4.0)
+    sink.close()
+
+
+def test_batches_are_written_after_the_maximum_delay():
+    event_queue = multiprocessing.Queue()
+    sink = QueueSink(event_queue, batch_size=100, max_batch_delay_seconds=0.0)
+
+    sink.emit(_event(IMPROVEMENT, 1.0))
+
+    assert drain_queue(event_queue, timeout=5.0) == [_event(IMPROVEMENT, 1.0)]
+
+
+def _emit_from_worker(event_queue, source):
+    sink = QueueSink(event_queue)
+    for i in range(3):
+        sink.emit(_event(HEARTBEAT, 10.0 * i + (source == "b"), source))
+    sink.emit(_event(END, 100.0, source))
+
+
+def test_worker_streams_merge_into_one_timeline():
+    event_queue = multiprocessing.get_context("spawn").Queue()
+    workers = [
+        multiprocessing.get_context("spawn").Process(
+            target=_emit_from_worker, args=(event_queue, source)
+        )
+        for source in ("a", "b")
+    ]
+    for worker in workers:
+        worker.start()
+
+    events = []
+    while len(events) < 8:
+        events.extend(drain_queue(event_queue, timeout=10.0))
+    for worker in workers:
+        worker.join()
+
+    timeline = merge_streams(events)
+    assert [(event.source, event.time) for event in timeline[:6]] == [
+        ("a", 0.0),
+        ("b", 1.0),
+        ("a", 10.0),
+        ("b", 11.0),
+        ("a", 20.0),
+        ("b", 21.0),
+    ]
+    assert {event.kind for event in timeline[6:]} == {END}
+
+
+def test_telemetry_is_not_pickled():
+    optimizer = SimpleMatchupOptimizer(_players(9), 3, 2, 5, MetricWeightsConfig())
+    optimizer.attach_telemetry(QueueSink(multiprocessing.Queue()))
+
+    assert optimizer.__getstate__()["telemetry"] is None
@@ -0,0 +1,139 @@
+import json
+import threading
+
+import numpy as np
+import pytest
+
+from matchmaking import timer
+from matchmaking.timer import PROFILER, Profiler, profiled, span
+from matchmaking.data import Player
+from matchmaking.config import MetricWeightsConfig
+from matchmaking.simple_optimizer import SimpleMatchupOptimizer
+
+
+@pytest.fixture
+def profiling():
+    was_enabled = timer.is_profiling_enabled()
+    timer.set_profiling_enabled(True)
+    PROFILER.reset()
+    yield PROFILER
+    timer.set_profiling_enabled(was_enabled)
+    PROFILER.reset()
+
+
+@profiled()
+def _work():
+    with span("inner"):
+        return sum(range(1000))
+
+
+def test_nested_spans_and_decorator(profiling):
+    with span("outer"):
+        _work()
+        _work()
+    _work()
+
+    assert set(profiling.stats) == {
+        "outer",
+        "outer/_work",
+        "outer/_work/inner",
+        "_work",
+        "_work/inner",
+    }
+    assert profiling.stats["outer/_work"].count == 2
+    assert profiling.stats["outer/_work/inner"].count == 2
+    assert profiling.stats["outer"].total_ns >= profiling.stats["outer/_work"].total_ns
+    assert profiling.stats["outer/_work"].max_ns <= (
+        profiling.stats["outer/_work"].total_ns
+    )
+    assert len(profiling.trace_events) == 7
+
+
+def test_disabled_records_nothing():
+    timer.set_profiling_enabled(False)
+    PROFILER.reset()
+
+    with span("outer"):
+        assert _work() == sum(range(1000))
+
+    assert PROFILER.stats == {}
+    assert PROFILER.trace_events == []
+
+
+def test_spans_of_threads_do_not_nest(profiling):
+    with span("main"):
+        thread = threading.Thread(target=_work)
+        thread.start()
+        thread.join()
+
+    assert set(profiling.stats) == {"main", "_work", "_work/inner"}
+
+
+def test_merge_snapshot_and_trace_limit(tmp_path):
+    worker = Profiler()
+    worker.record("search", 0, 30)
+    worker.record("search", 100, 10)
+
+    main = Profiler(max_trace_events=3)
+    main.record("search", 200, 20)
+    main.record("export_to_excel", 300, 5)
+    main.merge(worker.get_snapshot())
+
+    assert main.stats["search"] == timer.SpanStats(3, 60, 30)
+    assert len(main.trace_events) == 3
+    assert main.num_dropped_trace_events == 1
+
+    main.write_trace(str(tmp_path / "trace.json"))
+    with open(tmp_path / "trace.json") as f:
+        trace = json.load(f)
+    assert [event["name"] for event in trace["traceEvents"]] == [
+        "search",
+        "export_to_excel",
+        "search",
+    ]
+    assert trace["traceEvents"][0]["ph"] == "X"
+    assert trace["otherData"]["num_dropped_trace_events"] == 1
+
+
+def test_summary_table_in_tree_order():
+    profiler = Profiler()
+    profiler.record("search", 0, 1000)
+    profiler.record("search/evaluate_schedule", 0, 750)
+    profiler.record("search/evaluate_schedule/play_mask", 0, 150)
+    profiler.record("search_b", 0, 10)
+
+    lines = profiler.get_summary_table().splitlines()
+
+    assert [line.split()[0] for line in lines] == [
+        "Span",
+        "search",
+        "evaluate_schedule",
+        "play_mask",
+        "search_b",
+    ]
+    assert lines[2].startswith("  evaluate_schedule")
+    assert lines[2].endswith("75.0%")
+    assert lines[3].startswith("    play_mask")
+    assert lines[3].endswith("20.0%")
+
+
+def test_optimizer_spans_cover_metrics(profiling):
+    optimizer = SimpleMatchupOptimizer(
+        [Player(f"P{i}") for i in range(9)],
+        4,
+        2,
+        5,
+        MetricWeightsConfig(),
+        rng=np.random.default_rng(0),
+    )
+    _, _, results, _, _ = optimizer.get_most_diverse_matchups()
+
+    # the metric costs are accumulated over the search and the final scoring
+    assert results["costs"] is optimizer.metric_costs
+    assert results["costs"]["play_mask"].count == 5 + 1
+    assert profiling.stats["search"].count == 1
+    assert profiling.stats["search/sample_matchups"].count == 4 * 5
+    assert profiling.stats["search/evaluate_schedule"].count == 5
+    assert "search/evaluate_schedule/teammate_counts" in profiling.stats
+    assert "search/evaluate_schedule/global_played_matches_index" in profiling.stats
+    assert "search/copy_best_matchups" in profiling.stats